@@ -0,0 +1,326 @@
+import argparse
+import contextlib
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import main_final
+
+# how many skill books a hero of each level gets in the duel cases, the same as for_running.py for level 6 and 15
+SKILL_BOOKS_OF_LEVEL = {1: 4, 6: 20, 15: 60, 30: 120}
+
+# the aggregate_analyze() arguments of for_running.py, from loop_times to sub_or_main
+FOR_RUNNING_CONFIGURATIONS = (
+    ("level6", (2000, 6, "MonkeyKing", "MonkeyKing", "Monkey King 1st", "King Monkey 2nd", 20, 0, False, {},
+                True, False, False, False, False, False)),
+    ("noMKB", (2000, 15, "MonkeyKing", "MonkeyKing", "Monkey King 1st", "King Monkey 2nd", 60, 0, False, {},
+               True, False, False, False, False, False)),
+    ("MKB", (2000, 15, "MonkeyKing", "MonkeyKing", "Monkey King 1st", "King Monkey 2nd", 60, 0, False, {"MKB": 1},
+             True, False, False, False, False, False)),
+    ("level6_main", (5000, 6, "BountyHunter", "BountyHunter", "Bounty Hunter 1st", "Hunter Bounty 2nd", 20, 1, False,
+                     {}, True, False, False, False, False, True)),
+    ("level15_main", (5000, 15, "BountyHunter", "BountyHunter", "Bounty Hunter 1st", "Hunter Bounty 2nd", 60, 1,
+                      False, {}, True, False, False, False, False, True)),
+)
+
+
+def micro_attack_case(skill_index: int, calls: int, seed: int):
+    """
+    A level 10 Monkey King with only one level 10 sub skill attacks a level 10 Monkey King without skills.
+
+    :param skill_index: the index of the sub skill in main_final.SUB_SKILL_NAMES
+    :param calls: how many times attack() is called
+    :param seed: the seed of the random numbers
+    :return: the function to prepare a run, see measure_case()
+    """
+    def prepare():
+        skill_book_list = [0] * len(main_final.SUB_SKILL_NAMES)
+        skill_book_list[skill_index] = 10
+        attack_hero = main_final.hero_template("MonkeyKing", 10, "", {}).clone()
+        attack_hero.get_random_skill_book(0, skill_book_list)
+        defend_hero = main_final.hero_template("MonkeyKing", 10, "", {}).clone()
+        attack_hero.calculate_status()
+        defend_hero.calculate_status()
+        rng = main_final.RandomBuffer(np.random.default_rng(seed))
+
+        def run():
+            for _ in range(calls):
+                # keep the defender alive, the attack itself does not depend on the HP left
+                defend_hero.status.array[main_final.CURRENT_HP] = defend_hero.status.array[main_final.MAX_HP]
+                main_final.attack(attack_hero, defend_hero, rng=rng)
+        return run
+    return prepare
+
+
+def micro_calculate_status_case(calls: int, seed: int, memoized: bool):
+    """
+    Hero.calculate_status() of heroes with random skill books, or only the calculation it skips for a memoized status.
+
+    :param calls: how many heroes are calculated
+    :param seed: the seed of the skill books
+    :param memoized: True calls calculate_status(), False calls calculate_status_from_inputs()
+    :return: the function to prepare a run, see measure_case()
+    """
+    def prepare():
+        rng = random.Random(seed)
+        heroes = []
+        for _ in range(calls):
+            hero = main_final.hero_template("MonkeyKing", 15, "", {}).clone()
+            hero.get_random_skill_book(60, rng=rng)
+            heroes.append(hero)
+
+        def run():
+            for hero in heroes:
+                if memoized:
+                    hero.calculate_status()
+                else:
+                    hero.calculate_status_from_inputs()
+        return run
+    return prepare
+
+
+def micro_skill_book_case(calls: int, seed: int):
+    """
+    Hero.get_random_skill_book() of 60 skill books for level 15 heroes.
+
+    :param calls: how many heroes roll their skill books
+    :param seed: the seed of the skill books
+    :return: the function to prepare a run, see measure_case()
+    """
+    def prepare():
+        rng = random.Random(seed)
+        heroes = [main_final.hero_template("MonkeyKing", 15, "", {}).clone() for _ in range(calls)]
+
+        def run():
+            for hero in heroes:
+                hero.get_random_skill_book(60, rng=rng)
+        return run
+    return prepare
+
+
+def duel_case(duels: int, seed: int, hero_level: int, hero_model: str, number_of_main_skills=0,
+              ultimate_skill=False, items_dict=None):
+    """
+    duel() of mirror heroes, the heroes are built before the timer starts.
+
+    :param duels: how many duels are run
+    :param seed: the seed of the loadouts and the duels
+    :param hero_level: the hero level, the amount of skill books is from SKILL_BOOKS_OF_LEVEL
+    :param hero_model: the model name of both heroes
+    :param number_of_main_skills: how many main skills the heroes will get
+    :param ultimate_skill: whether the heroes will learn an ultimate skill or not
+    :param items_dict: the items that both heroes will equip
+    :return: the function to prepare a run, see measure_case()
+    """
+    def prepare():
+        rng = random.Random(seed)
+        hero_pairs = [main_final.build_hero_pair(hero_level, hero_model, hero_model, "", "",
+                                                 SKILL_BOOKS_OF_LEVEL[hero_level], number_of_main_skills,
+                                                 ultimate_skill, items_dict or {}, rng=rng)
+                      for _ in range(duels)]
+        duel_rng = main_final.RandomBuffer(np.random.default_rng(seed))
+
+        def run():
+            for hero_1, hero_2 in hero_pairs:
+                main_final.duel(hero_1, hero_2, rng=duel_rng)
+        return run
+    return prepare
+
+
+def macro_case(arguments: tuple, seed: int):
+    """
+    A whole aggregate_analyze() of for_running.py with the batch engine, the summary is printed to os.devnull.
+
+    :param arguments: the aggregate_analyze() arguments from loop_times to sub_or_main
+    :param seed: the seed of the simulation
+    :return: the function to prepare a run, see measure_case()
+    """
+    def prepare():
+        def run():
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                main_final.aggregate_analyze(*arguments, engine="batch", seed=seed)
+        return run
+    return prepare
+
+
+def benchmark_cases(seed: int, calls: int, duels: int) -> list:
+    """
+    :param seed: the seed of every case
+    :param calls: how many calls for the micro cases
+    :param duels: how many duels for the duel cases
+    :return: list of (name, group, amount of calls or duels, the function to prepare a run)
+    """
+    cases = []
+    for skill_index, skill_name in enumerate(main_final.SUB_SKILL_NAMES):
+        cases.append(("attack {}".format(skill_name), "micro", calls, micro_attack_case(skill_index, calls, seed)))
+    cases.append(("calculate_status", "micro", calls, micro_calculate_status_case(calls, seed, True)))
+    cases.append(("calculate_status_from_inputs", "micro", calls, micro_calculate_status_case(calls, seed, False)))
+    cases.append(("get_random_skill_book 60", "micro", calls, micro_skill_book_case(calls, seed)))
+
+    for hero_level in sorted(SKILL_BOOKS_OF_LEVEL.keys()):
+        cases.append(("duel level {} MonkeyKing".format(hero_level), "duel", duels,
+                      duel_case(duels, seed, hero_level, "MonkeyKing")))
+    cases.append(("duel level 15 BountyHunter main skills", "duel", duels,
+                  duel_case(duels, seed, 15, "BountyHunter", 2, True)))
+    for item in main_final.ITEM_NAMES:
+        cases.append(("duel level 15 MonkeyKing {}".format(item), "duel", duels,
+                      duel_case(duels, seed, 15, "MonkeyKing", items_dict={item: 1})))
+
+    for name, arguments in FOR_RUNNING_CONFIGURATIONS:
+        cases.append(("for_running {}".format(name), "macro", arguments[0], macro_case(arguments, seed)))
+    return cases
+
+
+def count_attacks(prepare) -> int:
+    """
+    Run the case once with attack() and batch_attack() counting how many attacks are done,
+    an attack in batch_attack() is only counted if both heroes of its duel are alive.
+
+    :param prepare: the function to prepare a run
+    :return: the amount of attacks
+    """
+    attacks = [0]
+    original_attack, original_batch_attack = main_final.attack, main_final.batch_attack
+
+    def counted_attack(*args, **kwargs):
+        attacks[0] += 1
+        return original_attack(*args, **kwargs)
+
+    def counted_batch_attack(state, duels, attack_side, *args, **kwargs):
+        # batch_attack() skips the duels where one side is already killed
+        hp = state["Current HP"]
+        attacks[0] += int(np.count_nonzero((hp[attack_side, duels] > 0) & (hp[1 - attack_side, duels] > 0)))
+        return original_batch_attack(state, duels, attack_side, *args, **kwargs)
+
+    run = prepare()
+    main_final.attack, main_final.batch_attack = counted_attack, counted_batch_attack
+    try:
+        run()
+    finally:
+        main_final.attack, main_final.batch_attack = original_attack, original_batch_attack
+    return attacks[0]
+
+
+def peak_memory(prepare) -> int:
+    """
+    :param prepare: the function to prepare a run
+    :return: the peak bytes allocated by Python and numpy during one run, the prepared data not included
+    """
+    run = prepare()
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def measure_case(name: str, group: str, amount: int, prepare, repeat: int) -> dict:
+    """
+    Time the best of repeat runs of a case, then count its attacks and its peak memory in separate runs,
+    so the counting does not slow down the timed runs.
+
+    :param name: the name of the case
+    :param group: "micro", "duel" or "macro"
+    :param amount: how many calls (micro) or duels (duel, macro) each run does
+    :param prepare: the function to prepare a run, it returns the function doing the work to be timed
+    :param repeat: how many timed runs
+    :return: the result of the case
+    """
+    seconds = math.inf
+    for _ in range(repeat):
+        run = prepare()
+        start_time = time.perf_counter()
+        run()
+        seconds = min(seconds, time.perf_counter() - start_time)
+    attacks = count_attacks(prepare)
+    result = {"name": name, "group": group, "seconds": seconds, "attacks": attacks,
+              "attacks_per_second": attacks / seconds, "peak_memory_bytes": peak_memory(prepare)}
+    if group == "micro":
+        result.update({"calls": amount, "calls_per_second": amount / seconds})
+    else:
+        result.update({"duels": amount, "duels_per_second": amount / seconds})
+    return result
+
+
+def git_commit() -> str:
+    """
+    :return: the commit of the working tree, '' if it is not known
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def show_results(results: list, baseline=None) -> None:
+    """
+    Print one line for each case, with the speed against the same case of the baseline if given.
+
+    :param results: the results from measure_case()
+    :param baseline: the results of an earlier run, from the saved JSON file
+    :return: None
+    """
+    baseline_speed = {}
+    for result in baseline or []:
+        baseline_speed[result["name"]] = result.get("duels_per_second", result.get("calls_per_second"))
+    print("{:<42}{:>12}{:>16}{:>16}{:>12}{:>10}".format("Case", "Seconds", "Duels|Calls/s", "Attacks/s", "Peak MiB",
+                                                       "Speedup"))
+    for result in results:
+        speed = result.get("duels_per_second", result.get("calls_per_second"))
+        speedup = ''
+        if baseline_speed.get(result["name"]):
+            speedup = "{:.2f}x".format(speed / baseline_speed[result["name"]])
+        print("{:<42}{:>12.4f}{:>16.1f}{:>16.1f}{:>12.2f}{:>10}".format(
+            result["name"], result["seconds"], speed, result["attacks_per_second"],
+            result["peak_memory_bytes"] / 2 ** 20, speedup))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark attack(), duel() and aggregate_analyze() with fixed seeds.")
+    parser.add_argument("--groups", nargs="+", default=["micro", "duel", "macro"], choices=["micro", "duel", "macro"],
+                        help="which groups of cases to run")
+    parser.add_argument("--filter", default='', help="only run the cases whose name contains this text")
+    parser.add_argument("--repeat", type=int, default=3, help="the timed runs of each case, the best one is kept")
+    parser.add_argument("--calls", type=int, default=20000, help="how many calls for each micro case")
+    parser.add_argument("--duels", type=int, default=1000, help="how many duels for each duel case")
+    parser.add_argument("--seed", type=int, default=2022)
+    parser.add_argument("--output", default=None,
+                        help="the JSON file to save the results, benchmark_results/<time>.json by default")
+    parser.add_argument("--compare", default=None, help="a JSON file of an earlier run to compare the speed with")
+    options = parser.parse_args()
+
+    benchmark_results = []
+    for case_name, case_group, case_amount, case_prepare in benchmark_cases(options.seed, options.calls,
+                                                                            options.duels):
+        if case_group in options.groups and options.filter in case_name:
+            benchmark_results.append(measure_case(case_name, case_group, case_amount, case_prepare, options.repeat))
+            print("{} done in {:.3f}s".format(case_name, benchmark_results[-1]["seconds"]), file=sys.stderr)
+
+    baseline_results = None
+    if options.compare is not None:
+        with open(options.compare) as compare_file:
+            baseline_results = json.load(compare_file)["results"]
+    show_results(benchmark_results, baseline_results)
+
+    output_path = options.output
+    if output_path is None:
+        output_path = os.path.join("benchmark_results", "{}.json".format(time.strftime("%Y%m%d-%H%M%S")))
+    if os.path.dirname(output_path):
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, "w") as output_file:
+        json.dump({"time": time.strftime("%Y-%m-%d %H:%M:%S"), "commit": git_commit(),
+                   "python": platform.python_version(), "numpy": np.__version__, "machine": platform.platform(),
+                   "seed": options.seed, "repeat": options.repeat, "calls": options.calls, "duels": options.duels,
+                   "results": benchmark_results}, output_file, indent=2)
+    print("Saved to {}".format(output_path))
@@ -0,0 +1,344 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import sys
+import time
+from dataclasses import asdict
+
+import main_final
+from job_server import normalize_scenario, scenario_result, simulate_chunk
+
+DEFAULT_PORT = 5571
+
+
+def encode_message(message: dict) -> bytes:
+    """
+    :param message: the message, the counters may hold numpy integers
+    :return: one line of JSON
+    """
+    return (json.dumps(message, default=lambda value: value.item()) + "\n").encode()
+
+
+def split_chunks(loop_times: int, chunk_duels: int) -> list:
+    """
+    Split the duels of a scenario into chunks of whole blocks, so a chunk gives the same counters on any host.
+
+    :param loop_times: how many duels in total
+    :param chunk_duels: how many duels in a chunk at most, rounded up to a multiple of SIMULATION_BLOCK_SIZE
+    :return: list of (index of the first duel, amount of duels) for each chunk
+    >>> split_chunks(2500, 1000)
+    [(0, 1024), (1024, 1024), (2048, 452)]
+    """
+    blocks_per_chunk = max(1, -(-chunk_duels // main_final.SIMULATION_BLOCK_SIZE))
+    chunk_duels = blocks_per_chunk * main_final.SIMULATION_BLOCK_SIZE
+    return main_final.split_loop_times(loop_times, -(-loop_times // chunk_duels), chunk_duels)
+
+
+class DistributedCoordinator:
+    """
+    Hand out the chunks of one scenario to the workers connecting on a TCP port, and merge their counters.
+    Every message is one line of JSON, the counters are sent as the fields of DuelCounters (never pickled,
+    so a worker cannot run code on the coordinator and the other way round):
+        worker:      {"event": "ready", "worker": str}
+        coordinator: {"event": "chunk", "chunk": int, "scenario": {...}, "first_duel_index": int, "chunk_size": int}
+        worker:      {"event": "result", "chunk": int, "counters": {...}}  or  {"event": "error", "message": str}
+        coordinator: {"event": "stop"}  (after all the chunks are done)
+    A worker gets its next chunk after sending back the last one. If it disconnects, or does not answer within
+    chunk_timeout, its chunk is put back to the queue for another worker. The chunks are merged in their order
+    at the end, so the counters are the same as simulate_counters() of the whole scenario with the same seed,
+    no matter which worker ran which chunk or how many times.
+    >>> from job_server import TEST_SCENARIO
+    >>> async def run_on_localhost(scenario, port, amount_of_workers):
+    ...     coordinator = DistributedCoordinator(scenario, chunk_duels=512)
+    ...     coordinator_run = asyncio.ensure_future(coordinator.run("127.0.0.1", port))
+    ...     await asyncio.sleep(0.2)  # the workers connect after the coordinator listens
+    ...     loop = asyncio.get_running_loop()
+    ...     await asyncio.gather(*[loop.run_in_executor(None, run_worker, "127.0.0.1", port)
+    ...                            for _ in range(amount_of_workers)])
+    ...     return await coordinator_run
+    >>> with socket.socket() as probe:
+    ...     probe.bind(("127.0.0.1", 0))
+    ...     port = probe.getsockname()[1]
+    >>> counters = asyncio.run(run_on_localhost(dict(TEST_SCENARIO, loop_times=1500, engine="batch"), port, 3))
+    >>> counters == main_final.simulate_counters(1500, 6, "MonkeyKing", "BountyHunter", "", "", 20, 0, False, {},
+    ...                                          engine="batch", seed=3)
+    True
+    """
+
+    def __init__(self, scenario: dict, chunk_duels=main_final.SIMULATION_BLOCK_SIZE * 4, chunk_timeout=None,
+                 on_message=None):
+        """
+        :param scenario: the parameters of aggregate_analyze(), see job_server.SCENARIO_PARAMETERS;
+                         without a seed the coordinator picks one, so a reissued chunk runs the same duels
+        :param chunk_duels: how many duels in a chunk at most, rounded up to whole blocks
+        :param chunk_timeout: the seconds a worker has for a chunk before it is given to another worker,
+                              None means only reissuing the chunks of disconnected workers
+        :param on_message: called with a line about each worker and chunk, e.g. print
+        >>> from job_server import TEST_SCENARIO
+        >>> DistributedCoordinator(dict(TEST_SCENARIO, outcome_cache_size=256))  # doctest: +ELLIPSIS
+        Traceback (most recent call last):
+        ...
+        ValueError: No such parameter ['outcome_cache_size'], should be one of [...]
+        """
+        self.scenario = normalize_scenario(scenario)
+        if self.scenario["seed"] is None:
+            self.scenario["seed"] = random.SystemRandom().randrange(2 ** 32)
+        self.chunks = split_chunks(self.scenario["loop_times"], chunk_duels)
+        self.chunk_timeout = chunk_timeout
+        self.on_message = on_message
+        self.queue = asyncio.Queue()
+        for index in range(len(self.chunks)):
+            self.queue.put_nowait(index)
+        self.results = {}  # chunk index -> DuelCounters
+        self.running = {}  # stream to a worker -> the chunk it runs
+        self.handlers = set()  # the tasks answering the workers
+        self.reissued = 0
+        self.error = None
+        self.finished = asyncio.Event()
+
+    def log(self, text: str) -> None:
+        if self.on_message is not None:
+            self.on_message(text)
+
+    async def next_chunk(self):
+        """
+        :return: the index of the next chunk to run, None if the scenario is finished
+        """
+        get_chunk = asyncio.ensure_future(self.queue.get())
+        wait_finished = asyncio.ensure_future(self.finished.wait())
+        done, _ = await asyncio.wait({get_chunk, wait_finished}, return_when=asyncio.FIRST_COMPLETED)
+        wait_finished.cancel()
+        if get_chunk not in done:
+            get_chunk.cancel()
+            return None
+        if self.finished.is_set():
+            self.queue.put_nowait(get_chunk.result())
+            return None
+        return get_chunk.result()
+
+    def reissue(self, index: int, worker: str, reason: str) -> None:
+        """
+        Put the chunk of a lost worker back to the queue, unless another worker has finished it already.
+
+        :param index: the index of the chunk
+        :param worker: the name of the worker
+        :param reason: why the worker is lost
+        :return: None
+        """
+        if index not in self.results and not self.finished.is_set():
+            self.reissued += 1
+            self.queue.put_nowait(index)
+            self.log("Lost {} ({}), chunk {} is reissued".format(worker, reason, index))
+
+    def finish_chunk(self, index: int, counters: main_final.DuelCounters, worker: str) -> None:
+        """
+        :param index: the index of the chunk
+        :param counters: the counters of the chunk
+        :param worker: the name of the worker
+        :return: None
+        """
+        if index in self.results:  # a reissued chunk finished twice, both have the same counters
+            return
+        self.results[index] = counters
+        self.log("Chunk {} done by {}, {}/{} chunks".format(index, worker, len(self.results), len(self.chunks)))
+        if len(self.results) == len(self.chunks):
+            self.finished.set()
+
+    async def handle_worker(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Give chunks to one worker until the scenario is finished, see DistributedCoordinator.
+
+        :param reader: the stream from the worker
+        :param writer: the stream to the worker
+        :return: None
+        """
+        worker = "{}:{}".format(*writer.get_extra_info("peername")[:2])
+        self.handlers.add(asyncio.current_task())
+        try:
+            try:
+                hello = json.loads(await asyncio.wait_for(reader.readline(), self.chunk_timeout))
+                worker = "{} ({})".format(hello["worker"], worker)
+            except (ValueError, TypeError, KeyError, asyncio.TimeoutError, ConnectionError):
+                return
+            self.log("Connected {}".format(worker))
+            while True:
+                index = await self.next_chunk()
+                if index is None:
+                    break
+                first_duel_index, chunk_size = self.chunks[index]
+                self.running[writer] = index
+                try:
+                    writer.write(encode_message({"event": "chunk", "chunk": index, "scenario": self.scenario,
+                                                 "first_duel_index": first_duel_index, "chunk_size": chunk_size}))
+                    await writer.drain()
+                    line = await asyncio.wait_for(reader.readline(), self.chunk_timeout)
+                    if not line:
+                        raise ConnectionError("disconnected")
+                    message = json.loads(line)
+                    if message["event"] == "error":
+                        # the same chunk would fail on every worker, e.g. a model which does not exist
+                        self.error = "Chunk {} failed on {}: {}".format(index, worker, message["message"])
+                        self.finished.set()
+                        return
+                    if message["event"] != "result" or message["chunk"] != index:
+                        raise ValueError("Unexpected message {}".format(message["event"]))
+                    counters = main_final.DuelCounters(**message["counters"])
+                except asyncio.TimeoutError:
+                    self.reissue(index, worker, "no answer in {}s".format(self.chunk_timeout))
+                    return
+                except (ValueError, TypeError, KeyError, ConnectionError) as error:
+                    # json.JSONDecodeError is a ValueError
+                    self.reissue(index, worker, "{}: {}".format(type(error).__name__, error))
+                    return
+                finally:
+                    del self.running[writer]
+                self.finish_chunk(index, counters, worker)
+            writer.write(encode_message({"event": "stop"}))
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            self.handlers.discard(asyncio.current_task())
+
+    async def run(self, host="0.0.0.0", port=DEFAULT_PORT) -> main_final.DuelCounters:
+        """
+        Serve the workers until every chunk is done.
+
+        :param host: the address to listen on, "0.0.0.0" for the workers on the other hosts
+        :param port: the TCP port
+        :return: the counters of the whole scenario
+        """
+        server = await asyncio.start_server(self.handle_worker, host=host, port=port)
+        self.log("Waiting for workers on {}:{}, {} chunks of seed {}".format(host, port, len(self.chunks),
+                                                                             self.scenario["seed"]))
+        async with server:
+            await self.finished.wait()
+            # the workers still running a reissued chunk are not needed any more
+            for writer in list(self.running):
+                writer.close()
+            # the idle workers are told to stop
+            await asyncio.gather(*self.handlers, return_exceptions=True)
+        if self.error is not None:
+            raise ValueError(self.error)
+        counters = main_final.DuelCounters()
+        for index in range(len(self.chunks)):
+            counters.merge(self.results[index])
+        return counters
+
+
+def run_coordinator(scenario: dict, host="0.0.0.0", port=DEFAULT_PORT, chunk_duels=main_final.SIMULATION_BLOCK_SIZE * 4,
+                    chunk_timeout=None, on_message=None) -> dict:
+    """
+    Run a scenario on the workers connecting to this host, see DistributedCoordinator.
+
+    :param scenario: the parameters of aggregate_analyze(), see job_server.SCENARIO_PARAMETERS
+    :param host: the address to listen on
+    :param port: the TCP port
+    :param chunk_duels: how many duels in a chunk at most
+    :param chunk_timeout: the seconds a worker has for a chunk, None means no limit
+    :param on_message: called with a line about each worker and chunk, e.g. print
+    :return: the result of the scenario, the same as job_server.scenario_result() with the reissued chunks
+    """
+    async def coordinate():
+        coordinator = DistributedCoordinator(scenario, chunk_duels, chunk_timeout, on_message)
+        start_time = time.perf_counter()
+        counters = await coordinator.run(host, port)
+        result = scenario_result(coordinator.scenario, counters, time.perf_counter() - start_time)
+        result["chunks"] = len(coordinator.chunks)
+        result["reissued_chunks"] = coordinator.reissued
+        return result
+
+    return asyncio.run(coordinate())
+
+
+def run_worker(host: str, port=DEFAULT_PORT, name=None, connect_timeout=60.0) -> int:
+    """
+    Connect to a coordinator and run its chunks until it says stop or goes away.
+
+    :param host: the host of the coordinator
+    :param port: the TCP port of the coordinator
+    :param name: the name of this worker in the coordinator's log, the host name and the process id by default
+    :param connect_timeout: how many seconds to keep trying while the coordinator is not up yet
+    :return: how many chunks this worker ran
+    """
+    name = name or "{}:{}".format(socket.gethostname(), os.getpid())
+    deadline = time.monotonic() + connect_timeout
+    while True:
+        try:
+            connection = socket.create_connection((host, port))
+            break
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.5)
+
+    chunks_done = 0
+    with connection, connection.makefile("rwb") as stream:
+        try:
+            stream.write(encode_message({"event": "ready", "worker": name}))
+            stream.flush()
+            for line in stream:
+                message = json.loads(line)
+                if message["event"] == "stop":
+                    break
+                try:
+                    counters = simulate_chunk(message["scenario"], message["first_duel_index"], message["chunk_size"])
+                except Exception as error:  # sent to the coordinator, which stops the scenario
+                    stream.write(encode_message({"event": "error",
+                                                 "message": "{}: {}".format(type(error).__name__, error)}))
+                    stream.flush()
+                    break
+                counters.tally()
+                stream.write(encode_message({"event": "result", "chunk": message["chunk"],
+                                             "counters": asdict(counters)}))
+                stream.flush()
+                chunks_done += 1
+        except ConnectionError:
+            # the coordinator is finished or gone, e.g. this worker was too slow and its chunk was reissued
+            pass
+    return chunks_done
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Distributed simulation over TCP. 'coordinator' splits a scenario "
+                                                 "(a JSON file of aggregate_analyze() parameters) into chunks and "
+                                                 "writes the result, 'worker' runs the chunks of a coordinator. "
+                                                 "Start one worker for each core of each host.")
+    parser.add_argument("command", choices=["coordinator", "worker"])
+    parser.add_argument("scenario", nargs="?", help="the scenario file for the coordinator")
+    parser.add_argument("--host", default=None,
+                        help="the address the coordinator listens on (0.0.0.0 by default), "
+                             "or the host of the coordinator for a worker (127.0.0.1 by default)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="the TCP port of the coordinator")
+    parser.add_argument("--chunk-duels", type=int, default=main_final.SIMULATION_BLOCK_SIZE * 4,
+                        help="how many duels in a chunk at most")
+    parser.add_argument("--chunk-timeout", type=float, default=None,
+                        help="the seconds a worker has for a chunk before it is given to another worker")
+    parser.add_argument("--output", default=None, help="write the result to this file instead of printing it")
+    parser.add_argument("--name", default=None, help="the name of the worker in the coordinator's log")
+    options = parser.parse_args()
+
+    if options.command == "coordinator":
+        if options.scenario is None:
+            parser.error("the coordinator needs a scenario file")
+        with open(options.scenario) as scenario_file:
+            loaded_scenario = json.load(scenario_file)
+        try:
+            scenario_output = run_coordinator(loaded_scenario, options.host or "0.0.0.0", options.port,
+                                              options.chunk_duels, options.chunk_timeout,
+                                              lambda text: print(text, file=sys.stderr, flush=True))
+        except ValueError as error:
+            print(error, file=sys.stderr)
+            sys.exit(1)
+        if options.output is None:
+            print(json.dumps(scenario_output, indent=2))
+        else:
+            with open(options.output, "w") as output_file:
+                json.dump(scenario_output, output_file, indent=2)
+    else:
+        print("Ran {} chunks".format(run_worker(options.host or "127.0.0.1", options.port, options.name)),
+              file=sys.stderr)
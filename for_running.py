@@ -5,15 +5,15 @@ if __name__ == "__main__":
 
     level6_result = main_final.aggregate_analyze(2000, 6, "MonkeyKing", "MonkeyKing",
                                                  "Monkey King 1st", "King Monkey 2nd", 20, 0, False, item_dict,
-                                                 True, False, False, False, False, False)
+                                                 True, False, False, False, False, False, engine="batch")
     noMKB_result = main_final.aggregate_analyze(2000, 15, "MonkeyKing", "MonkeyKing",
                                                 "Monkey King 1st", "King Monkey 2nd", 60, 0, False, item_dict,
-                                                True, False, False, False, False, False)
+                                                True, False, False, False, False, False, engine="batch")
     # You could try item "Heart" or "Satanic" here.
     item_dict["MKB"] = 1
     MKB_result = main_final.aggregate_analyze(2000, 15, "MonkeyKing", "MonkeyKing",
                                               "Monkey King 1st", "King Monkey 2nd", 60, 0, False, item_dict,
-                                              True, False, False, False, False, False)
+                                              True, False, False, False, False, False, engine="batch")
 
     main_final.creat_plot(noMKB_result, MKB_result, "Without MKB", "With MKB")
     main_final.creat_plot(noMKB_result, level6_result, "Level 15", "Level 6")
@@ -21,10 +21,10 @@ if __name__ == "__main__":
     item_dict_2 = {}
     level6_main_result = main_final.aggregate_analyze(5000, 6, "BountyHunter", "BountyHunter",
                                                  "Bounty Hunter 1st", "Hunter Bounty 2nd", 20, 1, False, item_dict_2,
-                                                 True, False, False, False, False, True)
+                                                 True, False, False, False, False, True, engine="batch")
 
     level15_main_result = main_final.aggregate_analyze(5000, 15, "BountyHunter", "BountyHunter",
                                                   "Bounty Hunter 1st", "Hunter Bounty 2nd", 60, 1, False, item_dict_2,
-                                                  True, False, False, False, False, True)
+                                                  True, False, False, False, False, True, engine="batch")
 
     main_final.creat_plot(level15_main_result, level6_main_result, "Level 15 main skills", "Level 6 main skills")
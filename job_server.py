@@ -0,0 +1,423 @@
+import argparse
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import main_final
+
+# the parameters of aggregate_analyze() a scenario can set, the rest are decided by the server;
+# the outcome cache is not one of them, the chunks would each have their own cache
+SCENARIO_PARAMETERS = ("loop_times", "hero_level", "hero_1_model", "hero_2_model", "hero_1_name", "hero_2_name",
+                       "number_of_skill_books", "number_of_main_skills", "ultimate_skill", "items_dict", "sub_or_main",
+                       "engine", "seed", "control_variate_samples")
+DEFAULT_SOCKET_PATH = "/tmp/duel_simulation.sock"
+# a small scenario for the examples
+TEST_SCENARIO = {"loop_times": 40, "hero_level": 6, "hero_1_model": "MonkeyKing", "hero_2_model": "BountyHunter",
+                 "hero_1_name": "", "hero_2_name": "", "number_of_skill_books": 20, "number_of_main_skills": 0,
+                 "ultimate_skill": False, "items_dict": {}, "seed": 3}
+
+
+def normalize_scenario(scenario: dict) -> dict:
+    """
+    Check a scenario and fill in the defaults of aggregate_analyze(), so equal scenarios have equal keys.
+
+    :param scenario: the parameters of aggregate_analyze(), see SCENARIO_PARAMETERS
+    :return: the scenario with every parameter of SCENARIO_PARAMETERS
+    >>> scenario = normalize_scenario(dict(TEST_SCENARIO, engine="batch"))
+    >>> scenario["engine"], scenario["sub_or_main"], len(scenario) == len(SCENARIO_PARAMETERS)
+    ('batch', False, True)
+    >>> normalize_scenario(dict(TEST_SCENARIO, workers=2))  # doctest: +ELLIPSIS
+    Traceback (most recent call last):
+    ...
+    ValueError: No such parameter ['workers'], should be one of [...]
+    >>> normalize_scenario(dict(TEST_SCENARIO, outcome_cache_size=256))  # doctest: +ELLIPSIS
+    Traceback (most recent call last):
+    ...
+    ValueError: No such parameter ['outcome_cache_size'], should be one of [...]
+    >>> normalize_scenario({"loop_times": 10})
+    Traceback (most recent call last):
+    ...
+    ValueError: The scenario needs hero_level
+    """
+    if not isinstance(scenario, dict):
+        raise ValueError("The scenario should be a JSON object")
+    unknown = set(scenario) - set(SCENARIO_PARAMETERS)
+    if unknown:
+        raise ValueError('No such parameter {}, should be one of {}'.format(sorted(unknown), list(SCENARIO_PARAMETERS)))
+    parameters = inspect.signature(main_final.aggregate_analyze).parameters
+    normalized = {}
+    for name in SCENARIO_PARAMETERS:
+        if name in scenario:
+            normalized[name] = scenario[name]
+        elif parameters[name].default is inspect.Parameter.empty:
+            raise ValueError("The scenario needs {}".format(name))
+        else:
+            normalized[name] = parameters[name].default
+    if normalized["engine"] not in ("scalar", "batch"):
+        raise ValueError('No such engine {}, should be "scalar" or "batch"'.format(normalized["engine"]))
+    return normalized
+
+
+def scenario_key(scenario: dict) -> str:
+    """
+    :param scenario: from normalize_scenario()
+    :return: the key of the scenario in the result cache
+    >>> scenario_key(normalize_scenario(TEST_SCENARIO)) == scenario_key(normalize_scenario(dict(TEST_SCENARIO,
+    ...                                                                                         engine="scalar")))
+    True
+    >>> scenario_key(normalize_scenario(TEST_SCENARIO)) == scenario_key(normalize_scenario(dict(TEST_SCENARIO,
+    ...                                                                                         seed=4)))
+    False
+    """
+    return hashlib.sha256(json.dumps(scenario, sort_keys=True).encode()).hexdigest()
+
+
+def simulate_chunk(scenario: dict, first_duel_index: int, chunk_size: int) -> main_final.DuelCounters:
+    """
+    The job of a worker process, run a chunk of the duels of a scenario.
+
+    :param scenario: from normalize_scenario()
+    :param first_duel_index: the index of the first duel of the chunk
+    :param chunk_size: how many duels
+    :return: the counters of the chunk
+    """
+    return main_final.simulate_counters(
+        chunk_size, scenario["hero_level"], scenario["hero_1_model"], scenario["hero_2_model"],
+        scenario["hero_1_name"], scenario["hero_2_name"], scenario["number_of_skill_books"],
+        scenario["number_of_main_skills"], scenario["ultimate_skill"], scenario["items_dict"],
+        engine=scenario["engine"], seed=scenario["seed"], first_duel_index=first_duel_index,
+        control_variate_samples=scenario["control_variate_samples"])
+
+
+def scenario_result(scenario: dict, counters: main_final.DuelCounters, seconds: float) -> dict:
+    """
+    :param scenario: from normalize_scenario()
+    :param counters: the counters of all the duels of the scenario
+    :param seconds: how long the duels took
+    :return: the result sent to the clients, "winning_rates" is what aggregate_analyze() returns;
+             with control_variate_samples, "corrected_winning_rates" are the ones of its variance report
+    """
+    sub_winning_rates = counters.winning_rates(False)
+    main_winning_rates = counters.winning_rates(True)
+    result = {"scenario": scenario, "duels": counters.loop_times, "seconds": seconds,
+              "winning_rates": main_winning_rates if scenario["sub_or_main"] else sub_winning_rates,
+              "sub_skills": sub_winning_rates, "main_skills": main_winning_rates,
+              "total_occurrence": {skill: int(count) for skill, count in counters.total_occurrence.items()},
+              "total_occurrence_main_skill": {skill: int(count)
+                                              for skill, count in counters.total_occurrence_main_skill.items()}}
+    if scenario["control_variate_samples"]:
+        reductions = counters.variance_reduction(scenario["sub_or_main"])
+        result["corrected_winning_rates"] = {skill: round(reductions[skill][1] * 100, 2)
+                                             for skill in result["winning_rates"] if skill in reductions}
+    return result
+
+
+class SimulationJob:
+    """One scenario being simulated, every client asking for the same scenario subscribes to it."""
+
+    def __init__(self, key: str, scenario: dict):
+        self.key = key
+        self.scenario = scenario
+        self.subscribers = []  # asyncio.Queue of the messages for each client
+        self.last_progress = None  # sent to the clients subscribing later
+
+    def publish(self, message: dict) -> None:
+        """
+        Send a message to every client of the job.
+
+        :param message: the message
+        :return: None
+        """
+        if message["event"] == "progress":
+            self.last_progress = message
+        for subscriber in self.subscribers:
+            subscriber.put_nowait(message)
+
+
+class SimulationServer:
+    """
+    Run scenarios for the clients on a local socket. A client sends one line of JSON, {"scenario": {...}}, and gets
+    lines of JSON back until the result:
+        {"event": "accepted", "job": ..., "deduplicated": bool, "queued_before": int}
+        {"event": "progress", "duels": int, "loop_times": int, "winning_rates": {...}}  (after each chunk)
+        {"event": "done", "cached": bool, "result": {...}}  or  {"event": "error", "message": str}
+    The scenarios run one after another, the chunks of a scenario run on all the worker processes.
+    A scenario asked for while it is queued or running is not run again, the client follows the same job;
+    a scenario already finished is answered from the result cache.
+    >>> import tempfile
+    >>> async def submit_three(path):
+    ...     serving = asyncio.ensure_future(SimulationServer(workers=1).serve(path))
+    ...     while not os.path.exists(path):
+    ...         await asyncio.sleep(0.01)
+    ...     accepted = []
+    ...     on_message = lambda message: accepted.append(message) if message["event"] == "accepted" else None
+    ...     results = await asyncio.gather(*[submit_scenario(TEST_SCENARIO, path, on_message=on_message)
+    ...                                      for _ in range(2)])
+    ...     results.append(await submit_scenario(TEST_SCENARIO, path))
+    ...     serving.cancel()
+    ...     return accepted, results
+    >>> accepted, results = asyncio.run(submit_three(os.path.join(tempfile.mkdtemp(), "server.sock")))
+    >>> sorted((message["deduplicated"], message["queued_before"]) for message in accepted)
+    [(False, 0), (True, 0)]
+    >>> [(result["event"], result["cached"]) for result in results]
+    [('done', False), ('done', False), ('done', True)]
+    >>> counters = main_final.simulate_counters(*[TEST_SCENARIO[name] for name in SCENARIO_PARAMETERS[:10]],
+    ...                                         seed=TEST_SCENARIO["seed"])
+    >>> all(result["result"]["winning_rates"] == counters.winning_rates() for result in results)
+    True
+    """
+
+    def __init__(self, workers=1, cache_size=256, cache_dir=None):
+        """
+        :param workers: how many worker processes
+        :param cache_size: how many results are kept in memory, the least recently used ones are dropped
+        :param cache_dir: the directory to keep every result as a file, so it survives restarts; None means memory only
+        """
+        self.workers = workers
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.cache_size = cache_size
+        self.cache_dir = cache_dir
+        self.results = OrderedDict()  # key -> result, the most recently used at the end
+        self.jobs = {}  # key -> SimulationJob, queued or running, in the order of the queue
+        self.running = None  # the SimulationJob running
+        self.queue = asyncio.Queue()
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def queued_before(self, key: str) -> int:
+        """
+        :param key: the key of a queued or running scenario
+        :return: how many jobs wait in the queue before it, 0 if it is running
+        >>> server = SimulationServer()
+        >>> server.jobs = {key: SimulationJob(key, {}) for key in ("a", "b", "c")}
+        >>> server.running = server.jobs["a"]
+        >>> [server.queued_before(key) for key in ("a", "b", "c")]
+        [0, 0, 1]
+        >>> server.running = None
+        >>> server.jobs.pop("a") and [server.queued_before(key) for key in ("b", "c")]
+        [0, 1]
+        """
+        if self.running is not None and self.running.key == key:
+            return 0
+        return list(self.jobs).index(key) - (0 if self.running is None else 1)
+
+    def cached_result(self, key: str):
+        """
+        :param key: the key of the scenario
+        :return: the result of the scenario if it is cached, otherwise None
+        >>> import tempfile
+        >>> cache_dir = tempfile.mkdtemp()
+        >>> server = SimulationServer(cache_size=1, cache_dir=cache_dir)
+        >>> server.cache_result("a", {"duels": 1})
+        >>> server.cache_result("b", {"duels": 2})
+        >>> list(server.results)
+        ['b']
+        >>> server.cached_result("a"), server.cached_result("c")
+        ({'duels': 1}, None)
+        >>> SimulationServer(cache_dir=cache_dir).cached_result("b")
+        {'duels': 2}
+        """
+        if key in self.results.keys():
+            self.results.move_to_end(key)
+            return self.results[key]
+        if self.cache_dir is not None and os.path.exists(os.path.join(self.cache_dir, key + ".json")):
+            with open(os.path.join(self.cache_dir, key + ".json")) as result_file:
+                self.cache_result(key, json.load(result_file), False)
+            return self.results[key]
+        return None
+
+    def cache_result(self, key: str, result: dict, write_file=True) -> None:
+        """
+        :param key: the key of the scenario
+        :param result: the result of the scenario
+        :param write_file: also write it to the cache directory
+        :return: None
+        """
+        self.results[key] = result
+        if len(self.results) > self.cache_size:
+            self.results.popitem(last=False)
+        if write_file and self.cache_dir is not None:
+            path = os.path.join(self.cache_dir, key + ".json")
+            with open(path + ".tmp", "w") as result_file:
+                json.dump(result, result_file)
+            os.replace(path + ".tmp", path)
+
+    async def run_jobs(self) -> None:
+        """
+        Run the queued jobs one by one, forever.
+
+        :return: None
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self.queue.get()
+            self.running = job
+            scenario = job.scenario
+            start_time = time.perf_counter()
+            counters = main_final.DuelCounters()
+            # one chunk for each block of duels, so the progress is sent often and the counters do not depend
+            # on the amount of workers
+            chunks = main_final.split_loop_times(scenario["loop_times"],
+                                                 -(-scenario["loop_times"] // main_final.SIMULATION_BLOCK_SIZE),
+                                                 main_final.SIMULATION_BLOCK_SIZE)
+            futures = [loop.run_in_executor(self.executor, functools.partial(simulate_chunk, scenario, *chunk))
+                       for chunk in chunks]
+            try:
+                for future in asyncio.as_completed(futures):
+                    counters.merge(await future)
+                    job.publish({"event": "progress", "duels": counters.loop_times,
+                                 "loop_times": scenario["loop_times"],
+                                 "winning_rates": counters.winning_rates(scenario["sub_or_main"])})
+                result = scenario_result(scenario, counters, time.perf_counter() - start_time)
+                self.cache_result(job.key, result)
+                job.publish({"event": "done", "cached": False, "result": result})
+            except Exception as error:  # the error of a scenario is sent to its clients, the server keeps running
+                for future in futures:
+                    future.cancel()
+                job.publish({"event": "error", "message": "{}: {}".format(type(error).__name__, error)})
+            finally:
+                del self.jobs[job.key]
+                self.running = None
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Answer one client, see SimulationServer.
+
+        :param reader: the stream from the client
+        :param writer: the stream to the client
+        :return: None
+        """
+        async def send(message: dict) -> None:
+            writer.write((json.dumps(message) + "\n").encode())
+            await writer.drain()
+
+        try:
+            try:
+                request = json.loads(await reader.readline())
+                scenario = normalize_scenario(request.get("scenario") if isinstance(request, dict) else None)
+            except ValueError as error:  # json.JSONDecodeError is a ValueError
+                await send({"event": "error", "message": str(error)})
+                return
+            key = scenario_key(scenario)
+            result = self.cached_result(key)
+            if result is not None:
+                await send({"event": "done", "cached": True, "result": result})
+                return
+
+            job = self.jobs.get(key)
+            deduplicated = job is not None
+            if job is None:
+                job = SimulationJob(key, scenario)
+                self.jobs[key] = job
+                self.queue.put_nowait(job)
+            messages = asyncio.Queue()
+            job.subscribers.append(messages)
+            await send({"event": "accepted", "job": key[:16], "deduplicated": deduplicated,
+                        "queued_before": self.queued_before(key)})
+            if job.last_progress is not None:
+                await send(job.last_progress)
+            try:
+                while True:
+                    message = await messages.get()
+                    await send(message)
+                    if message["event"] in ("done", "error"):
+                        break
+            finally:
+                job.subscribers.remove(messages)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            # the client went away, its job keeps running for the other clients and the cache
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, socket_path=None, port=None) -> None:
+        """
+        Serve the clients on a Unix socket, or on a TCP port of 127.0.0.1, until cancelled.
+
+        :param socket_path: the path of the Unix socket
+        :param port: the TCP port, used if socket_path is None
+        :return: None
+        """
+        if socket_path is not None:
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+            server = await asyncio.start_unix_server(self.handle_client, path=socket_path)
+        else:
+            server = await asyncio.start_server(self.handle_client, host="127.0.0.1", port=port)
+        runner = asyncio.ensure_future(self.run_jobs())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            runner.cancel()
+            self.executor.shutdown(cancel_futures=True)
+
+
+async def submit_scenario(scenario: dict, socket_path=None, port=None, on_message=None) -> dict:
+    """
+    Send a scenario to the server and wait for its result.
+
+    :param scenario: the parameters of aggregate_analyze(), see SCENARIO_PARAMETERS
+    :param socket_path: the path of the Unix socket of the server
+    :param port: the TCP port of the server on 127.0.0.1, used if socket_path is None
+    :param on_message: called with every message from the server, e.g. print
+    :return: the last message, {"event": "done", ...} or {"event": "error", ...}
+    """
+    if socket_path is not None:
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+    else:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write((json.dumps({"scenario": scenario}) + "\n").encode())
+    await writer.drain()
+    message = {"event": "error", "message": "The server closed the connection"}
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            message = json.loads(line)
+            if on_message is not None:
+                on_message(message)
+            if message["event"] in ("done", "error"):
+                break
+    finally:
+        writer.close()
+    return message
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local simulation job server. 'serve' runs the server, "
+                                                 "'submit' sends a scenario (a JSON file of aggregate_analyze() "
+                                                 "parameters) and prints the progress and the result.")
+    parser.add_argument("command", choices=["serve", "submit"])
+    parser.add_argument("scenario", nargs="?", help="the scenario file for submit")
+    parser.add_argument("--socket", default=None, help="the Unix socket, {} by default".format(DEFAULT_SOCKET_PATH))
+    parser.add_argument("--port", type=int, default=None, help="use this TCP port of 127.0.0.1 instead of a socket")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="the worker processes of the server")
+    parser.add_argument("--cache-size", type=int, default=256, help="how many results the server keeps in memory")
+    parser.add_argument("--cache-dir", default=None, help="the directory where the server keeps every result")
+    options = parser.parse_args()
+    server_socket = options.socket if options.port is None else None
+    if options.port is None and server_socket is None:
+        server_socket = DEFAULT_SOCKET_PATH
+
+    if options.command == "serve":
+        try:
+            asyncio.run(SimulationServer(options.workers, options.cache_size, options.cache_dir)
+                        .serve(server_socket, options.port))
+        except KeyboardInterrupt:
+            pass
+    else:
+        if options.scenario is None:
+            parser.error("submit needs a scenario file")
+        with open(options.scenario) as scenario_file:
+            last_message = asyncio.run(submit_scenario(json.load(scenario_file), server_socket, options.port,
+                                                       lambda m: print(json.dumps(m), flush=True)))
+        sys.exit(0 if last_message["event"] == "done" else 1)
@@ -1,8 +1,132 @@
-from dataclasses import dataclass
+from collections import OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field, fields
+import heapq
+import itertools
+import json
+import math
+import os
 import random
+import time
 import matplotlib.pyplot as plt
 import numpy as np
 
+# the random streams of a seeded simulation, see simulation_rng()
+SCALAR_BLOCK_STREAM = 0
+BATCH_BLOCK_STREAM = 1
+PAYOFF_STREAM = 2
+# the duels of a simulation are run in blocks, each block has its own random streams
+SIMULATION_BLOCK_SIZE = 512
+
+# the layout of a hero's status values, see HeroStatus
+STATUS_KEYS = ("Strength", "Agility", "Lowest Damage", "Highest Damage", "Max HP", "Armor", "Attack Speed",
+               "Attack Interval", "Current HP", "Regeneration", "Physical Resistance", "Magic Resistance")
+(STRENGTH, AGILITY, LOWEST_DAMAGE, HIGHEST_DAMAGE, MAX_HP, ARMOR, ATTACK_SPEED,
+ ATTACK_INTERVAL, CURRENT_HP, REGENERATION, PHYSICAL_RESISTANCE, MAGIC_RESISTANCE) = range(len(STATUS_KEYS))
+STATUS_INDEX = {key: index for index, key in enumerate(STATUS_KEYS)}
+# the status values calculated before, key: Hero.status_inputs(), value: tuple in the layout of STATUS_KEYS
+STATUS_MEMO = {}
+# armor -> physical resistance, see physical_resistance()
+PHYSICAL_RESISTANCE_TABLE = {}
+# the most values STATUS_MEMO and PHYSICAL_RESISTANCE_TABLE keep, a full one is cleared and filled again
+MEMO_SIZE = 4096
+
+# the 11 sub skills in the order of the skill book list, see Hero.get_random_skill_book()
+SUB_SKILL_NAMES = ("Attribute Bonus", "Corruption", "Armor Bonus", "Thorn Armor", "Curse of Death", "Evasion",
+                   "Fire!", "Smash", "Damage Bonus", "Life Steal", "Crushing")
+# a hero learns 4 sub skills
+SUB_SKILL_SLOTS = 4
+# the main skills and the items in the order of the duel records, see DuelRecorder
+MAIN_SKILL_NAMES = ("JinGu Mastery", "Feast", "Blade Dance", "Moment of Courage", "Coup de Grace", "Grow")
+ITEM_NAMES = ("MKB", "Satanic", "Heart")
+# each skill is a bit of the loadout mask, see skill_mask()
+SUB_SKILL_BITS = {skill_name: 1 << index for index, skill_name in enumerate(SUB_SKILL_NAMES)}
+MAIN_SKILL_BITS = {skill_name: 1 << index for index, skill_name in enumerate(MAIN_SKILL_NAMES)}
+# the most duels DuelCounters keeps as loadout masks before counting them into the dicts
+COUNTER_BUFFER_SIZE = 65536
+# the rows and columns of the skill interaction matrices, the sub skills then the main skills,
+# see count_skill_interactions()
+INTERACTION_SKILL_NAMES = SUB_SKILL_NAMES + MAIN_SKILL_NAMES
+
+# the kinds of events recorded by DuelTracer, and how each of them is shown
+EVENT_NAMES = ("Attack", "Evade", "Critical", "Smash", "Crushing", "Feast", "Jingu Start", "Jingu End",
+               "Thorn Armor", "Curse", "Death")
+(EVENT_ATTACK, EVENT_EVADE, EVENT_CRITICAL, EVENT_SMASH, EVENT_CRUSHING, EVENT_FEAST, EVENT_JINGU_START,
+ EVENT_JINGU_END, EVENT_THORN_ARMOR, EVENT_CURSE, EVENT_DEATH) = range(len(EVENT_NAMES))
+EVENT_FORMATS = ("{hero} attacks, enemy takes damage {value}", "{hero} evaded successfully",
+                 "{hero} triggered critical, critical rate {value}", "{hero} triggered Smash, deal damage {value}",
+                 "{hero} triggered Crushing, deal damage {value}", "{hero} triggered Feast, deal damage {value}",
+                 "{hero} triggered Jingu Mastery, damage bonus {value}",
+                 "{hero}'s Jingu Mastery ends, lose damage bonus {value}",
+                 "{hero} triggered Thorn Armor, reflected damage {value}", "{hero} loses {value} HP due to curse",
+                 "{hero} is killed, HP {value}")
+# one event of DuelTracer, hero is 1 or 2 for the first or the second hero of the duel
+EVENT_DTYPE = np.dtype([("duel", np.int32), ("time", np.float32), ("kind", np.int8), ("hero", np.int8),
+                        ("value", np.float32)])
+# the tracer of the duel being run, only set by duel() during a sampled duel, see DuelTracer
+ACTIVE_TRACER = None
+
+# the sources counted by DuelTelemetry, see DuelTelemetry for what the amount of each source means
+TELEMETRY_SOURCES = ("Attack", "Evasion", "MKB", "Smash", "Crushing", "Blade Dance", "Coup de Grace", "Feast",
+                     "Life Steal", "Thorn Armor", "Curse of Death", "Moment of Courage", "JinGu Mastery",
+                     "Life Steal Healing", "Regeneration")
+(TELEMETRY_ATTACK, TELEMETRY_EVASION, TELEMETRY_MKB, TELEMETRY_SMASH, TELEMETRY_CRUSHING, TELEMETRY_BLADE_DANCE,
+ TELEMETRY_COUP_DE_GRACE, TELEMETRY_FEAST, TELEMETRY_LIFE_STEAL, TELEMETRY_THORN_ARMOR, TELEMETRY_CURSE_OF_DEATH,
+ TELEMETRY_MOMENT_OF_COURAGE, TELEMETRY_JINGU_MASTERY, TELEMETRY_LIFE_STEAL_HEALING,
+ TELEMETRY_REGENERATION) = range(len(TELEMETRY_SOURCES))
+TELEMETRY_INDEX = {source: index for index, source in enumerate(TELEMETRY_SOURCES)}
+# the telemetry of the duel being run, only set by duel() when it is given a DuelTelemetry
+ACTIVE_TELEMETRY = None
+# the columns of the duel records and their types, each row is one duel
+RECORD_COLUMNS = {"sub_skills": np.int8,  # (2, 11) the level of each sub skill of the two heroes
+                  "main_skills": np.int8,  # (2, 6) the level of each main skill of the two heroes
+                  "items": np.int8,  # (2, 3) the amount of each item of the two heroes
+                  "hero_1_wins": np.bool_,
+                  "duel_time": np.float32,  # the time when the duel is over, nan if decided by the outcome cache
+                  "remaining_hp": np.float32}  # (2,) the current HP of the two heroes after the duel, nan if cached
+# the most rows kept in memory before they are written to a chunk of files
+RECORD_CHUNK_SIZE = 65536
+
+
+class HeroStatus(Mapping):
+    """
+    A hero's real-time attributes in a fixed-layout list of floats.
+    It still works like the old status dict, status["Current HP"] is status.array[CURRENT_HP].
+
+    >>> status = HeroStatus()
+    >>> status["Current HP"] = 500
+    >>> status.array[CURRENT_HP]
+    500
+    >>> status.array[MAX_HP] = 600.0
+    >>> status["Max HP"], len(status), "Armor" in status
+    (600.0, 12, True)
+    """
+    __slots__ = ("array",)
+
+    def __init__(self):
+        self.array = [0.0] * len(STATUS_KEYS)
+
+    def __getitem__(self, key):
+        return self.array[STATUS_INDEX[key]]
+
+    def __setitem__(self, key, value):
+        self.array[STATUS_INDEX[key]] = value
+
+    def __iter__(self):
+        return iter(STATUS_KEYS)
+
+    def __len__(self):
+        return len(STATUS_KEYS)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def copy(self) -> 'HeroStatus':
+        status = object.__new__(HeroStatus)
+        status.array = self.array.copy()
+        return status
+
 
 @dataclass
 class Hero:
@@ -48,7 +172,11 @@ class Hero:
     pierce: dict  # the possibility of ignoring evasion
     ultimate_skill: str  # if the hero has learned ultimate skill or not
 
-    status: dict  # records hero's various real-time attributes like current HP
+    status: HeroStatus  # records hero's various real-time attributes like current HP
+    effects: 'HeroEffects'  # the effect handlers of the hero, compiled by compile_effects()
+
+    # no per-instance __dict__, heroes are created for every duel and sent to worker processes
+    __slots__ = tuple(__annotations__)
 
     def __init__(self, hero_level=1):
         """
@@ -69,12 +197,64 @@ class Hero:
         self.other_positive_effect = {}
         self.other_negative_effect = {}
         self.critical_list = {}
-        self.status = {}
+        self.status = HeroStatus()
         self.main_skill_list = {}
         self.hero_level = hero_level
         self.life_steal_rate = 0
         self.pierce = {}
         self.ultimate_skill = ''
+        self.effects = HeroEffects()
+
+    def clone(self) -> 'Hero':
+        """
+        Copy the hero cheaply, the dicts are copied so the new hero can learn skills and fight on its own.
+
+        :return: the new hero
+        >>> monkey_king = HeroMonkeyKing(10)
+        >>> monkey_king.equip_satanic(1)
+        >>> new_monkey_king = monkey_king.clone()
+        >>> new_monkey_king.learn_skill_smash(3)
+        >>> new_monkey_king.calculate_status()
+        >>> "Smash" in monkey_king.skill_list.keys(), new_monkey_king.life_steal_rate, monkey_king.status["Max HP"]
+        (False, 25, 0.0)
+        """
+        # one assignment for each field, much faster than a loop of setattr()
+        # the values of critical_list are never changed in place, the effect handlers are never changed
+        hero = object.__new__(type(self))
+        hero.name = self.name
+        hero.base_attack_time = self.base_attack_time
+        hero.basic_attack_speed = self.basic_attack_speed
+        hero.basic_lowest_damage = self.basic_lowest_damage
+        hero.basic_highest_damage = self.basic_highest_damage
+        hero.basic_armor = self.basic_armor
+        hero.basic_hit_point = self.basic_hit_point
+        hero.basic_regeneration = self.basic_regeneration
+        hero.main_attribute = self.main_attribute
+        hero.basic_strength = self.basic_strength
+        hero.basic_agility = self.basic_agility
+        hero.strength_level_growth = self.strength_level_growth
+        hero.agility_level_growth = self.agility_level_growth
+        hero.bonus_strength = self.bonus_strength
+        hero.bonus_agility = self.bonus_agility
+        hero.bonus_damage_without_main_attribute = self.bonus_damage_without_main_attribute
+        hero.evasion_list = self.evasion_list.copy()
+        hero.bonus_attack_speed_without_agility = self.bonus_attack_speed_without_agility
+        hero.bonus_armor_without_agility = self.bonus_armor_without_agility
+        hero.bonus_regeneration_without_strength = self.bonus_regeneration_without_strength
+        hero.bonus_hit_point_without_strength = self.bonus_hit_point_without_strength
+        hero.skill_list = self.skill_list.copy()
+        hero.attack_attachment = self.attack_attachment.copy()
+        hero.other_positive_effect = self.other_positive_effect.copy()
+        hero.other_negative_effect = self.other_negative_effect.copy()
+        hero.critical_list = self.critical_list.copy()
+        hero.main_skill_list = self.main_skill_list.copy()
+        hero.hero_level = self.hero_level
+        hero.life_steal_rate = self.life_steal_rate
+        hero.pierce = self.pierce.copy()
+        hero.ultimate_skill = self.ultimate_skill
+        hero.status = self.status.copy()
+        hero.effects = self.effects
+        return hero
 
     def set_name(self, name: str) -> None:
         """
@@ -525,13 +705,16 @@ class Hero:
         _, new_level = self.learn_skill_book("Smash", qty_of_books)
         self.attack_attachment["Smash"] = new_level
 
-    def get_random_skill_book(self, amount_of_skill_book: int) -> None:
+    def get_random_skill_book(self, amount_of_skill_book: int, skill_book_list=None, rng=random) -> None:
         """
         Roll random amount of skill books. The hero will learn the 4 skills with the highest amount of skill book.
         E.g., rolled 20 skill books for [2, 5, 2, 3, 0 ,1, 2, 2, 2, 1, 2]
         The hero will learn level 5 skill, level 3 skill and randomly pick two level 2 skills.
 
         :param amount_of_skill_book: how many skill books the hero will get
+        :param skill_book_list: the skill books already rolled for each of the 11 sub skills (e.g., rolled
+                                together for many heroes by numpy), amount_of_skill_book is ignored if given
+        :param rng: the random generator, the global random module by default
         :return: None
         >>> hero_object = Hero(10)
         >>> len(hero_object.skill_list.keys())
@@ -544,10 +727,17 @@ class Hero:
         ...     skill_level_sum += hero_object.skill_list[key]  # This doctest has an extremely low possibility to fail
         >>> skill_level_sum >= 20                               # E.g., Rolled(1,11) and got 1 for all the 55 times
         True
+        >>> hero_object_2 = Hero(10)
+        >>> hero_object_2.get_random_skill_book(0, [2, 5, 2, 3, 0, 1, 0, 0, 0, 1, 0])
+        >>> sorted(hero_object_2.skill_list.items())
+        [('Armor Bonus', 2), ('Attribute Bonus', 2), ('Corruption', 5), ('Thorn Armor', 3)]
         """
-        skill_book_list = [0] * 11
-        for i in range(0, amount_of_skill_book):
-            skill_book_list[random.randint(0, 10)] += 1
+        if skill_book_list is None:
+            skill_book_list = [0] * 11
+            for i in range(0, amount_of_skill_book):
+                skill_book_list[rng.randint(0, 10)] += 1
+        else:
+            skill_book_list = list(skill_book_list)
 
         list_max = [0] * 11
         count = 0
@@ -563,7 +753,7 @@ class Hero:
                     elif list_max[i] > max_level:
                         list_result[i] = list_max[i]
                 for i in range(0, 4 - last_count):
-                    k = random.choice(list(dict_random.keys()))
+                    k = rng.choice(list(dict_random.keys()))
                     list_result[k] = max_level
                     dict_random.pop(k)
 
@@ -718,6 +908,54 @@ class Hero:
         >>> round(monkey_king.status["Attack Interval"], 4)
         0.5226
         """
+        # the status only changes when a learn or equip call changed the inputs
+        inputs = self.status_inputs()
+        if inputs in STATUS_MEMO.keys():
+            self.status.array[:] = STATUS_MEMO[inputs]
+        else:
+            self.calculate_status_from_inputs()
+            if len(STATUS_MEMO) >= MEMO_SIZE:
+                STATUS_MEMO.clear()
+            STATUS_MEMO[inputs] = tuple(self.status.array)
+
+        if "MKB" in self.attack_attachment.keys():
+            self.pierce["MKB"] = pierce_possibility_mkb(self.attack_attachment["MKB"]) * 100
+        self.compile_effects()
+
+    def status_inputs(self) -> tuple:
+        """
+        All the things calculate_status_from_inputs() reads, the basic values and the growth are usually decided
+        by the hero model, but they can be changed on a hero too.
+
+        :return: tuple, the key of STATUS_MEMO
+        >>> monkey_king = HeroMonkeyKing(10)
+        >>> inputs = monkey_king.status_inputs()
+        >>> monkey_king.learn_skill_crushing(3)
+        >>> monkey_king.status_inputs() == inputs
+        True
+        >>> monkey_king.learn_skill_armor_bonus(3)
+        >>> monkey_king.status_inputs() == inputs
+        False
+        >>> monkey_king = HeroMonkeyKing(10)
+        >>> monkey_king.basic_armor += 10
+        >>> monkey_king.calculate_status()
+        >>> round(monkey_king.status["Armor"], 3)
+        20.848
+        """
+        return (self.hero_level, self.main_attribute, self.basic_strength, self.strength_level_growth,
+                self.basic_agility, self.agility_level_growth, self.basic_lowest_damage, self.basic_highest_damage,
+                self.basic_hit_point, self.basic_armor, self.basic_attack_speed, self.base_attack_time,
+                self.basic_regeneration, self.bonus_strength, self.bonus_agility,
+                self.bonus_damage_without_main_attribute, self.bonus_attack_speed_without_agility,
+                self.bonus_armor_without_agility, self.bonus_hit_point_without_strength,
+                self.other_positive_effect.get("Heart", 0))
+
+    def calculate_status_from_inputs(self) -> None:
+        """
+        Calculate the status from scratch, see calculate_status().
+
+        :return: None
+        """
         self.status["Strength"] = self.basic_strength + self.hero_level * self.strength_level_growth \
                                   + self.bonus_strength
         self.status["Agility"] = self.basic_agility + self.hero_level * self.agility_level_growth + self.bonus_agility
@@ -742,12 +980,58 @@ class Hero:
         self.status["Regeneration"] = self.basic_regeneration + self.status["Strength"] / 10
         if "Heart" in self.other_positive_effect.keys():
             self.status["Regeneration"] += self.other_positive_effect["Heart"] * 0.016 * self.status["Max HP"]
-        self.status["Physical Resistance"] = 1 - (0.052 * self.status["Armor"]) / (
-                0.9 + 0.048 * abs(self.status["Armor"]))
+        self.status["Physical Resistance"] = physical_resistance(self.status["Armor"])
         self.status["Magic Resistance"] = 0.25
 
-        if "MKB" in self.attack_attachment.keys():
-            self.pierce["MKB"] = pierce_possibility_mkb(self.attack_attachment["MKB"]) * 100
+    def compile_effects(self) -> None:
+        """
+        Turn the learned skills, items and main skills into lists of effect handlers with their numbers resolved,
+        so that each attack only runs the effects the hero really has.
+        The skills of a hero do not change during a duel, this is called at the end of calculate_status().
+
+        :return: None
+        >>> monkey_king = HeroMonkeyKing(10)
+        >>> monkey_king.learn_skill_smash(3)
+        >>> monkey_king.equip_monkey_king_bar(1)
+        >>> monkey_king.calculate_status()
+        >>> [handler.__name__ for handler, _ in monkey_king.effects.un_evadable]
+        ['effect_smash', 'effect_pierce']
+        >>> monkey_king.effects.un_evadable[0][1]
+        (140, 0.03)
+        >>> [handler.__name__ for handler, _ in monkey_king.effects.after_attack]
+        ['effect_jingu_mastery']
+        >>> monkey_king.effects.evadable
+        []
+        """
+        effects = HeroEffects()
+        # the order of the handlers is the order of the random numbers they use, see attack()
+        if 'Smash' in self.skill_list.keys():
+            skill_level = self.skill_list['Smash']
+            effects.un_evadable.append((effect_smash, (80 + 20 * skill_level, 0.01 * skill_level)))
+        for key in self.pierce.keys():
+            effects.un_evadable.append((effect_pierce, (key, self.pierce[key])))
+        for critical_skill in self.critical_list.keys():
+            effects.critical.append((effect_critical, tuple(self.critical_list[critical_skill]) + (critical_skill,)))
+        if 'Crushing' in self.skill_list.keys():
+            skill_level = self.skill_list['Crushing']
+            crush_damage = 50 + 50 * skill_level
+            crush_damage += 0.5 * skill_level * self.status["Strength"]
+            effects.evadable.append((effect_crushing, crush_damage))
+        if "Feast" in self.main_skill_list.keys():
+            skill_level = self.main_skill_list["Feast"]
+            effects.evadable.append((effect_feast, (0.01 + 0.006 * skill_level, 0.004 + 0.002 * skill_level)))
+        if "Life Steal" in self.skill_list.keys():
+            effects.evadable.append((effect_life_steal, self.skill_list["Life Steal"] * 5 + 20))
+        if "Fire!" in self.skill_list.keys():
+            effects.normal_attack.append((effect_fire, None))
+        if "Thorn Armor" in self.skill_list.keys():
+            effects.defend.append((effect_thorn_armor, self.other_positive_effect["Physical Damage Reflection"]))
+        if "Curse of Death" in self.skill_list.keys():
+            effects.defend.append((effect_curse_of_death, self.other_positive_effect["Curse Reg Reduction"]))
+        if "JinGu Mastery" in self.main_skill_list.keys():
+            skill_level = self.main_skill_list["JinGu Mastery"]
+            effects.after_attack.append((effect_jingu_mastery, (skill_level * 30 + 10, 15 * skill_level + 10)))
+        self.effects = effects
 
     def taken_physical_damage(self, physical_damage_amount: float) -> int:
         """
@@ -776,8 +1060,8 @@ class Hero:
         >>> int(monkey_king_2.status["Current HP"])
         1253
         """
-        actual_damage = physical_damage_amount * self.status["Physical Resistance"]
-        self.status["Current HP"] -= actual_damage
+        actual_damage = physical_damage_amount * self.status.array[PHYSICAL_RESISTANCE]
+        self.status.array[CURRENT_HP] -= actual_damage
         actual_damage = round(actual_damage)
         return actual_damage
 
@@ -798,8 +1082,8 @@ class Hero:
         >>> int(monkey_king.status["Current HP"])
         449
         """
-        actual_damage = magical_damage_amount * (1 - self.status["Magic Resistance"])
-        self.status["Current HP"] -= actual_damage
+        actual_damage = magical_damage_amount * (1 - self.status.array[MAGIC_RESISTANCE])
+        self.status.array[CURRENT_HP] -= actual_damage
         actual_damage = round(actual_damage)
         return actual_damage
 
@@ -818,7 +1102,7 @@ class Hero:
         >>> int(monkey_king.status["Current HP"])
         424
         """
-        self.status["Current HP"] -= true_damage_amount
+        self.status.array[CURRENT_HP] -= true_damage_amount
         actual_damage = round(true_damage_amount)
         return actual_damage
 
@@ -845,9 +1129,9 @@ class Hero:
         >>> monkey_king.life_steal_regenerate(24)
         24
         """
-        current_hp = self.status["Current HP"]
-        self.status["Current HP"] = min(current_hp + life_steal_amount, self.status["Max HP"])
-        actual_amount = round(self.status["Current HP"] - current_hp)
+        current_hp = self.status.array[CURRENT_HP]
+        self.status.array[CURRENT_HP] = min(current_hp + life_steal_amount, self.status.array[MAX_HP])
+        actual_amount = round(self.status.array[CURRENT_HP] - current_hp)
         return actual_amount
 
     def regenerate_and_curse(self, time_second: float, show_all_the_details=False) -> int:
@@ -874,7 +1158,8 @@ class Hero:
         >>> monkey_king.regenerate_and_curse(1, False)
         -190
         """
-        regenerate_hp = self.status["Regeneration"] * time_second
+        regenerate_hp = self.status.array[REGENERATION] * time_second
+        curse_damage = 0
         if show_all_the_details:
             print("{} regenerates HP {}".format(self.name, regenerate_hp))
 
@@ -884,12 +1169,18 @@ class Hero:
             # other_negative_effect["Curse Damage"] : curse damage per second
             regenerate_hp = (100 - self.other_negative_effect["Curse Reg Reduction"]) / 100 * regenerate_hp
             curse_damage = self.other_negative_effect["Curse Damage"] * time_second
+            if ACTIVE_TRACER is not None:
+                ACTIVE_TRACER.emit(EVENT_CURSE, self, curse_damage)
+            if ACTIVE_TELEMETRY is not None:
+                ACTIVE_TELEMETRY.add(ACTIVE_TELEMETRY.opponent(self), TELEMETRY_CURSE_OF_DEATH, curse_damage)
             if show_all_the_details:
                 print("{} Affected by Curse of Death, actual regenerates HP {}, lose {} HP due to curse."
                       .format(self.name, regenerate_hp, curse_damage))
-            regenerate_hp -= curse_damage
 
-        self.status["Current HP"] = min(self.status["Max HP"], self.status["Current HP"] + regenerate_hp)
+        if ACTIVE_TELEMETRY is not None:
+            ACTIVE_TELEMETRY.add(self, TELEMETRY_REGENERATION, regenerate_hp)
+        regenerate_hp -= curse_damage
+        self.status.array[CURRENT_HP] = min(self.status.array[MAX_HP], self.status.array[CURRENT_HP] + regenerate_hp)
         regenerate_hp = round(regenerate_hp)
         return regenerate_hp
 
@@ -1014,12 +1305,13 @@ class Hero:
         self.ultimate_skill = "Grow"
         return None
 
-    def roll_main_skill(self, amount_of_main_skill: int, learn_ultimate_or_not=False) -> None:
+    def roll_main_skill(self, amount_of_main_skill: int, learn_ultimate_or_not=False, rng=random) -> None:
         """
         The hero will randomly learn certain amount of main skills.
 
         :param amount_of_main_skill: how many main skills the hero will get
         :param learn_ultimate_or_not: whether learn an ultimate skill or not (do not count in as amount_of_main_skill)
+        :param rng: the random generator, the global random module by default
         :return: None
         >>> hero_object = Hero(15)
         >>> hero_object.roll_main_skill(3, False)
@@ -1038,7 +1330,7 @@ class Hero:
         while True:
             if count == amount_of_main_skill:
                 break
-            randon_int = random.randint(1, 4)
+            randon_int = rng.randint(1, 4)
             if randon_int == 1:
                 if "JinGu Mastery" not in self.main_skill_list.keys():
                     self.learn_main_skill_jingu_mastery()
@@ -1056,7 +1348,7 @@ class Hero:
                     self.learn_main_skill_moment_of_courage()
                     count += 1
         if learn_ultimate_or_not:
-            randon_int = random.randint(1, 2)
+            randon_int = rng.randint(1, 2)
             if randon_int == 1:
                 if "Coup de Grace" not in self.main_skill_list.keys():
                     self.learn_main_skill_coup_de_grace()
@@ -1065,7 +1357,8 @@ class Hero:
                     self.learn_main_skill_grow()
 
 
-def attack(attack_hero: Hero, defend_hero: Hero, show_log_or_not=False, show_all_the_details=False) -> list:
+def attack(attack_hero: Hero, defend_hero: Hero, show_log_or_not=False, show_all_the_details=False,
+           rng=random) -> list:
     """
     One hero attacks another hero once.
 
@@ -1073,6 +1366,7 @@ def attack(attack_hero: Hero, defend_hero: Hero, show_log_or_not=False, show_all
     :param show_all_the_details: whether show the details of attack damage composition in log or not
     :param attack_hero: the hero who attacks
     :param defend_hero: the hero who defends the attack
+    :param rng: the random generator, the global random module by default
     :return: damage_list: the list of the attack result
     >>> monkey_king = HeroMonkeyKing(1)
     >>> life_stealer = HeroLifeStealer(1)
@@ -1103,156 +1397,324 @@ def attack(attack_hero: Hero, defend_hero: Hero, show_log_or_not=False, show_all
     >>> attack(life_stealer, monkey_king)
     [0, 0, 0]
     """
-    attack_damage = random.uniform(attack_hero.status['Lowest Damage'], attack_hero.status['Highest Damage'])
-    # evadable physical damage, evadable magic damage, evadable true damage
-    # un-evadable physical damage, un-evadable magic damage, un-evadable true damage
-    # self-taken physical damage (comes from skills like Thorn Armor), self-taken magic damage
-    # life-steal, attack_damage_without_attachments
-    damage_list = [0] * 11
-
-    life_steal_rate = attack_hero.life_steal_rate
-    evaded = False
-    pierce = False
-
-    un_evadable_physical_damage = 0
-    un_evadable_magic_damage = 0
-    un_evadable_true_damage = 0
-    evadable_physical_damage = 0
-    evadable_magic_damage = 0
-    evadable_true_damage = 0
-    attacker_take_physical_damage = 0
-    attacker_take_magic_damage = 0
-    attacker_take_true_damage = 0
-    normal_attack_damage = 0
-    life_steal_amount = 0
-
     attack_result = [0, 0, 0]
 
-    if attack_hero.status["Current HP"] <= 0 or defend_hero.status["Current HP"] <= 0:
+    if attack_hero.status.array[CURRENT_HP] <= 0 or defend_hero.status.array[CURRENT_HP] <= 0:
         # one side has already been killed before attack
         # for example, die because of the damage from Curse of Death
         return attack_result
 
+    # all the random numbers of this attack are drawn at once, they are used in this order:
+    # damage, Smash, each pierce, each evasion, each critical, Crushing, Life Steal
+    # int(roll * 100) + 1 is the same as randint(1, 100), int(roll * 101) is the same as randint(0, 100)
+    roll = iter(draw_rolls(rng, 4 + len(attack_hero.pierce) + len(defend_hero.evasion_list)
+                           + len(attack_hero.critical_list)))
+    attack_damage = attack_hero.status.array[LOWEST_DAMAGE] \
+        + (attack_hero.status.array[HIGHEST_DAMAGE] - attack_hero.status.array[LOWEST_DAMAGE]) * next(roll)
+    strike = Strike(attack_hero, defend_hero, roll, attack_hero.life_steal_rate, show_all_the_details, [0] * 11)
+    effects = attack_hero.effects
+    if ACTIVE_TELEMETRY is not None:
+        ACTIVE_TELEMETRY.start_attack()
+
     # calculate un-evadable damage first
-    # in our model, only Smash is un-evadable
-    if 'Smash' in attack_hero.skill_list.keys():
-        if random.randint(1, 100) <= 20:
-            skill_level = attack_hero.skill_list['Smash']
-            smash_damage = 80 + 20 * skill_level  # Basic damage
-            smash_damage += 0.01 * skill_level * defend_hero.status["Max HP"]  # decided by enemy max HP
-            un_evadable_physical_damage += smash_damage
-            if show_all_the_details:
-                print("{} triggered Smash, deal damage {}".format(attack_hero.name, smash_damage))
-
-    # calculate if this attack is evaded
-    for key in attack_hero.pierce.keys():
-        if random.randint(1, 100) <= attack_hero.pierce[key]:
-            pierce = True
-            if key == "MKB":
-                # un-evadable magic damage from MKB
-                if show_all_the_details:
-                    print("{} triggered MKB, deal damage {}".format(attack_hero.name, 70))
-                un_evadable_magic_damage += 70
-
-    damage_list[3] = un_evadable_physical_damage
-    damage_list[4] = un_evadable_magic_damage
-    damage_list[5] = un_evadable_true_damage
-
-    if not pierce:
-        # MKB not triggered, can evade
-        if len(defend_hero.evasion_list.keys()) != 0:
-            for evasion_skill in defend_hero.evasion_list:
-                evasion_possibility = defend_hero.evasion_list[evasion_skill]
-                if random.randint(0, 100) <= evasion_possibility:
-                    # evade successfully
-                    evaded = True
-                    break
-    if evaded:
-        if show_log_or_not:
-            print("{} evaded successfully.".format(defend_hero.name))
-        attack_result = damage_calculation(attack_hero, defend_hero, damage_list, show_log_or_not, show_all_the_details)
-        return attack_result
+    # in our model, only Smash is un-evadable, MKB decides if this attack can be evaded
+    for handler, parameter in effects.un_evadable:
+        handler(strike, parameter)
 
-    highest_critical_rate = 100
+    if not strike.pierce:
+        # MKB not triggered, can evade
+        for evasion_possibility in defend_hero.evasion_list.values():
+            if int(next(roll) * 101) <= evasion_possibility:
+                # evade successfully
+                if show_log_or_not:
+                    print("{} evaded successfully.".format(defend_hero.name))
+                attack_result = damage_calculation(attack_hero, defend_hero, strike.damage_list, show_log_or_not,
+                                                   show_all_the_details)
+                if ACTIVE_TELEMETRY is not None:
+                    ACTIVE_TELEMETRY.add(defend_hero, TELEMETRY_EVASION)
+                if ACTIVE_TRACER is not None:
+                    ACTIVE_TRACER.emit(EVENT_EVADE, defend_hero)
+                    ACTIVE_TRACER.emit(EVENT_ATTACK, attack_hero, attack_result[1])
+                return attack_result
 
     # attack might be critical
     # each critical is independent, the final damage only counts the highest critical rate
-    if len(attack_hero.critical_list.keys()) != 0:
-        for critical_skill in attack_hero.critical_list.keys():
-            if random.randint(1, 100) <= attack_hero.critical_list[critical_skill][0]:
-                highest_critical_rate = max(highest_critical_rate, attack_hero.critical_list[critical_skill][1])
+    for handler, parameter in effects.critical:
+        handler(strike, parameter)
+    if ACTIVE_TRACER is not None and strike.highest_critical_rate != 100:
+        ACTIVE_TRACER.emit(EVENT_CRITICAL, attack_hero, strike.highest_critical_rate)
     if show_all_the_details:
-        if highest_critical_rate != 100:
-            print("{} triggered critical, critical rate {}".format(attack_hero.name, highest_critical_rate))
-    normal_attack_damage += highest_critical_rate / 100 * attack_damage
-    evadable_physical_damage += normal_attack_damage
-
-    if 'Crushing' in attack_hero.skill_list.keys():
-        if random.randint(1, 100) <= 15:
-            skill_level = attack_hero.skill_list['Crushing']
-            crush_damage = 50 + 50 * skill_level  # Basic damage
-            crush_damage += 0.5 * skill_level * attack_hero.status["Strength"]  # decided by enemy max HP
-            evadable_true_damage += crush_damage
-            if show_all_the_details:
-                print("{} triggered Crushing, deal damage {}".format(attack_hero.name, crush_damage))
+        if strike.highest_critical_rate != 100:
+            print("{} triggered critical, critical rate {}".format(attack_hero.name, strike.highest_critical_rate))
+    normal_attack_damage = strike.highest_critical_rate / 100 * attack_damage
+    strike.damage_list[0] += normal_attack_damage
+    strike.damage_list[10] = normal_attack_damage
 
-    if "Feast" in attack_hero.main_skill_list.keys():
-        # Feast cause evadable physical damage
-        feast_life_steal = (0.01 + 0.006 * attack_hero.main_skill_list["Feast"]) * defend_hero.status["Max HP"]
-        feast_extra_damage = (0.004 + 0.002 * attack_hero.main_skill_list["Feast"]) * defend_hero.status["Max HP"]
-        life_steal_amount += feast_life_steal
-        if show_all_the_details:
-            print("{} triggered Feast, deal damage {}, life steal amount {}."
-                  .format(attack_hero.name, feast_extra_damage, feast_life_steal))
-        evadable_physical_damage += feast_extra_damage
-
-    if "Life Steal" in attack_hero.skill_list.keys():
-        # Life Steal only consider actual damage from normal attack (affected by defend hero's physical resistance)
-        if random.randint(1, 100) <= 30:
-            life_steal_bonus = attack_hero.skill_list["Life Steal"] * 5 + 20
-            life_steal_rate += life_steal_bonus
-            if show_all_the_details:
-                print("{} triggered Life Steal, life steal rate bonus {}%.".format(attack_hero.name, life_steal_bonus))
-
-    damage_list[0] = evadable_physical_damage
-    damage_list[1] = evadable_magic_damage
-    damage_list[2] = evadable_true_damage
-
-    damage_list[6] = attacker_take_physical_damage
-    damage_list[7] = attacker_take_magic_damage
-    damage_list[8] = attacker_take_true_damage
+    for handler, parameter in effects.evadable:
+        handler(strike, parameter)
 
-    damage_list[9] = life_steal_amount
-    damage_list[10] = normal_attack_damage
-    attack_result = damage_calculation(attack_hero, defend_hero, damage_list, life_steal_rate,
+    attack_result = damage_calculation(attack_hero, defend_hero, strike.damage_list, strike.life_steal_rate,
                                        show_log_or_not, show_all_the_details)
 
-    if "JinGu Mastery" in attack_hero.main_skill_list.keys():
-        attack_hero.other_positive_effect["JinGu Mastery Attack Times"] += 1
-        if attack_hero.other_positive_effect["JinGu Mastery Attack Times"] == -1:
-            attack_hero.other_positive_effect["JinGu Mastery Attack Times"] = 1
-            bonus_jingu_damage = attack_hero.main_skill_list["JinGu Mastery"] * 30 + 10
-            attack_hero.status['Lowest Damage'] += bonus_jingu_damage
-            attack_hero.status['Highest Damage'] += bonus_jingu_damage
-            bonus_jingu_life_steal = 15 * attack_hero.main_skill_list["JinGu Mastery"] + 10
-            attack_hero.life_steal_rate += bonus_jingu_life_steal
-            if show_all_the_details:
-                print("{} triggered Jingu Mastery, damage bonus {}, life steal rate bonus {}%.\n"
-                      .format(attack_hero.name, bonus_jingu_damage, bonus_jingu_life_steal))
-        if attack_hero.other_positive_effect["JinGu Mastery Attack Times"] == 5:
-            attack_hero.other_positive_effect["JinGu Mastery Attack Times"] = -5
-            bonus_jingu_damage = attack_hero.main_skill_list["JinGu Mastery"] * 30 + 10
-            attack_hero.status['Lowest Damage'] -= bonus_jingu_damage
-            attack_hero.status['Highest Damage'] -= bonus_jingu_damage
-            bonus_jingu_life_steal = 15 * attack_hero.main_skill_list["JinGu Mastery"] + 10
-            attack_hero.life_steal_rate -= bonus_jingu_life_steal
-            if show_all_the_details:
-                print("{}'s Jingu Mastery ends, lose damage bonus {}, lose life steal rate bonus {}%.\n"
-                      .format(attack_hero.name, bonus_jingu_damage, bonus_jingu_life_steal))
+    for handler, parameter in effects.after_attack:
+        handler(strike, parameter)
 
+    if ACTIVE_TRACER is not None:
+        ACTIVE_TRACER.emit(EVENT_ATTACK, attack_hero, attack_result[1])
     return attack_result
 
 
+@dataclass
+class HeroEffects:
+    """
+    The effect handlers of a hero, compiled by Hero.compile_effects().
+    Each item of the lists is (handler, parameter), the parameter is resolved when compiling.
+    """
+    # before evasion is checked, handler(strike, parameter)
+    un_evadable: list = field(default_factory=list)
+    # when the attack is not evaded, handler(strike, parameter)
+    critical: list = field(default_factory=list)
+    # after the critical is decided, handler(strike, parameter)
+    evadable: list = field(default_factory=list)
+    # how the defender takes normal attack damage,
+    # handler(attack_hero, defend_hero, normal_attack_damage, parameter, show_all_the_details)
+    # -> (actual damage, actual physical resistance regarding normal attack)
+    normal_attack: list = field(default_factory=list)
+    # when the hero is attacked, handler(defend_hero, damage_list, actual_normal_attack_damage, parameter,
+    # show_all_the_details)
+    defend: list = field(default_factory=list)
+    # after the attack which is not evaded, handler(strike, parameter)
+    after_attack: list = field(default_factory=list)
+
+
+@dataclass
+class Strike:
+    """The state of one attack, shared by the effect handlers of the attacker"""
+    attack_hero: Hero
+    defend_hero: Hero
+    roll: object  # iterator of the random numbers of this attack
+    life_steal_rate: float  # this attack's attached life steal rate
+    show_all_the_details: bool
+    # evadable physical damage, evadable magic damage, evadable true damage
+    # un-evadable physical damage, un-evadable magic damage, un-evadable true damage
+    # self-taken physical damage (comes from skills like Thorn Armor), self-taken magic damage
+    # life-steal, attack_damage_without_attachments
+    damage_list: list
+    pierce: bool = False
+    highest_critical_rate: float = 100
+
+
+def effect_smash(strike: Strike, parameter: tuple) -> None:
+    """
+    Sub skill -Smash-, 20% chance to deal un-evadable physical damage.
+
+    :param strike: the attack
+    :param parameter: (basic damage, damage per enemy max HP)
+    :return: None
+    """
+    if int(next(strike.roll) * 100) + 1 <= 20:
+        smash_damage = parameter[0] + parameter[1] * strike.defend_hero.status.array[MAX_HP]
+        strike.damage_list[3] += smash_damage
+        if ACTIVE_TELEMETRY is not None:
+            ACTIVE_TELEMETRY.add(strike.attack_hero, TELEMETRY_SMASH,
+                                 smash_damage * strike.defend_hero.status.array[PHYSICAL_RESISTANCE])
+        if ACTIVE_TRACER is not None:
+            ACTIVE_TRACER.emit(EVENT_SMASH, strike.attack_hero, smash_damage)
+        if strike.show_all_the_details:
+            print("{} triggered Smash, deal damage {}".format(strike.attack_hero.name, smash_damage))
+
+
+def effect_pierce(strike: Strike, parameter: tuple) -> None:
+    """
+    Pierce through evasion, MKB also deals un-evadable magic damage.
+
+    :param strike: the attack
+    :param parameter: (name of the pierce, possibility in percent)
+    :return: None
+    """
+    key, possibility = parameter
+    if int(next(strike.roll) * 100) + 1 <= possibility:
+        strike.pierce = True
+        if key == "MKB":
+            # un-evadable magic damage from MKB
+            if strike.show_all_the_details:
+                print("{} triggered MKB, deal damage {}".format(strike.attack_hero.name, 70))
+            strike.damage_list[4] += 70
+            if ACTIVE_TELEMETRY is not None:
+                ACTIVE_TELEMETRY.add(strike.attack_hero, TELEMETRY_MKB,
+                                     70 * (1 - strike.defend_hero.status.array[MAGIC_RESISTANCE]))
+
+
+def effect_critical(strike: Strike, parameter: tuple) -> None:
+    """
+    One critical skill, the final damage only counts the highest critical rate.
+
+    :param strike: the attack
+    :param parameter: (possibility, critical rate, name of the critical skill)
+    :return: None
+    """
+    if int(next(strike.roll) * 100) + 1 <= parameter[0]:
+        if ACTIVE_TELEMETRY is not None:
+            ACTIVE_TELEMETRY.add_critical(strike.attack_hero, parameter[2], parameter[1], strike.highest_critical_rate)
+        strike.highest_critical_rate = max(strike.highest_critical_rate, parameter[1])
+
+
+def effect_crushing(strike: Strike, crush_damage: float) -> None:
+    """
+    Sub skill -Crushing-, 15% chance to deal evadable true damage.
+
+    :param strike: the attack
+    :param crush_damage: the damage, decided by skill level and strength
+    :return: None
+    """
+    if int(next(strike.roll) * 100) + 1 <= 15:
+        strike.damage_list[2] += crush_damage
+        if ACTIVE_TELEMETRY is not None:
+            ACTIVE_TELEMETRY.add(strike.attack_hero, TELEMETRY_CRUSHING, crush_damage)
+        if ACTIVE_TRACER is not None:
+            ACTIVE_TRACER.emit(EVENT_CRUSHING, strike.attack_hero, crush_damage)
+        if strike.show_all_the_details:
+            print("{} triggered Crushing, deal damage {}".format(strike.attack_hero.name, crush_damage))
+
+
+def effect_feast(strike: Strike, parameter: tuple) -> None:
+    """
+    Main skill -Feast-, life steal and evadable physical damage decided by enemy max HP.
+
+    :param strike: the attack
+    :param parameter: (life steal per enemy max HP, damage per enemy max HP)
+    :return: None
+    """
+    feast_life_steal = parameter[0] * strike.defend_hero.status.array[MAX_HP]
+    feast_extra_damage = parameter[1] * strike.defend_hero.status.array[MAX_HP]
+    strike.damage_list[9] += feast_life_steal
+    if ACTIVE_TELEMETRY is not None:
+        ACTIVE_TELEMETRY.add(strike.attack_hero, TELEMETRY_FEAST,
+                             feast_extra_damage * strike.defend_hero.status.array[PHYSICAL_RESISTANCE])
+    if ACTIVE_TRACER is not None:
+        ACTIVE_TRACER.emit(EVENT_FEAST, strike.attack_hero, feast_extra_damage)
+    if strike.show_all_the_details:
+        print("{} triggered Feast, deal damage {}, life steal amount {}."
+              .format(strike.attack_hero.name, feast_extra_damage, feast_life_steal))
+    strike.damage_list[0] += feast_extra_damage
+
+
+def effect_life_steal(strike: Strike, life_steal_bonus: int) -> None:
+    """
+    Sub skill -Life Steal-, 30% chance to get extra life steal rate for this attack.
+    Life Steal only consider actual damage from normal attack (affected by defend hero's physical resistance).
+
+    :param strike: the attack
+    :param life_steal_bonus: the extra life steal rate
+    :return: None
+    """
+    if int(next(strike.roll) * 100) + 1 <= 30:
+        strike.life_steal_rate += life_steal_bonus
+        if ACTIVE_TELEMETRY is not None:
+            ACTIVE_TELEMETRY.add(strike.attack_hero, TELEMETRY_LIFE_STEAL)
+            ACTIVE_TELEMETRY.life_steal_bonus = life_steal_bonus
+        if strike.show_all_the_details:
+            print("{} triggered Life Steal, life steal rate bonus {}%.".format(strike.attack_hero.name,
+                                                                              life_steal_bonus))
+
+
+def effect_fire(attack_hero: Hero, defend_hero: Hero, normal_attack_damage: float, parameter=None,
+                show_all_the_details=False) -> (float, float):
+    """
+    Sub skill -Fire!-, normal attack damage ignores part of the armor.
+
+    :param attack_hero: the attacker hero
+    :param defend_hero: the defender hero
+    :param normal_attack_damage: the normal attack damage before calculating armor
+    :param parameter: not used
+    :param show_all_the_details: whether show the details of attack damage composition in log or not
+    :return: (actual damage, actual physical resistance regarding normal attack)
+    """
+    damage_amount, normal_attack_resistance = calculate_physical_damage_under_skill_fire(attack_hero, defend_hero,
+                                                                                         normal_attack_damage)
+    if show_all_the_details:
+        print("{} triggered Fire!, ignore armor, normal attack damage {}.".format(attack_hero.name, damage_amount))
+    return damage_amount, normal_attack_resistance
+
+
+def effect_thorn_armor(defend_hero: Hero, damage_list: list, actual_normal_attack_damage: float,
+                       reflection: float, show_all_the_details=False) -> None:
+    """
+    Sub skill -Thorn Armor-, reflect part of the normal attack damage to the attacker.
+
+    :param defend_hero: the defender hero
+    :param damage_list: the damage caused by the attack, see damage_calculation()
+    :param actual_normal_attack_damage: normal attack damage after calculating armor
+    :param reflection: how many percent damage is reflected
+    :param show_all_the_details: whether show the details of attack damage composition in log or not
+    :return: None
+    """
+    damage_reflection = actual_normal_attack_damage * reflection / 100
+    damage_list[6] += damage_reflection
+    if ACTIVE_TELEMETRY is not None:
+        attack_hero = ACTIVE_TELEMETRY.opponent(defend_hero)
+        ACTIVE_TELEMETRY.add(defend_hero, TELEMETRY_THORN_ARMOR,
+                             damage_reflection * attack_hero.status.array[PHYSICAL_RESISTANCE])
+    if ACTIVE_TRACER is not None:
+        ACTIVE_TRACER.emit(EVENT_THORN_ARMOR, defend_hero, damage_reflection)
+    if show_all_the_details:
+        print("{} triggered Thorn Armor, reflected damage {}.".format(defend_hero.name, damage_reflection))
+
+
+def effect_curse_of_death(defend_hero: Hero, damage_list: list, actual_normal_attack_damage: float,
+                          reduction: float, show_all_the_details=False) -> None:
+    """
+    Sub skill -Curse of Death-, reduce the attacker's life steal amount.
+
+    :param defend_hero: the defender hero
+    :param damage_list: the damage caused by the attack, see damage_calculation()
+    :param actual_normal_attack_damage: normal attack damage after calculating armor
+    :param reduction: how many percent life steal is reduced
+    :param show_all_the_details: whether show the details of attack damage composition in log or not
+    :return: None
+    """
+    if damage_list[9] != 0:
+        damage_list[9] = damage_list[9] * (100 - reduction) / 100
+        if show_all_the_details:
+            print("{} triggered Curse of Death, reducing actual enemy life steal to {}.".
+                  format(defend_hero.name, damage_list[9]))
+
+
+def effect_jingu_mastery(strike: Strike, parameter: tuple) -> None:
+    """
+    Main skill -Jingu Mastery-, every 4 hits charge the hero with bonus damage and life steal for 4 attacks.
+
+    :param strike: the attack
+    :param parameter: (bonus damage, bonus life steal rate)
+    :return: None
+    """
+    attack_hero = strike.attack_hero
+    bonus_jingu_damage, bonus_jingu_life_steal = parameter
+    attack_hero.other_positive_effect["JinGu Mastery Attack Times"] += 1
+    if attack_hero.other_positive_effect["JinGu Mastery Attack Times"] == -1:
+        attack_hero.other_positive_effect["JinGu Mastery Attack Times"] = 1
+        attack_hero.status.array[LOWEST_DAMAGE] += bonus_jingu_damage
+        attack_hero.status.array[HIGHEST_DAMAGE] += bonus_jingu_damage
+        attack_hero.life_steal_rate += bonus_jingu_life_steal
+        if ACTIVE_TELEMETRY is not None:
+            ACTIVE_TELEMETRY.add(attack_hero, TELEMETRY_JINGU_MASTERY)
+        if ACTIVE_TRACER is not None:
+            ACTIVE_TRACER.emit(EVENT_JINGU_START, attack_hero, bonus_jingu_damage)
+        if strike.show_all_the_details:
+            print("{} triggered Jingu Mastery, damage bonus {}, life steal rate bonus {}%.\n"
+                  .format(attack_hero.name, bonus_jingu_damage, bonus_jingu_life_steal))
+    if attack_hero.other_positive_effect["JinGu Mastery Attack Times"] == 5:
+        attack_hero.other_positive_effect["JinGu Mastery Attack Times"] = -5
+        attack_hero.status.array[LOWEST_DAMAGE] -= bonus_jingu_damage
+        attack_hero.status.array[HIGHEST_DAMAGE] -= bonus_jingu_damage
+        attack_hero.life_steal_rate -= bonus_jingu_life_steal
+        if ACTIVE_TRACER is not None:
+            ACTIVE_TRACER.emit(EVENT_JINGU_END, attack_hero, bonus_jingu_damage)
+        if strike.show_all_the_details:
+            print("{}'s Jingu Mastery ends, lose damage bonus {}, lose life steal rate bonus {}%.\n"
+                  .format(attack_hero.name, bonus_jingu_damage, bonus_jingu_life_steal))
+
+
 def damage_calculation(attack_hero: Hero, defend_hero: Hero, damage_list,
                        life_steal_rate=0, show_log_or_not=False, show_all_the_details=False) -> list:
     """
@@ -1273,46 +1735,36 @@ def damage_calculation(attack_hero: Hero, defend_hero: Hero, damage_list,
     """
     attacker_taken_damage = 0
     defender_taken_damage = 0
-    life_steal_amount = damage_list[9]
-    if "Fire!" in attack_hero.skill_list.keys():
-        damage_amount, normal_attack_resistance = calculate_physical_damage_under_skill_fire(attack_hero, defend_hero,
-                                                                                             damage_list[10])
+    physical_damage = damage_list[0] + damage_list[3]
+    normal_attack_resistance = defend_hero.status.array[PHYSICAL_RESISTANCE]
+    # normal attack damage may be calculated separately, for example, Fire! ignores armor
+    for handler, parameter in attack_hero.effects.normal_attack:
+        damage_amount, normal_attack_resistance = handler(attack_hero, defend_hero, damage_list[10], parameter,
+                                                          show_all_the_details)
         defender_taken_damage += damage_amount
-        if show_all_the_details:
-            # normal_attack_damage_without_fire = defend_hero.taken_physical_damage(damage_list[10])
-            print("{} triggered Fire!, ignore armor, normal attack damage {}.".format(attack_hero.name, damage_amount))
-            # print("Without Fire!, the normal attack damage will be {}".format(normal_attack_damage_without_fire))
-        defender_taken_damage += defend_hero.taken_physical_damage(damage_list[0] + damage_list[3] - damage_list[10])
-    else:
-        defender_taken_damage += defend_hero.taken_physical_damage(damage_list[0] + damage_list[3])
-        normal_attack_resistance = defend_hero.status["Physical Resistance"]
+        physical_damage -= damage_list[10]
+    defender_taken_damage += defend_hero.taken_physical_damage(physical_damage)
 
     actual_normal_attack_damage = damage_list[10] * normal_attack_resistance
-    life_steal_amount += actual_normal_attack_damage * life_steal_rate / 100
-    if show_all_the_details and life_steal_amount != 0:
-        print("{}'s total life steal: {}.".format(attack_hero.name, life_steal_amount))
-
-    if "Thorn Armor" in defend_hero.skill_list.keys():
-        damage_reflection = actual_normal_attack_damage * (
-            defend_hero.other_positive_effect["Physical Damage Reflection"]) / 100
-        damage_list[6] += damage_reflection
-        if show_all_the_details:
-            print("{} triggered Thorn Armor, reflected damage {}.".format(defend_hero.name, damage_reflection))
+    damage_list[9] += actual_normal_attack_damage * life_steal_rate / 100
+    if show_all_the_details and damage_list[9] != 0:
+        print("{}'s total life steal: {}.".format(attack_hero.name, damage_list[9]))
 
-    # curse will reduce life steal amount
-    if "Curse of Death" in defend_hero.skill_list.keys() and life_steal_amount != 0:
-        life_steal_amount = life_steal_amount * (
-                100 - defend_hero.other_positive_effect["Curse Reg Reduction"]) / 100
-        if show_all_the_details:
-            print("{} triggered Curse of Death, reducing actual enemy life steal to {}.".
-                  format(defend_hero.name, life_steal_amount))
+    # Thorn Armor reflects damage, curse will reduce life steal amount
+    for handler, parameter in defend_hero.effects.defend:
+        handler(defend_hero, damage_list, actual_normal_attack_damage, parameter, show_all_the_details)
+    life_steal_amount = damage_list[9]
 
     defender_taken_damage += defend_hero.taken_magical_damage(damage_list[1] + damage_list[4])
     defender_taken_damage += defend_hero.taken_true_damage(damage_list[2] + damage_list[5])
     attacker_taken_damage += attack_hero.taken_physical_damage(damage_list[6])
     attacker_taken_damage += attack_hero.taken_magical_damage(damage_list[7])
     attacker_taken_damage += attack_hero.taken_true_damage(damage_list[8])
-    attack_hero.life_steal_regenerate(life_steal_amount)
+    if ACTIVE_TELEMETRY is not None:
+        ACTIVE_TELEMETRY.add_attack(attack_hero, actual_normal_attack_damage,
+                                    attack_hero.life_steal_regenerate(life_steal_amount))
+    else:
+        attack_hero.life_steal_regenerate(life_steal_amount)
 
     life_steal_amount = round(life_steal_amount)
 
@@ -1336,8 +1788,8 @@ def show_attack_log(attack_hero: Hero, defend_hero: Hero, damage_list: list):
     print("{} attacks {}, caused {} damage, get {} counter damage, regenerates {} by life steal."
           .format(attack_hero.name, defend_hero.name,
                   round(damage_list[1]), round(damage_list[0]), round(damage_list[2])))
-    print("{} HP left: {}\t\t\t{} HP left {}\n".format(attack_hero.name, round(attack_hero.status["Current HP"]),
-                                                       defend_hero.name, round(defend_hero.status["Current HP"])))
+    print("{} HP left: {}\t\t\t{} HP left {}\n".format(attack_hero.name, round(attack_hero.status.array[CURRENT_HP]),
+                                                       defend_hero.name, round(defend_hero.status.array[CURRENT_HP])))
 
 
 def calculate_physical_damage_under_skill_fire(attack_hero: Hero, defend_hero: Hero,
@@ -1351,20 +1803,39 @@ def calculate_physical_damage_under_skill_fire(attack_hero: Hero, defend_hero: H
     :param physical_damage_amount: the amount of physical damage before calculating armor
     :return: (actual physical amount, actual physical resistance regarding normal attack)
     """
-    if defend_hero.status["Armor"] > 0:
-        actual_armor = defend_hero.status["Armor"] * (100 - attack_hero.other_positive_effect["Ignore Armor"]) / 100
+    if defend_hero.status.array[ARMOR] > 0:
+        actual_armor = defend_hero.status.array[ARMOR] * (100 - attack_hero.other_positive_effect["Ignore Armor"]) / 100
     else:
-        actual_armor = defend_hero.status["Armor"]
-    actual_physical_resistance = 1 - (0.052 * actual_armor) / (0.9 + 0.048 * abs(actual_armor))
+        actual_armor = defend_hero.status.array[ARMOR]
+    actual_physical_resistance = physical_resistance(actual_armor)
 
     actual_damage = physical_damage_amount * actual_physical_resistance
 
-    defend_hero.status["Current HP"] -= actual_damage
+    defend_hero.status.array[CURRENT_HP] -= actual_damage
     actual_damage = round(actual_damage)
 
     return actual_damage, actual_physical_resistance
 
 
+def physical_resistance(armor: float) -> float:
+    """
+    How much physical damage is taken with the armor, 1 - 0.052 * armor / (0.9 + 0.048 * |armor|).
+    The same few armor values show up in every duel of a simulation, so the results are kept in a table.
+
+    :param armor: the armor
+    :return: the physical resistance
+    >>> round(physical_resistance(10), 4)
+    0.6232
+    >>> physical_resistance(-2) > 1
+    True
+    """
+    if armor not in PHYSICAL_RESISTANCE_TABLE.keys():
+        if len(PHYSICAL_RESISTANCE_TABLE) >= MEMO_SIZE:
+            PHYSICAL_RESISTANCE_TABLE.clear()
+        PHYSICAL_RESISTANCE_TABLE[armor] = 1 - (0.052 * armor) / (0.9 + 0.048 * abs(armor))
+    return PHYSICAL_RESISTANCE_TABLE[armor]
+
+
 def pierce_possibility_mkb(amount_of_mkb: int) -> float:
     """
     If MKB is equipped, each MKB will grant 80% chance to pierce through evasion and deal 70 magic damage
@@ -1380,7 +1851,7 @@ def pierce_possibility_mkb(amount_of_mkb: int) -> float:
 
 
 def trigger_moment_of_courage(attack_hero: Hero, defend_hero: Hero,
-                              show_log_or_not=False, show_all_the_details=False) -> None:
+                              show_log_or_not=False, show_all_the_details=False, rng=random) -> None:
     """
     To judge if main skill -Moment of Courage- is triggered.
 
@@ -1388,20 +1859,378 @@ def trigger_moment_of_courage(attack_hero: Hero, defend_hero: Hero,
     :param defend_hero: the defender hero
     :param show_log_or_not: whether show the details of attack result in log or not
     :param show_all_the_details: whether show the details of attack damage composition in log or not
+    :param rng: the random generator, the global random module by default
     :return: None
     """
     if "Moment of Courage" in defend_hero.main_skill_list.keys():
-        if random.randint(1, 100) <= 25:
+        if int(rng.random() * 100) + 1 <= 25:
             if show_all_the_details:
                 print("{} Triggerd Moment of Courage ".format(defend_hero.name))
             life_steal_rate = 10 * defend_hero.main_skill_list["Moment of Courage"] + 45
             defend_hero.life_steal_rate += life_steal_rate
-            attack(defend_hero, attack_hero, show_log_or_not, show_all_the_details)
+            attack_result = attack(defend_hero, attack_hero, show_log_or_not, show_all_the_details, rng)
             defend_hero.life_steal_rate -= life_steal_rate
+            if ACTIVE_TELEMETRY is not None:
+                ACTIVE_TELEMETRY.add(defend_hero, TELEMETRY_MOMENT_OF_COURAGE, attack_result[1])
+
+
+class DuelTracer:
+    """
+    Record the events of duels (attack, evade, critical, Smash, ...) as typed rows in a preallocated ring buffer,
+    see EVENT_NAMES and EVENT_DTYPE. Nothing is formatted until the events are shown, and only 1 in sample_every
+    duels is traced, so a tracer can stay on for a whole simulation. When the buffer is full, the oldest events
+    are overwritten. Pass it to duel() or simulate_counters() (scalar engine only).
+    """
+
+    def __init__(self, capacity=65536, sample_every=1):
+        """
+        :param capacity: how many events are kept
+        :param sample_every: trace 1 duel in every sample_every duels
+        """
+        if capacity < 1 or sample_every < 1:
+            raise ValueError("capacity and sample_every should be at least 1")
+        self.buffer = np.zeros(capacity, dtype=EVENT_DTYPE)
+        self.capacity = capacity
+        self.sample_every = sample_every
+        self.amount_of_events = 0  # all the events ever recorded, including the overwritten ones
+        self.amount_of_duels = 0  # all the duels offered to the tracer, including the ones not sampled
+        self.heroes = (None, None)
+        self.duel_index = -1
+        self.time = 0.0
+
+    def start_duel(self, hero_1: Hero, hero_2: Hero) -> bool:
+        """
+        Called by duel() when a duel starts.
+
+        :param hero_1: the first hero
+        :param hero_2: the second hero
+        :return: whether this duel is traced
+        """
+        traced = self.amount_of_duels % self.sample_every == 0
+        if traced:
+            self.heroes = (hero_1, hero_2)
+            self.duel_index = self.amount_of_duels
+            self.time = 0.0
+        self.amount_of_duels += 1
+        return traced
+
+    def emit(self, kind: int, hero: Hero, value=0.0) -> None:
+        """
+        Record an event of the duel being traced.
+
+        :param kind: the kind of event, e.g. EVENT_SMASH
+        :param hero: the hero who triggers the event
+        :param value: the number of the event, e.g. the damage
+        :return: None
+        """
+        self.buffer[self.amount_of_events % self.capacity] = (self.duel_index, self.time, kind,
+                                                              1 if hero is self.heroes[0] else 2, value)
+        self.amount_of_events += 1
+
+    def events(self) -> np.ndarray:
+        """
+        :return: the events kept in the buffer, from the oldest to the newest, numpy array of EVENT_DTYPE
+        >>> tracer = DuelTracer(capacity=3)
+        >>> hero_1, hero_2 = HeroMonkeyKing(1), HeroMonkeyKing(1)
+        >>> tracer.start_duel(hero_1, hero_2)
+        True
+        >>> for damage in range(5):
+        ...     tracer.emit(EVENT_ATTACK, hero_2, damage)
+        >>> tracer.events()["value"].tolist(), tracer.events()["hero"].tolist()
+        ([2.0, 3.0, 4.0], [2, 2, 2])
+        """
+        if self.amount_of_events <= self.capacity:
+            return self.buffer[:self.amount_of_events].copy()
+        position = self.amount_of_events % self.capacity
+        return np.concatenate([self.buffer[position:], self.buffer[:position]])
+
+    def dump(self, path: str) -> None:
+        """
+        Save the events to a binary .npy file, read it with np.load() and show it with format_events().
+
+        :param path: the file
+        :return: None
+        """
+        np.save(path, self.events())
+
+    def format(self, hero_names=("Hero 1", "Hero 2")) -> list:
+        """
+        :param hero_names: the names shown for the first and the second hero
+        :return: list of str, one line for each event kept
+        """
+        return format_events(self.events(), hero_names)
+
+
+def format_events(events: np.ndarray, hero_names=("Hero 1", "Hero 2")) -> list:
+    """
+    Turn the events of DuelTracer into lines of text.
+
+    :param events: numpy array of EVENT_DTYPE
+    :param hero_names: the names shown for the first and the second hero
+    :return: list of str
+    >>> events = np.array([(0, 1.5, EVENT_SMASH, 1, 120), (0, 1.5, EVENT_ATTACK, 1, 180)], dtype=EVENT_DTYPE)
+    >>> format_events(events, ("Monkey King", "Bounty Hunter"))
+    ['Duel 0 1.50s: Monkey King triggered Smash, deal damage 120.0', \
+'Duel 0 1.50s: Monkey King attacks, enemy takes damage 180.0']
+    """
+    return ["Duel {} {:.2f}s: {}".format(int(event["duel"]), float(event["time"]),
+                                         EVENT_FORMATS[event["kind"]].format(hero=hero_names[event["hero"] - 1],
+                                                                              value=round(float(event["value"]), 2)))
+            for event in events]
+
+
+class DuelTelemetry:
+    """
+    Count how often each source in TELEMETRY_SOURCES fired and how much damage or healing it contributed, for each
+    hero of each duel and for all the duels together. The counts are kept in numpy arrays of shape
+    (2, len(TELEMETRY_SOURCES)), the first row for the first hero of the duels, the second row for the second hero.
+    The amounts are the actual damage after armor and magic resistance, counted for the hero who owns the source:
+        Attack: every attack, the normal attack damage (critical and Fire! included)
+        Evasion: the attacks evaded by the hero, no amount
+        MKB, Smash, Crushing, Feast: the extra damage
+        Blade Dance, Coup de Grace: every critical triggered, the critical damage above the normal attack,
+                                    only counted for the highest critical rate of an attack
+        Life Steal: every time the skill triggered, the life steal it added before Curse of Death and max HP
+        Thorn Armor: the damage reflected to the enemy
+        Curse of Death: the curse damage to the enemy
+        Moment of Courage: the damage of the counter attacks
+        JinGu Mastery: every time it is charged, no amount
+        Life Steal Healing: the attacks healing the hero by life steal, the HP healed
+        Regeneration: the HP regenerated (after Curse of Death, before max HP), counted for every regeneration
+    Pass it to duel() or simulate_counters() (scalar engine only).
+    """
+
+    def __init__(self, keep_duels=0):
+        """
+        :param keep_duels: keep the counts of each of the last keep_duels duels, 0 means only the totals
+        """
+        amount_of_sources = len(TELEMETRY_SOURCES)
+        self.triggers = np.zeros((2, amount_of_sources), dtype=np.int64)  # the duel being run
+        self.amounts = np.zeros((2, amount_of_sources))
+        self.total_triggers = np.zeros((2, amount_of_sources), dtype=np.int64)
+        self.total_amounts = np.zeros((2, amount_of_sources))
+        self.keep_duels = keep_duels
+        self.duel_triggers = np.zeros((keep_duels, 2, amount_of_sources), dtype=np.int64)
+        self.duel_amounts = np.zeros((keep_duels, 2, amount_of_sources))
+        self.amount_of_duels = 0
+        self.heroes = (None, None)
+        # the critical and the Life Steal of the attack being run, counted when its damage is known
+        self.critical_source = -1
+        self.critical_rate = 100
+        self.life_steal_bonus = 0
+
+    def start_duel(self, hero_1: Hero, hero_2: Hero) -> None:
+        """
+        Called by duel() when a duel starts.
+
+        :param hero_1: the first hero
+        :param hero_2: the second hero
+        :return: None
+        """
+        self.heroes = (hero_1, hero_2)
+        self.triggers.fill(0)
+        self.amounts.fill(0)
+
+    def end_duel(self) -> None:
+        """
+        Called by duel() when a duel is over, add the counts of the duel to the totals.
+
+        :return: None
+        """
+        self.total_triggers += self.triggers
+        self.total_amounts += self.amounts
+        if self.keep_duels:
+            self.duel_triggers[self.amount_of_duels % self.keep_duels] = self.triggers
+            self.duel_amounts[self.amount_of_duels % self.keep_duels] = self.amounts
+        self.amount_of_duels += 1
+
+    def opponent(self, hero: Hero) -> Hero:
+        """
+        :param hero: one hero of the duel being run
+        :return: the other hero
+        """
+        return self.heroes[1] if hero is self.heroes[0] else self.heroes[0]
+
+    def add(self, hero: Hero, source: int, amount=0.0) -> None:
+        """
+        Count one trigger of a source.
+
+        :param hero: the hero who owns the source
+        :param source: the index of the source, e.g. TELEMETRY_SMASH
+        :param amount: the damage or healing
+        :return: None
+        """
+        side = 0 if hero is self.heroes[0] else 1
+        self.triggers[side, source] += 1
+        self.amounts[side, source] += amount
+
+    def start_attack(self) -> None:
+        """
+        Called by attack() before the effects of an attack.
+
+        :return: None
+        """
+        self.critical_source = -1
+        self.critical_rate = 100
+        self.life_steal_bonus = 0
+
+    def add_critical(self, hero: Hero, critical_skill: str, critical_rate: float, highest_critical_rate: float) -> None:
+        """
+        Count a critical triggered, its damage is counted by add_attack() if its critical rate is the highest.
+
+        :param hero: the attacker
+        :param critical_skill: the name of the critical skill, e.g. "Blade Dance"
+        :param critical_rate: the critical rate of the skill
+        :param highest_critical_rate: the highest critical rate of the attack before this one
+        :return: None
+        """
+        source = TELEMETRY_INDEX.get(critical_skill)
+        if source is None:
+            return
+        self.add(hero, source)
+        if critical_rate > highest_critical_rate:
+            self.critical_source, self.critical_rate = source, critical_rate
+
+    def add_attack(self, hero: Hero, actual_normal_attack_damage: float, life_steal_healing: float) -> None:
+        """
+        Count an attack when its damage is calculated, see damage_calculation().
+
+        :param hero: the attacker
+        :param actual_normal_attack_damage: the normal attack damage after armor
+        :param life_steal_healing: the HP healed by life steal
+        :return: None
+        """
+        side = 0 if hero is self.heroes[0] else 1
+        self.triggers[side, TELEMETRY_ATTACK] += 1
+        self.amounts[side, TELEMETRY_ATTACK] += actual_normal_attack_damage
+        if self.critical_source >= 0:
+            self.amounts[side, self.critical_source] += \
+                actual_normal_attack_damage * (self.critical_rate - 100) / self.critical_rate
+        if self.life_steal_bonus:
+            self.amounts[side, TELEMETRY_LIFE_STEAL] += actual_normal_attack_damage * self.life_steal_bonus / 100
+        if life_steal_healing > 0:
+            self.triggers[side, TELEMETRY_LIFE_STEAL_HEALING] += 1
+            self.amounts[side, TELEMETRY_LIFE_STEAL_HEALING] += life_steal_healing
+
+    def merge(self, other: 'DuelTelemetry') -> 'DuelTelemetry':
+        """
+        Add the totals of another telemetry to this one, the kept duels are not merged.
+
+        :param other: the other telemetry
+        :return: this telemetry
+        """
+        self.total_triggers += other.total_triggers
+        self.total_amounts += other.total_amounts
+        self.amount_of_duels += other.amount_of_duels
+        return self
+
+    def kept_duels(self) -> (np.ndarray, np.ndarray):
+        """
+        :return: (triggers, amounts) of the kept duels, from the oldest to the newest,
+                 arrays of shape (duels, 2, len(TELEMETRY_SOURCES))
+        """
+        if self.amount_of_duels <= self.keep_duels:
+            return self.duel_triggers[:self.amount_of_duels].copy(), self.duel_amounts[:self.amount_of_duels].copy()
+        position = self.amount_of_duels % self.keep_duels
+        return (np.concatenate([self.duel_triggers[position:], self.duel_triggers[:position]]),
+                np.concatenate([self.duel_amounts[position:], self.duel_amounts[:position]]))
+
+    def per_duel(self, amounts=True, side=None) -> dict:
+        """
+        The average of each source in a duel, the same shape as the results of aggregate_analyze(),
+        so two of them can be compared with creat_plot().
+
+        :param amounts: True gives the damage or healing, False gives how many times the source fired
+        :param side: 0 for the first hero, 1 for the second hero, None for both heroes together
+        :return: key: source, value: the average of a duel
+        >>> telemetry = DuelTelemetry()
+        >>> hero_1, hero_2 = HeroMonkeyKing(1), HeroMonkeyKing(1)
+        >>> telemetry.start_duel(hero_1, hero_2)
+        >>> telemetry.add(hero_1, TELEMETRY_SMASH, 100)
+        >>> telemetry.add(hero_2, TELEMETRY_SMASH, 50)
+        >>> telemetry.end_duel()
+        >>> telemetry.start_duel(hero_1, hero_2)
+        >>> telemetry.add(hero_2, TELEMETRY_SMASH, 50)
+        >>> telemetry.end_duel()
+        >>> telemetry.per_duel()["Smash"], telemetry.per_duel(side=0)["Smash"], telemetry.per_duel(False)["Smash"]
+        (100.0, 50.0, 1.5)
+        """
+        totals = self.total_amounts if amounts else self.total_triggers
+        totals = totals.sum(axis=0) if side is None else totals[side]
+        duels = max(self.amount_of_duels, 1)
+        return {source: round(float(total) / duels, 2) for source, total in zip(TELEMETRY_SOURCES, totals)}
+
+    def to_dict(self) -> dict:
+        """
+        :return: the totals and the kept duels in lists, e.g. to save as JSON for plotting
+        """
+        duel_triggers, duel_amounts = self.kept_duels()
+        return {"sources": list(TELEMETRY_SOURCES), "duels": self.amount_of_duels,
+                "triggers": self.total_triggers.tolist(), "amounts": self.total_amounts.tolist(),
+                "duel_triggers": duel_triggers.tolist(), "duel_amounts": duel_amounts.tolist()}
+
+
+def duel_advantage(hero_1: Hero, hero_2: Hero) -> float:
+    """
+    A rough guess of hero_1's chance without running a duel: the time hero_2 needs to kill hero_1, over the sum of
+    the times both heroes need to kill each other. The time to kill is the max HP over the expected normal attack
+    damage per second, counting physical resistance, evasion and critical, but no other skill effect.
+    It is used as the control variate of the winning rates, see DuelCounters.variance_reduction().
+    The status of both heroes is calculated first, and the armor of each hero is reduced by the Corruption of
+    the other, same as the beginning of duel() (without changing the heroes).
+
+    :param hero_1: the first hero
+    :param hero_2: the second hero
+    :return: between 0 and 1, 0.5 means even
+    >>> hero_1, hero_2 = HeroMonkeyKing(10), HeroMonkeyKing(10)
+    >>> duel_advantage(hero_1, hero_2)
+    0.5
+    >>> hero_1.learn_skill_damage_bonus(5)
+    >>> duel_advantage(hero_1, hero_2) > 0.5
+    True
+    >>> hero_1, hero_2 = HeroMonkeyKing(10), HeroMonkeyKing(10)
+    >>> hero_1.learn_skill_armor_bonus(5)
+    >>> duel_advantage(hero_1, hero_2) > 0.5
+    True
+    >>> hero_2.learn_skill_corruption(5)
+    >>> duel_advantage(hero_1, hero_2) < duel_advantage(hero_1, HeroMonkeyKing(10))
+    True
+    """
+    hero_1.calculate_status()
+    hero_2.calculate_status()
+    time_to_kill_1 = hero_2.status.array[MAX_HP] / expected_damage_per_second(hero_1, hero_2)
+    time_to_kill_2 = hero_1.status.array[MAX_HP] / expected_damage_per_second(hero_2, hero_1)
+    return float(time_to_kill_2 / (time_to_kill_1 + time_to_kill_2))
+
+
+def expected_damage_per_second(attack_hero: Hero, defend_hero: Hero) -> float:
+    """
+    The expected normal attack damage per second, see duel_advantage().
+
+    :param attack_hero: the hero who attacks
+    :param defend_hero: the hero who defends the attack
+    :return: damage per second
+    """
+    attack_status, defend_status = attack_hero.status.array, defend_hero.status.array
+    # the fraction of the damage taken, see taken_physical_damage() and corruption_status()
+    damage_taken = defend_status[PHYSICAL_RESISTANCE]
+    if "Corruption" in attack_hero.skill_list.keys():
+        reduced_armor = attack_hero.other_positive_effect["Reduce Enemy Armor"]
+        damage_taken = physical_resistance(defend_status[ARMOR] - reduced_armor)
+    # same as the rolls in attack(): int(roll * 101) <= evasion possibility, int(roll * 100) + 1 <= possibility
+    hit_rate = 1.0
+    for evasion_possibility in defend_hero.evasion_list.values():
+        hit_rate *= 1 - min(1.0, (evasion_possibility + 1) / 101)
+    critical_rate = 1.0
+    for possibility, rate in attack_hero.critical_list.values():
+        critical_rate += possibility / 100 * (rate / 100 - 1)
+    return ((attack_status[LOWEST_DAMAGE] + attack_status[HIGHEST_DAMAGE]) / 2 * hit_rate * critical_rate
+            * damage_taken / attack_status[ATTACK_INTERVAL])
 
 
 def duel(hero_1: Hero, hero_2: Hero,
-         show_log_or_not=False, show_all_the_details=False, show_regenerate_rs=False):
+         show_log_or_not=False, show_all_the_details=False, show_regenerate_rs=False, rng=random, duel_times=None,
+         tracer=None, telemetry=None):
     """
     Let two heroes have a duel
 
@@ -1410,6 +2239,10 @@ def duel(hero_1: Hero, hero_2: Hero,
     :param show_log_or_not: whether show the details of attack result in log or not
     :param show_all_the_details: whether show the details of attack damage composition in log or not
     :param show_regenerate_rs: whether show the details of regeneration in log or not
+    :param rng: the random generator, the global random module by default
+    :param duel_times: if given, the time when the duel is over is appended to this list
+    :param tracer: the DuelTracer to record the events of this duel, if the duel is sampled by it
+    :param telemetry: the DuelTelemetry to count the skills triggered in this duel
     :return: the two hero's status after the duel is over
     >>> monkey_king = HeroMonkeyKing(5)
     >>> life_stealer = HeroLifeStealer(5)
@@ -1427,74 +2260,109 @@ def duel(hero_1: Hero, hero_2: Hero,
     >>> _, _ = duel(treant_1, treant_2)
     >>> treant_1.status["Current HP"] <= 0 or treant_2.status["Current HP"] <= 0
     True
+    >>> _, _ = duel(treant_1, treant_2, rng=simulation_rng(42, SCALAR_BLOCK_STREAM, 0))
+    >>> hp_left = treant_1.status["Current HP"], treant_2.status["Current HP"]
+    >>> _, _ = duel(treant_1, treant_2, rng=simulation_rng(42, SCALAR_BLOCK_STREAM, 0))
+    >>> hp_left == (treant_1.status["Current HP"], treant_2.status["Current HP"])
+    True
+    >>> telemetry = DuelTelemetry()
+    >>> duel(treant_1, treant_2, rng=None, tracer=DuelTracer(), telemetry=telemetry)
+    Traceback (most recent call last):
+    ...
+    AttributeError: 'NoneType' object has no attribute 'randint'
+    >>> ACTIVE_TRACER is None, ACTIVE_TELEMETRY is None, telemetry.amount_of_duels
+    (True, True, 1)
     """
-    # before duel start, calculate various long-lasting effects
-    # for example, Corruption (reduce armor)
-
-    hero_1.calculate_status()
-    hero_2.calculate_status()
+    global ACTIVE_TRACER, ACTIVE_TELEMETRY
+    if tracer is not None and tracer.start_duel(hero_1, hero_2):
+        ACTIVE_TRACER = tracer
+    if telemetry is not None:
+        telemetry.start_duel(hero_1, hero_2)
+        ACTIVE_TELEMETRY = telemetry
+
+    # the tracer and the telemetry are put away even if the duel is stopped by an error,
+    # or they would record the next duels
+    try:
+        # before duel start, calculate various long-lasting effects
+        # for example, Corruption (reduce armor)
+
+        hero_1.calculate_status()
+        hero_2.calculate_status()
+
+        corruption_status(hero_1, hero_2, show_all_the_details)
+        corruption_status(hero_2, hero_1, show_all_the_details)
+        curse_status(hero_1, hero_2, show_all_the_details)
+        curse_status(hero_2, hero_1, show_all_the_details)
+
+        hero_1_attack_time_axis = hero_1.status.array[ATTACK_INTERVAL]
+        hero_2_attack_time_axis = hero_2.status.array[ATTACK_INTERVAL]
+        last_hit_time_axis = 0
+        hero_1_attacked = False
+        hero_2_attacked = False
 
-    corruption_status(hero_1, hero_2, show_all_the_details)
-    corruption_status(hero_2, hero_1, show_all_the_details)
-    curse_status(hero_1, hero_2, show_all_the_details)
-    curse_status(hero_2, hero_1, show_all_the_details)
+        while True:
+            if ACTIVE_TRACER is not None:
+                ACTIVE_TRACER.time = min(hero_1_attack_time_axis, hero_2_attack_time_axis)
+            if hero_1_attack_time_axis < hero_2_attack_time_axis:
+                # before attack, calculate regeneration and curse damage
+                time = hero_1_attack_time_axis - last_hit_time_axis
+                hero_1.regenerate_and_curse(time, show_regenerate_rs)
+                hero_2.regenerate_and_curse(time, show_regenerate_rs)
+                last_hit_time_axis = hero_1_attack_time_axis
+
+                # attack
+                attack(hero_1, hero_2, show_log_or_not, show_all_the_details, rng)
+                trigger_moment_of_courage(hero_1, hero_2, show_log_or_not, show_all_the_details, rng)
 
-    hero_1_attack_time_axis = hero_1.status["Attack Interval"]
-    hero_2_attack_time_axis = hero_2.status["Attack Interval"]
-    last_hit_time_axis = 0
-    hero_1_attacked = False
-    hero_2_attacked = False
-
-    while True:
-        if hero_1_attack_time_axis < hero_2_attack_time_axis:
-            # before attack, calculate regeneration and curse damage
-            time = hero_1_attack_time_axis - last_hit_time_axis
-            hero_1.regenerate_and_curse(time, show_regenerate_rs)
-            hero_2.regenerate_and_curse(time, show_regenerate_rs)
-            last_hit_time_axis = hero_1_attack_time_axis
-
-            # attack
-            attack(hero_1, hero_2, show_log_or_not, show_all_the_details)
-            trigger_moment_of_courage(hero_1, hero_2, show_log_or_not, show_all_the_details)
-
-            hero_1_attacked = True
-
-        elif hero_1_attack_time_axis > hero_2_attack_time_axis:
-            time = hero_2_attack_time_axis - last_hit_time_axis
-            hero_1.regenerate_and_curse(time, show_regenerate_rs)
-            hero_2.regenerate_and_curse(time, show_regenerate_rs)
-            last_hit_time_axis = hero_2_attack_time_axis
-            attack(hero_2, hero_1, show_log_or_not, show_all_the_details)
-            trigger_moment_of_courage(hero_2, hero_1, show_log_or_not, show_all_the_details)
-            hero_2_attacked = True
-        else:
-            # attack at same time, randomly decide sequence of attack
-            time = hero_1_attack_time_axis - last_hit_time_axis
-            hero_1.regenerate_and_curse(time, show_regenerate_rs)
-            hero_2.regenerate_and_curse(time, show_regenerate_rs)
-            last_hit_time_axis = hero_2_attack_time_axis
-            if random.randint(0, 1) == 0:
-                attack(hero_1, hero_2, show_log_or_not, show_all_the_details)
-                trigger_moment_of_courage(hero_1, hero_2, show_log_or_not, show_all_the_details)
                 hero_1_attacked = True
-            else:
-                attack(hero_2, hero_1, show_log_or_not, show_all_the_details)
-                trigger_moment_of_courage(hero_2, hero_1, show_log_or_not, show_all_the_details)
-                hero_2_attacked = True
-
-        if hero_1.status["Current HP"] <= 0 or hero_2.status["Current HP"] <= 0:
-            break
 
-        if last_hit_time_axis >= 500:
-            break
+            elif hero_1_attack_time_axis > hero_2_attack_time_axis:
+                time = hero_2_attack_time_axis - last_hit_time_axis
+                hero_1.regenerate_and_curse(time, show_regenerate_rs)
+                hero_2.regenerate_and_curse(time, show_regenerate_rs)
+                last_hit_time_axis = hero_2_attack_time_axis
+                attack(hero_2, hero_1, show_log_or_not, show_all_the_details, rng)
+                trigger_moment_of_courage(hero_2, hero_1, show_log_or_not, show_all_the_details, rng)
+                hero_2_attacked = True
+            else:
+                # attack at same time, randomly decide sequence of attack
+                time = hero_1_attack_time_axis - last_hit_time_axis
+                hero_1.regenerate_and_curse(time, show_regenerate_rs)
+                hero_2.regenerate_and_curse(time, show_regenerate_rs)
+                last_hit_time_axis = hero_2_attack_time_axis
+                if rng.randint(0, 1) == 0:
+                    attack(hero_1, hero_2, show_log_or_not, show_all_the_details, rng)
+                    trigger_moment_of_courage(hero_1, hero_2, show_log_or_not, show_all_the_details, rng)
+                    hero_1_attacked = True
+                else:
+                    attack(hero_2, hero_1, show_log_or_not, show_all_the_details, rng)
+                    trigger_moment_of_courage(hero_2, hero_1, show_log_or_not, show_all_the_details, rng)
+                    hero_2_attacked = True
+
+            if hero_1.status.array[CURRENT_HP] <= 0 or hero_2.status.array[CURRENT_HP] <= 0:
+                break
 
-        if hero_1_attacked:
-            hero_1_attack_time_axis += hero_1.status["Attack Interval"]
-            hero_1_attacked = False
-        if hero_2_attacked:
-            hero_2_attack_time_axis += hero_2.status["Attack Interval"]
-            hero_2_attacked = False
+            if last_hit_time_axis >= 500:
+                break
 
+            if hero_1_attacked:
+                hero_1_attack_time_axis += hero_1.status.array[ATTACK_INTERVAL]
+                hero_1_attacked = False
+            if hero_2_attacked:
+                hero_2_attack_time_axis += hero_2.status.array[ATTACK_INTERVAL]
+                hero_2_attacked = False
+
+        if ACTIVE_TRACER is not None:
+            for hero in (hero_1, hero_2):
+                if hero.status.array[CURRENT_HP] <= 0:
+                    ACTIVE_TRACER.emit(EVENT_DEATH, hero, hero.status.array[CURRENT_HP])
+    finally:
+        ACTIVE_TRACER = None
+        if ACTIVE_TELEMETRY is not None:
+            ACTIVE_TELEMETRY.end_duel()
+            ACTIVE_TELEMETRY = None
+    if duel_times is not None:
+        duel_times.append(last_hit_time_axis)
     return hero_1, hero_2
 
 
@@ -1544,8 +2412,7 @@ def corruption_status(owner_hero: Hero, affected_hero: Hero, show_all_the_detail
         affected_hero.other_negative_effect["Reduced Armor"] = owner_hero.other_positive_effect[
             "Reduce Enemy Armor"]
         affected_hero.status["Armor"] -= affected_hero.other_negative_effect["Reduced Armor"]
-        affected_hero.status["Physical Resistance"] = 1 - (0.052 * affected_hero.status["Armor"]) / (
-                0.9 + 0.048 * abs(affected_hero.status["Armor"]))
+        affected_hero.status["Physical Resistance"] = physical_resistance(affected_hero.status["Armor"])
         if show_all_the_details:
             print("{} triggered Armor Corruption.\n".format(owner_hero.name))
             print("{}'s Armor decreased from {} to {}".format(affected_hero.name, original_armor,
@@ -1587,11 +2454,776 @@ def curse_status(owner_hero: Hero, affected_hero: Hero, show_all_the_details=Fal
                 print("{}'s Curse of Death begin to take effects.\n".format(owner_hero.name))
 
 
+def target_random(attack_hero: Hero, enemies: list, rng=random) -> Hero:
+    """
+    Target selection policy for team_fight(), attack a random alive enemy.
+
+    :param attack_hero: the hero who is going to attack
+    :param enemies: the alive enemies, not empty
+    :param rng: the random generator
+    :return: the hero to attack
+    """
+    return rng.choice(enemies)
+
+
+def target_lowest_hp(attack_hero: Hero, enemies: list, rng=random) -> Hero:
+    """
+    Target selection policy for team_fight(), attack the enemy with the lowest current HP.
+
+    :param attack_hero: the hero who is going to attack
+    :param enemies: the alive enemies, not empty
+    :param rng: the random generator
+    :return: the hero to attack
+    >>> treant_1, treant_2 = HeroTreantProtector(1), HeroTreantProtector(1)
+    >>> treant_1.status["Current HP"], treant_2.status["Current HP"] = 300, 200
+    >>> target_lowest_hp(HeroMonkeyKing(1), [treant_1, treant_2]) is treant_2
+    True
+    """
+    return min(enemies, key=lambda hero: hero.status["Current HP"])
+
+
+def target_first(attack_hero: Hero, enemies: list, rng=random) -> Hero:
+    """
+    Target selection policy for team_fight(), the whole team focuses on the first alive enemy of the list.
+
+    :param attack_hero: the hero who is going to attack
+    :param enemies: the alive enemies, not empty
+    :param rng: the random generator
+    :return: the hero to attack
+    """
+    return enemies[0]
+
+
+# key: policy name, value: function (attack_hero, alive enemies, rng) -> the hero to attack
+TARGET_POLICIES = {"random": target_random, "lowest hp": target_lowest_hp, "first": target_first}
+
+
+def team_fight(team_1: list, team_2: list, target_policy="random", regeneration_tick=1.0,
+               show_log_or_not=False, show_all_the_details=False, show_regenerate_rs=False, rng=random):
+    """
+    Let two teams of any size fight, e.g. 2v2 or 3v3. A duel is a team fight with one hero in each team.
+    The attacks and the regeneration ticks of all the heroes are events in a priority queue (heapq),
+    so each event costs O(log N) no matter how many heroes there are. Regeneration and curse damage are
+    settled for a hero whenever it attacks, is attacked, or its regeneration tick comes.
+    Corruption and Curse of Death from several enemies follow corruption_status() and curse_status(),
+    only the highest level takes effect.
+
+    :param team_1: the heroes of the first team
+    :param team_2: the heroes of the second team
+    :param target_policy: how a hero chooses its target, a name in TARGET_POLICIES
+                          or a function (attack_hero, alive enemies, rng) -> the hero to attack
+    :param regeneration_tick: how many seconds between the regeneration ticks of a hero
+    :param show_log_or_not: whether show the details of attack result in log or not
+    :param show_all_the_details: whether show the details of attack damage composition in log or not
+    :param show_regenerate_rs: whether show the details of regeneration in log or not
+    :param rng: the random generator, the global random module by default
+    :return: the two teams after the fight is over
+    >>> team_1 = [HeroTreantProtector(1), HeroMonkeyKing(1)]
+    >>> team_2 = [HeroTreantProtector(1), HeroBountyHunter(1)]
+    >>> _, _ = team_fight(team_1, team_2, "lowest hp", rng=random.Random(3))
+    >>> all(hero.status["Current HP"] <= 0 for hero in team_1) or all(hero.status["Current HP"] <= 0 for hero in team_2)
+    True
+    >>> monkey_king = HeroMonkeyKing(5)
+    >>> life_stealers = [HeroLifeStealer(1), HeroLifeStealer(1), HeroLifeStealer(1)]
+    >>> life_stealers[0].learn_skill_corruption(3)
+    >>> life_stealers[1].learn_skill_corruption(6)
+    >>> _, _ = team_fight([monkey_king], life_stealers, "first", rng=random.Random(3))
+    >>> monkey_king.other_negative_effect["Corruption"]
+    6
+    >>> treants = [HeroTreantProtector(1), HeroTreantProtector(1)]
+    >>> _, _ = team_fight([HeroMonkeyKing(10)], treants, lambda hero, enemies, rng: enemies[-1], rng=random.Random(3))
+    >>> [hero.status["Current HP"] <= 0 for hero in treants]
+    [True, True]
+    """
+    if callable(target_policy):
+        choose_target = target_policy
+    elif target_policy in TARGET_POLICIES.keys():
+        choose_target = TARGET_POLICIES[target_policy]
+    else:
+        raise ValueError('No such target policy {}, should be one of {}'.format(target_policy,
+                                                                                 list(TARGET_POLICIES.keys())))
+
+    heroes = list(team_1) + list(team_2)
+    team_index = [0] * len(team_1) + [1] * len(team_2)
+    for hero in heroes:
+        hero.calculate_status()
+    # before fight start, calculate various long-lasting effects from all the enemies
+    for owner_team, affected_team in ((team_1, team_2), (team_2, team_1)):
+        for owner_hero in owner_team:
+            for affected_hero in affected_team:
+                corruption_status(owner_hero, affected_hero, show_all_the_details)
+                curse_status(owner_hero, affected_hero, show_all_the_details)
+
+    alive = [list(team_1), list(team_2)]
+    # heroes are told apart by their index, two heroes with the same status compare equal as dataclasses
+    is_alive = [True] * len(heroes)
+    last_settled_time = [0.0] * len(heroes)
+    position = {id(hero): i for i, hero in enumerate(heroes)}
+
+    def settle(i, time_axis):
+        # regeneration and curse damage since the last time this hero was settled
+        heroes[i].regenerate_and_curse(time_axis - last_settled_time[i], show_regenerate_rs)
+        last_settled_time[i] = time_axis
+
+    def check_death(i):
+        if is_alive[i] and heroes[i].status.array[CURRENT_HP] <= 0:
+            is_alive[i] = False
+            team = alive[team_index[i]]
+            del team[next(k for k, hero in enumerate(team) if hero is heroes[i])]
+
+    # event: (time axis, random number to break ties, event kind, hero index)
+    # kind 0 is attack, kind 1 is regeneration tick
+    events = []
+    for i, hero in enumerate(heroes):
+        heapq.heappush(events, (hero.status.array[ATTACK_INTERVAL], rng.random(), 0, i))
+        if regeneration_tick:
+            heapq.heappush(events, (regeneration_tick, rng.random(), 1, i))
+
+    while events and alive[0] and alive[1]:
+        time_axis, _, kind, i = heapq.heappop(events)
+        hero = heroes[i]
+        if hero.status.array[CURRENT_HP] <= 0:
+            continue
+        settle(i, time_axis)
+        if kind == 1:
+            heapq.heappush(events, (time_axis + regeneration_tick, rng.random(), 1, i))
+        elif hero.status.array[CURRENT_HP] > 0:
+            target = choose_target(hero, alive[1 - team_index[i]], rng)
+            settle(position[id(target)], time_axis)
+            attack(hero, target, show_log_or_not, show_all_the_details, rng)
+            trigger_moment_of_courage(hero, target, show_log_or_not, show_all_the_details, rng)
+            check_death(position[id(target)])
+            heapq.heappush(events, (time_axis + hero.status.array[ATTACK_INTERVAL], rng.random(), 0, i))
+        check_death(i)
+
+        if time_axis >= 500:
+            break
+
+    return team_1, team_2
+
+
+def batch_duel(heroes_1: list, heroes_2: list, rng=None, duel_times=None) -> None:
+    """
+    Let many pairs of heroes have their duels at the same time.
+    The i-th hero of heroes_1 fights the i-th hero of heroes_2. All the duels are stored as numpy arrays
+    (one row for each duel) and advanced together, one attack per duel in each step, so the result follows
+    the same rules as duel() without running a python loop for every single attack.
+    The logs are not supported here, use duel() if the details of an attack are needed.
+    After the duels are over, the current HP of each hero is written back to hero.status["Current HP"].
+
+    :param heroes_1: the first heroes of all the duels
+    :param heroes_2: the second heroes of all the duels, same length as heroes_1
+    :param rng: numpy random generator, a new one is created if not given
+    :param duel_times: if given, the times when the duels are over are appended to this list
+    :return: None
+    >>> treants_1 = [HeroTreantProtector(1) for _ in range(50)]
+    >>> treants_2 = [HeroTreantProtector(1) for _ in range(50)]
+    >>> batch_duel(treants_1, treants_2)
+    >>> all(t1.status["Current HP"] <= 0 or t2.status["Current HP"] <= 0 for t1, t2 in zip(treants_1, treants_2))
+    True
+    >>> monkey_kings = [HeroMonkeyKing(5) for _ in range(20)]
+    >>> life_stealers = [HeroLifeStealer(5) for _ in range(20)]
+    >>> batch_duel(monkey_kings, life_stealers, np.random.default_rng(1))
+    >>> all(monkey_king.status["Current HP"] > 100 for monkey_king in monkey_kings)
+    True
+    """
+    if len(heroes_1) != len(heroes_2):
+        raise ValueError("heroes_1 and heroes_2 should have the same length")
+    if rng is None:
+        rng = np.random.default_rng()
+    if len(heroes_1) == 0:
+        return None
+
+    # before duel start, calculate various long-lasting effects, same as duel()
+    for hero_1, hero_2 in zip(heroes_1, heroes_2):
+        hero_1.calculate_status()
+        hero_2.calculate_status()
+        corruption_status(hero_1, hero_2)
+        corruption_status(hero_2, hero_1)
+        curse_status(hero_1, hero_2)
+        curse_status(hero_2, hero_1)
+
+    state = batch_hero_arrays(heroes_1, heroes_2)
+    hp = state["Current HP"]
+    attack_interval = state["Attack Interval"]
+    attack_time_axis = attack_interval.copy()
+    last_hit_time_axis = np.zeros(len(heroes_1))
+    active = np.arange(len(heroes_1))
+
+    while active.size:
+        # side 0 means hero_1 attacks, side 1 means hero_2 attacks
+        attack_side = (attack_time_axis[0, active] > attack_time_axis[1, active]).astype(np.intp)
+        same_time = attack_time_axis[0, active] == attack_time_axis[1, active]
+        if same_time.any():
+            # attack at same time, randomly decide sequence of attack
+            attack_side[same_time] = rng.integers(0, 2, same_time.sum())
+
+        # before attack, calculate regeneration and curse damage
+        hit_time = attack_time_axis[attack_side, active]
+        batch_regenerate_and_curse(state, active, hit_time - last_hit_time_axis[active])
+        last_hit_time_axis[active] = hit_time
+
+        batch_attack(state, active, attack_side, rng)
+        batch_trigger_moment_of_courage(state, active, attack_side, rng)
+
+        over = (hp[0, active] <= 0) | (hp[1, active] <= 0) | (last_hit_time_axis[active] >= 500)
+        going_on = ~over
+        active = active[going_on]
+        attack_side = attack_side[going_on]
+        attack_time_axis[attack_side, active] += attack_interval[attack_side, active]
+
+    for i, (hero_1, hero_2) in enumerate(zip(heroes_1, heroes_2)):
+        hero_1.status["Current HP"] = float(hp[0, i])
+        hero_2.status["Current HP"] = float(hp[1, i])
+    if duel_times is not None:
+        duel_times.extend(last_hit_time_axis.tolist())
+
+
+def batch_hero_arrays(heroes_1: list, heroes_2: list) -> dict:
+    """
+    Convert the heroes of many duels into arrays, the status must be calculated before.
+    Each value in the result has shape (2, amount of duels), row 0 for heroes_1 and row 1 for heroes_2,
+    except "Critical Possibility" and "Critical Rate" which have one more dimension in front
+    for each critical skill slot.
+
+    :param heroes_1: the first heroes of all the duels
+    :param heroes_2: the second heroes of all the duels
+    :return: dict, key: name of the attribute, value: numpy array
+    >>> monkey_king = HeroMonkeyKing(10)
+    >>> monkey_king.equip_monkey_king_bar(1)
+    >>> monkey_king.learn_skill_evasion(5)
+    >>> monkey_king.calculate_status()
+    >>> life_stealer = HeroLifeStealer(10)
+    >>> life_stealer.learn_main_skill_blade_dance()
+    >>> life_stealer.calculate_status()
+    >>> state = batch_hero_arrays([monkey_king], [life_stealer])
+    >>> state["Pierce Possibility"][:, 0].tolist()
+    [0.8, 0.0]
+    >>> round(float(state["Evasion Possibility"][0, 0]), 4)
+    0.5545
+    >>> state["Critical Possibility"].shape
+    (1, 2, 1)
+    >>> state["JinGu Mastery"][:, 0].tolist()
+    [4.0, 0.0]
+    """
+    heroes = [heroes_1, heroes_2]
+    amount_of_duels = len(heroes_1)
+    critical_slots = max([len(hero.critical_list) for hero in heroes_1 + heroes_2] + [0])
+
+    def collect(get_value):
+        return np.array([[get_value(hero) for hero in side] for side in heroes], dtype=float)
+
+    def chance_not_to_trigger(possibility_dict, lowest_roll):
+        # randint(lowest_roll, 100) <= possibility, each key is checked separately
+        chance = 1.0
+        for possibility in possibility_dict.values():
+            chance *= 1 - min(max(int(possibility) - lowest_roll + 1, 0), 101 - lowest_roll) / (101 - lowest_roll)
+        return chance
+
+    state = {
+        "Current HP": collect(lambda hero: hero.status["Current HP"]),
+        "Max HP": collect(lambda hero: hero.status["Max HP"]),
+        "Lowest Damage": collect(lambda hero: hero.status["Lowest Damage"]),
+        "Highest Damage": collect(lambda hero: hero.status["Highest Damage"]),
+        "Attack Interval": collect(lambda hero: hero.status["Attack Interval"]),
+        "Regeneration": collect(lambda hero: hero.status["Regeneration"]),
+        "Armor": collect(lambda hero: hero.status["Armor"]),
+        "Physical Resistance": collect(lambda hero: hero.status["Physical Resistance"]),
+        "Magic Resistance": collect(lambda hero: hero.status["Magic Resistance"]),
+        "Strength": collect(lambda hero: hero.status["Strength"]),
+        "Life Steal Rate": collect(lambda hero: hero.life_steal_rate),
+        "Pierce Possibility": collect(lambda hero: 1 - chance_not_to_trigger(hero.pierce, 1)),
+        "MKB": collect(lambda hero: "MKB" in hero.pierce.keys()),
+        "Evasion Possibility": collect(lambda hero: 1 - chance_not_to_trigger(hero.evasion_list, 0)),
+        "Critical Possibility": np.zeros((critical_slots, 2, amount_of_duels)),
+        "Critical Rate": np.full((critical_slots, 2, amount_of_duels), 100.0),
+        "Smash": collect(lambda hero: hero.skill_list.get("Smash", 0)),
+        "Crushing": collect(lambda hero: hero.skill_list.get("Crushing", 0)),
+        "Life Steal": collect(lambda hero: hero.skill_list.get("Life Steal", 0)),
+        "Fire!": collect(lambda hero: "Fire!" in hero.skill_list.keys()),
+        "Ignore Armor": collect(lambda hero: hero.other_positive_effect.get("Ignore Armor", 0)),
+        "Thorn Armor": collect(lambda hero: "Thorn Armor" in hero.skill_list.keys()),
+        "Physical Damage Reflection": collect(
+            lambda hero: hero.other_positive_effect.get("Physical Damage Reflection", 0)),
+        "Curse of Death": collect(lambda hero: "Curse of Death" in hero.skill_list.keys()),
+        "Curse Reg Reduction": collect(lambda hero: hero.other_positive_effect.get("Curse Reg Reduction", 0)),
+        "Cursed Reg Reduction": collect(lambda hero: hero.other_negative_effect.get("Curse Reg Reduction", 0)
+                                        if "Curse of Death" in hero.other_negative_effect.keys() else 0),
+        "Cursed Damage": collect(lambda hero: hero.other_negative_effect.get("Curse Damage", 0)
+                                 if "Curse of Death" in hero.other_negative_effect.keys() else 0),
+        "Feast": collect(lambda hero: hero.main_skill_list.get("Feast", 0)),
+        "JinGu Mastery": collect(lambda hero: hero.main_skill_list.get("JinGu Mastery", 0)),
+        "JinGu Mastery Attack Times": collect(
+            lambda hero: hero.other_positive_effect.get("JinGu Mastery Attack Times", -5)),
+        "Moment of Courage": collect(lambda hero: hero.main_skill_list.get("Moment of Courage", 0)),
+    }
+    for side_index, side in enumerate(heroes):
+        for duel_index, hero in enumerate(side):
+            for slot, (possibility, critical_rate) in enumerate(hero.critical_list.values()):
+                state["Critical Possibility"][slot, side_index, duel_index] = min(max(int(possibility), 0), 100) / 100
+                state["Critical Rate"][slot, side_index, duel_index] = critical_rate
+    return state
+
+
+def batch_regenerate_and_curse(state: dict, duels, time_second) -> None:
+    """
+    Batch version of Hero.regenerate_and_curse(), both heroes of the given duels regenerate.
+
+    :param state: the arrays from batch_hero_arrays()
+    :param duels: index array, which duels to update
+    :param time_second: array, how many seconds have passed for each duel
+    :return: None
+    """
+    regenerate_hp = state["Regeneration"][:, duels] * time_second
+    regenerate_hp = (100 - state["Cursed Reg Reduction"][:, duels]) / 100 * regenerate_hp \
+        - state["Cursed Damage"][:, duels] * time_second
+    state["Current HP"][:, duels] = np.minimum(state["Max HP"][:, duels],
+                                               state["Current HP"][:, duels] + regenerate_hp)
+
+
+def batch_attack(state: dict, duels, attack_side, rng, bonus_life_steal_rate=0) -> None:
+    """
+    Batch version of attack() and damage_calculation(), in each of the given duels one hero attacks the other once.
+
+    :param state: the arrays from batch_hero_arrays()
+    :param duels: index array, which duels to update
+    :param attack_side: array, 0 means the first hero attacks, 1 means the second hero attacks
+    :param rng: numpy random generator
+    :param bonus_life_steal_rate: array or number, extra life steal rate of this attack (Moment of Courage)
+    :return: None
+    """
+    defend_side = 1 - attack_side
+    hp = state["Current HP"]
+    # one side has already been killed before attack
+    alive = (hp[attack_side, duels] > 0) & (hp[defend_side, duels] > 0)
+    duels = duels[alive]
+    attack_side = attack_side[alive]
+    defend_side = defend_side[alive]
+    bonus_life_steal_rate = np.broadcast_to(bonus_life_steal_rate, alive.shape)[alive]
+    if duels.size == 0:
+        return None
+
+    def attacker(key):
+        return state[key][attack_side, duels]
+
+    def defender(key):
+        return state[key][defend_side, duels]
+
+    critical_possibility = state["Critical Possibility"][:, attack_side, duels]
+    rolls = rng.random((6 + len(critical_possibility), duels.size))
+
+    jingu_level = attacker("JinGu Mastery")
+    jingu_attack_times = attacker("JinGu Mastery Attack Times")
+    jingu_charged = (jingu_level > 0) & (jingu_attack_times > 0)
+    bonus_jingu_damage = np.where(jingu_charged, jingu_level * 30 + 10, 0)
+    bonus_jingu_life_steal = np.where(jingu_charged, 15 * jingu_level + 10, 0)
+
+    lowest_damage = attacker("Lowest Damage") + bonus_jingu_damage
+    attack_damage = lowest_damage + (attacker("Highest Damage") + bonus_jingu_damage - lowest_damage) * rolls[0]
+
+    # in our model, only Smash is un-evadable
+    smash_level = attacker("Smash")
+    un_evadable_physical_damage = np.where((smash_level > 0) & (rolls[1] < 0.2),
+                                           80 + 20 * smash_level + 0.01 * smash_level * defender("Max HP"), 0)
+    pierce = rolls[2] < attacker("Pierce Possibility")
+    un_evadable_magic_damage = np.where(pierce & (attacker("MKB") > 0), 70, 0)
+    hit = pierce | (rolls[3] >= defender("Evasion Possibility"))
+
+    # each critical is independent, the final damage only counts the highest critical rate
+    critical_rate = np.where(rolls[6:] < critical_possibility,
+                             state["Critical Rate"][:, attack_side, duels], 100).max(axis=0, initial=100)
+    normal_attack_damage = np.where(hit, critical_rate / 100 * attack_damage, 0)
+
+    crushing_level = attacker("Crushing")
+    evadable_true_damage = np.where(hit & (crushing_level > 0) & (rolls[4] < 0.15),
+                                    50 + 50 * crushing_level + 0.5 * crushing_level * attacker("Strength"), 0)
+
+    feast_level = np.where(hit, attacker("Feast"), 0)
+    life_steal_amount = np.where(feast_level > 0, (0.01 + 0.006 * feast_level) * defender("Max HP"), 0)
+    feast_extra_damage = np.where(feast_level > 0, (0.004 + 0.002 * feast_level) * defender("Max HP"), 0)
+
+    life_steal_level = attacker("Life Steal")
+    life_steal_rate = attacker("Life Steal Rate") + bonus_jingu_life_steal + bonus_life_steal_rate \
+        + np.where((life_steal_level > 0) & (rolls[5] < 0.3), life_steal_level * 5 + 20, 0)
+
+    physical_resistance = defender("Physical Resistance")
+    armor = defender("Armor")
+    armor_under_fire = np.where(armor > 0, armor * (100 - attacker("Ignore Armor")) / 100, armor)
+    resistance_under_fire = 1 - (0.052 * armor_under_fire) / (0.9 + 0.048 * np.abs(armor_under_fire))
+    normal_attack_resistance = np.where(attacker("Fire!") > 0, resistance_under_fire, physical_resistance)
+
+    actual_normal_attack_damage = normal_attack_damage * normal_attack_resistance
+    life_steal_amount = np.where(hit, life_steal_amount + actual_normal_attack_damage * life_steal_rate / 100, 0)
+    damage_reflection = np.where(defender("Thorn Armor") > 0,
+                                 actual_normal_attack_damage * defender("Physical Damage Reflection") / 100, 0)
+    # curse will reduce life steal amount
+    life_steal_amount = np.where(defender("Curse of Death") > 0,
+                                 life_steal_amount * (100 - defender("Curse Reg Reduction")) / 100,
+                                 life_steal_amount)
+
+    defender_taken_damage = actual_normal_attack_damage \
+        + (feast_extra_damage + un_evadable_physical_damage) * physical_resistance \
+        + un_evadable_magic_damage * (1 - defender("Magic Resistance")) + evadable_true_damage
+    hp[defend_side, duels] -= defender_taken_damage
+    attacker_hp = attacker("Current HP") - damage_reflection * attacker("Physical Resistance")
+    hp[attack_side, duels] = np.minimum(attacker_hp + life_steal_amount, attacker("Max HP"))
+
+    # Jingu Mastery only counts the attacks which are not evaded
+    jingu_attack_times = np.where(hit & (jingu_level > 0), jingu_attack_times + 1, jingu_attack_times)
+    jingu_attack_times[jingu_attack_times == -1] = 1
+    jingu_attack_times[jingu_attack_times == 5] = -5
+    state["JinGu Mastery Attack Times"][attack_side, duels] = jingu_attack_times
+
+
+def batch_trigger_moment_of_courage(state: dict, duels, attack_side, rng) -> None:
+    """
+    Batch version of trigger_moment_of_courage(), the defender may counter attack in the given duels.
+
+    :param state: the arrays from batch_hero_arrays()
+    :param duels: index array, which duels to update
+    :param attack_side: array, 0 means the first hero attacked, 1 means the second hero attacked
+    :param rng: numpy random generator
+    :return: None
+    """
+    defend_side = 1 - attack_side
+    courage_level = state["Moment of Courage"][defend_side, duels]
+    triggered = (courage_level > 0) & (rng.random(duels.size) < 0.25)
+    if triggered.any():
+        batch_attack(state, duels[triggered], defend_side[triggered], rng,
+                     10 * courage_level[triggered] + 45)
+
+
+# the values of "JinGu Mastery Attack Times" in the order they go through on each hit
+JINGU_MASTERY_CYCLE = [-5, -4, -3, -2, 1, 2, 3, 4]
+
+
+def solve_duel_win_probability(hero_1: Hero, hero_2: Hero, hp_bins=80, damage_points=8,
+                               tolerance=1e-9) -> (float, float, float):
+    """
+    Calculate the winning probabilities of a duel without sampling.
+    The attack times of a duel are fixed, only the result of each attack is random. So instead of running duel()
+    many times, this function follows the whole probability distribution over the states
+    (Jingu Mastery counter of each hero, HP of hero_1, HP of hero_2) along the attack timeline.
+    Each hero's HP is discretized into hp_bins levels and the uniform damage roll into damage_points values,
+    all the other random events (Smash, critical, evasion, MKB, Crushing, Life Steal, Moment of Courage and the
+    order of attacks at the same time) are exact.
+    Same as aggregate_analyze(), hero_1 wins if hero_2's HP is not above 0 when the duel is over.
+
+    :param hero_1: the first hero
+    :param hero_2: the second hero
+    :param hp_bins: how many HP levels for each hero, more levels give more precise result but cost more time
+    :param damage_points: how many values to represent the uniform damage roll of an attack
+    :param tolerance: stop when the probability of the duel still going on is below this
+    :return: (probability that hero_1 wins, probability that hero_2 wins, probability of reaching 500 seconds)
+    >>> treant_1, treant_2 = HeroTreantProtector(1), HeroTreantProtector(1)
+    >>> hero_1_wins, hero_2_wins, timeout = solve_duel_win_probability(treant_1, treant_2)
+    >>> round(hero_1_wins, 2), round(hero_2_wins, 2), round(timeout, 2)
+    (0.5, 0.5, 0.0)
+    >>> monkey_king = HeroMonkeyKing(5)
+    >>> life_stealer = HeroLifeStealer(5)
+    >>> solve_duel_win_probability(monkey_king, life_stealer)[0] > 0.95
+    True
+    """
+    # before duel start, calculate various long-lasting effects, same as duel()
+    hero_1.calculate_status()
+    hero_2.calculate_status()
+    corruption_status(hero_1, hero_2)
+    corruption_status(hero_2, hero_1)
+    curse_status(hero_1, hero_2)
+    curse_status(hero_2, hero_1)
+    heroes = [hero_1, hero_2]
+    state = batch_hero_arrays([hero_1], [hero_2])
+
+    def value(key, side):
+        return float(state[key][side, 0])
+
+    bin_width = [value("Max HP", side) / hp_bins for side in (0, 1)]
+    jingu_states = [len(JINGU_MASTERY_CYCLE) if value("JinGu Mastery", side) > 0 else 1 for side in (0, 1)]
+    # axis 0 and 1: Jingu Mastery counter of hero_1 and hero_2, axis 2 and 3: HP level of hero_1 and hero_2
+    # HP level 0 means dead
+    probability = np.zeros((jingu_states[0], jingu_states[1], hp_bins + 1, hp_bins + 1))
+    start_index = []
+    for side in (0, 1):
+        attack_times = heroes[side].other_positive_effect.get("JinGu Mastery Attack Times", -5)
+        start_index.append(JINGU_MASTERY_CYCLE.index(attack_times)
+                           if jingu_states[side] > 1 and attack_times in JINGU_MASTERY_CYCLE else 0)
+    start_hp = [min(hp_bins, round(value("Current HP", side) / bin_width[side])) for side in (0, 1)]
+    probability[start_index[0], start_index[1], start_hp[0], start_hp[1]] = 1.0
+
+    kernels = {}
+
+    def attack_kernel(attack_side, charged, bonus_life_steal_rate):
+        # the attack result in HP levels
+        # key: (hit or not, attacker HP change), value: transition matrix of defender HP level, [new, old]
+        key = (attack_side, charged, bonus_life_steal_rate)
+        if key not in kernels.keys():
+            kernel = {}
+            old_levels = np.arange(hp_bins + 1)
+            for chance, hit, defender_change, attacker_change in duel_attack_outcomes(
+                    state, attack_side, charged, bonus_life_steal_rate, damage_points):
+                defender_levels = defender_change / bin_width[1 - attack_side]
+                attacker_levels = attacker_change / bin_width[attack_side]
+                # split the probability to the nearest levels, keeping the expected HP change
+                for attacker_level, attacker_share in split_level(attacker_levels):
+                    transition = kernel.setdefault((hit, attacker_level), np.zeros((hp_bins + 1, hp_bins + 1)))
+                    for defender_level, defender_share in split_level(defender_levels):
+                        new_levels = np.clip(old_levels + defender_level, 0, hp_bins)
+                        np.add.at(transition, (new_levels, old_levels), chance * attacker_share * defender_share)
+            kernels[key] = kernel
+        return kernels[key]
+
+    def attack_once(distribution, attack_side, bonus_life_steal_rate=0):
+        # heroes already dead do not attack or get attacked
+        alive = distribution.copy()
+        alive[:, :, 0, :] = 0
+        alive[:, :, :, 0] = 0
+        result = distribution - alive
+        for jingu_index in range(jingu_states[attack_side]):
+            part = alive[jingu_index] if attack_side == 0 else alive[:, jingu_index]
+            if not part.any():
+                continue
+            charged = jingu_states[attack_side] > 1 and JINGU_MASTERY_CYCLE[jingu_index] > 0
+            for (hit, attacker_level), transition in attack_kernel(attack_side, charged,
+                                                                  bonus_life_steal_rate).items():
+                # part has axes (Jingu Mastery counter of the defender, HP of hero_1, HP of hero_2)
+                moved = part @ transition.T if attack_side == 0 else transition @ part
+                moved = shift_hp_levels(moved, 1 + attack_side, attacker_level)
+                # Jingu Mastery only counts the attacks which are not evaded
+                next_index = (jingu_index + 1) % jingu_states[attack_side] if hit else jingu_index
+                if attack_side == 0:
+                    result[next_index] += moved
+                else:
+                    result[:, next_index] += moved
+        return result
+
+    def attack_and_courage(distribution, attack_side):
+        # an attack, then the defender may counter attack by Moment of Courage
+        distribution = attack_once(distribution, attack_side)
+        courage_level = value("Moment of Courage", 1 - attack_side)
+        if courage_level > 0:
+            distribution = 0.75 * distribution + 0.25 * attack_once(distribution, 1 - attack_side,
+                                                                    10 * courage_level + 45)
+        # the duel is over for the states with a dead hero
+        hero_1_wins = distribution[:, :, :, 0].sum()
+        hero_2_wins = distribution[:, :, 0, 1:].sum()
+        distribution[:, :, :, 0] = 0
+        distribution[:, :, 0, :] = 0
+        return distribution, hero_1_wins, hero_2_wins
+
+    def regenerate(distribution, time_second):
+        for side in (0, 1):
+            regenerate_hp = value("Regeneration", side) * time_second
+            regenerate_hp = (100 - value("Cursed Reg Reduction", side)) / 100 * regenerate_hp \
+                - value("Cursed Damage", side) * time_second
+            moved = np.zeros_like(distribution)
+            for level, share in split_level(regenerate_hp / bin_width[side]):
+                moved += share * shift_hp_levels(distribution, 2 + side, level)
+            distribution = moved
+        return distribution
+
+    total_hero_1_wins = 0.0
+    total_hero_2_wins = 0.0
+    attack_time_axis = [value("Attack Interval", 0), value("Attack Interval", 1)]
+    last_hit_time_axis = 0
+    while probability.sum() > tolerance:
+        hit_time_axis = min(attack_time_axis)
+        probability = regenerate(probability, hit_time_axis - last_hit_time_axis)
+        last_hit_time_axis = hit_time_axis
+        if attack_time_axis[0] != attack_time_axis[1]:
+            attack_side = 0 if attack_time_axis[0] < attack_time_axis[1] else 1
+            probability, hero_1_wins, hero_2_wins = attack_and_courage(probability, attack_side)
+            attacked_sides = [attack_side]
+        else:
+            # attack at same time, the sequence of attack is random
+            # the duel stops after the first attack if the time is up
+            outcomes = []
+            for order in ((0, 1), (1, 0)):
+                distribution, hero_1_wins, hero_2_wins = attack_and_courage(probability, order[0])
+                if last_hit_time_axis < 500:
+                    distribution, more_hero_1_wins, more_hero_2_wins = attack_and_courage(distribution, order[1])
+                    hero_1_wins += more_hero_1_wins
+                    hero_2_wins += more_hero_2_wins
+                outcomes.append((distribution, hero_1_wins, hero_2_wins))
+            probability = 0.5 * (outcomes[0][0] + outcomes[1][0])
+            hero_1_wins = 0.5 * (outcomes[0][1] + outcomes[1][1])
+            hero_2_wins = 0.5 * (outcomes[0][2] + outcomes[1][2])
+            attacked_sides = [0, 1]
+        total_hero_1_wins += hero_1_wins
+        total_hero_2_wins += hero_2_wins
+
+        if last_hit_time_axis >= 500:
+            break
+        for side in attacked_sides:
+            attack_time_axis[side] += value("Attack Interval", side)
+
+    return float(total_hero_1_wins), float(total_hero_2_wins), float(probability.sum())
+
+
+def duel_attack_outcomes(state: dict, attack_side: int, charged: bool, bonus_life_steal_rate=0,
+                         damage_points=8) -> list:
+    """
+    List all the possible results of one attack in the duel stored in state (the first duel of the arrays).
+    The uniform damage roll is represented by damage_points evenly spaced values.
+
+    :param state: the arrays from batch_hero_arrays()
+    :param attack_side: 0 means the first hero attacks, 1 means the second hero attacks
+    :param charged: whether the attacker's Jingu Mastery is charged
+    :param bonus_life_steal_rate: extra life steal rate of this attack (Moment of Courage)
+    :param damage_points: how many values to represent the uniform damage roll
+    :return: list of (probability, hit or evaded, defender HP change, attacker HP change)
+    >>> monkey_king, life_stealer = HeroMonkeyKing(10), HeroLifeStealer(10)
+    >>> life_stealer.learn_skill_evasion(2)
+    >>> monkey_king.calculate_status()
+    >>> life_stealer.calculate_status()
+    >>> outcomes = duel_attack_outcomes(batch_hero_arrays([monkey_king], [life_stealer]), 0, False)
+    >>> round(sum(chance for chance, _, _, _ in outcomes), 10)
+    1.0
+    >>> round(sum(chance for chance, hit, _, _ in outcomes if not hit), 4)
+    0.4059
+    """
+    defend_side = 1 - attack_side
+
+    def attacker(key):
+        return float(state[key][attack_side, 0])
+
+    def defender(key):
+        return float(state[key][defend_side, 0])
+
+    jingu_level = attacker("JinGu Mastery")
+    bonus_jingu_damage = jingu_level * 30 + 10 if charged else 0
+    bonus_jingu_life_steal = 15 * jingu_level + 10 if charged else 0
+    lowest_damage = attacker("Lowest Damage") + bonus_jingu_damage
+    highest_damage = attacker("Highest Damage") + bonus_jingu_damage
+
+    def with_chance(possibility, effect):
+        # [(chance, effect)] for an effect triggered with the possibility, dropping impossible cases
+        return [(chance, amount) for chance, amount in ((1 - possibility, 0), (possibility, effect)) if chance > 0]
+
+    smash_level = attacker("Smash")
+    smash_cases = with_chance(0.2 if smash_level > 0 else 0,
+                              80 + 20 * smash_level + 0.01 * smash_level * defender("Max HP"))
+    pierce_possibility = attacker("Pierce Possibility")
+    pierce_cases = [(chance, pierced) for chance, pierced in ((1 - pierce_possibility, False),
+                                                              (pierce_possibility, True)) if chance > 0]
+    crushing_level = attacker("Crushing")
+    crushing_cases = with_chance(0.15 if crushing_level > 0 else 0,
+                                 50 + 50 * crushing_level + 0.5 * crushing_level * attacker("Strength"))
+    life_steal_level = attacker("Life Steal")
+    life_steal_cases = with_chance(0.3 if life_steal_level > 0 else 0, life_steal_level * 5 + 20)
+
+    # each critical is independent, the final damage only counts the highest critical rate
+    critical_cases = {100: 1.0}
+    for slot in range(state["Critical Possibility"].shape[0]):
+        possibility = float(state["Critical Possibility"][slot, attack_side, 0])
+        critical_rate = float(state["Critical Rate"][slot, attack_side, 0])
+        new_cases = {}
+        for rate, chance in critical_cases.items():
+            for triggered_chance, triggered_rate in with_chance(possibility, critical_rate):
+                new_rate = max(rate, triggered_rate)
+                new_cases[new_rate] = new_cases.get(new_rate, 0) + chance * triggered_chance
+        critical_cases = new_cases
+
+    feast_level = attacker("Feast")
+    feast_life_steal = (0.01 + 0.006 * feast_level) * defender("Max HP") if feast_level > 0 else 0
+    feast_extra_damage = (0.004 + 0.002 * feast_level) * defender("Max HP") if feast_level > 0 else 0
+
+    physical_resistance = defender("Physical Resistance")
+    armor = defender("Armor")
+    if attacker("Fire!") > 0:
+        armor_under_fire = armor * (100 - attacker("Ignore Armor")) / 100 if armor > 0 else armor
+        normal_attack_resistance = 1 - (0.052 * armor_under_fire) / (0.9 + 0.048 * abs(armor_under_fire))
+    else:
+        normal_attack_resistance = physical_resistance
+    curse_remains = (100 - defender("Curse Reg Reduction")) / 100 if defender("Curse of Death") > 0 else 1
+    reflection = defender("Physical Damage Reflection") / 100 if defender("Thorn Armor") > 0 else 0
+    magic_taken = 1 - defender("Magic Resistance")
+
+    outcomes = []
+    for smash_chance, smash_damage in smash_cases:
+        for pierce_chance, pierced in pierce_cases:
+            mkb_damage = 70 if pierced and attacker("MKB") > 0 else 0
+            un_evadable_damage = smash_damage * physical_resistance + mkb_damage * magic_taken
+            evasion_possibility = 0 if pierced else defender("Evasion Possibility")
+            chance = smash_chance * pierce_chance
+            if evasion_possibility > 0:
+                outcomes.append((chance * evasion_possibility, False, -un_evadable_damage, 0))
+            for critical_rate, critical_chance in critical_cases.items():
+                for crushing_chance, crushing_damage in crushing_cases:
+                    for life_steal_chance, life_steal_bonus in life_steal_cases:
+                        hit_chance = chance * (1 - evasion_possibility) * critical_chance * crushing_chance \
+                            * life_steal_chance / damage_points
+                        life_steal_rate = attacker("Life Steal Rate") + bonus_jingu_life_steal \
+                            + bonus_life_steal_rate + life_steal_bonus
+                        for point in range(damage_points):
+                            attack_damage = lowest_damage + (highest_damage - lowest_damage) \
+                                * (point + 0.5) / damage_points
+                            actual_normal_attack_damage = critical_rate / 100 * attack_damage \
+                                * normal_attack_resistance
+                            defender_change = -(actual_normal_attack_damage + un_evadable_damage
+                                                + feast_extra_damage * physical_resistance + crushing_damage)
+                            life_steal_amount = (feast_life_steal + actual_normal_attack_damage
+                                                 * life_steal_rate / 100) * curse_remains
+                            attacker_change = life_steal_amount - actual_normal_attack_damage * reflection \
+                                * attacker("Physical Resistance")
+                            outcomes.append((hit_chance, True, defender_change, attacker_change))
+    return outcomes
+
+
+def split_level(levels: float) -> list:
+    """
+    Split a change of HP levels to the two nearest whole levels, keeping the expected change.
+
+    :param levels: the change of HP levels, not necessarily an integer
+    :return: list of (whole level change, share)
+    >>> split_level(2.25)
+    [(2, 0.75), (3, 0.25)]
+    >>> split_level(-1.0)
+    [(-1, 1.0)]
+    """
+    lower = int(np.floor(levels))
+    share = levels - lower
+    if share == 0:
+        return [(lower, 1.0)]
+    return [(lower, 1 - share), (lower + 1, share)]
+
+
+def shift_hp_levels(distribution, axis: int, levels: int):
+    """
+    Move the probabilities along one HP axis by whole levels. Probabilities moved below level 0 stay
+    at level 0 (dead), probabilities moved beyond the highest level stay at the highest level (max HP).
+
+    :param distribution: numpy array of probabilities
+    :param axis: the HP axis to shift
+    :param levels: how many levels to move, negative means losing HP
+    :return: new numpy array
+    >>> shift_hp_levels(np.array([0.0, 0.2, 0.3, 0.5]), 0, -2).tolist()
+    [0.5, 0.5, 0.0, 0.0]
+    >>> shift_hp_levels(np.array([0.0, 0.2, 0.3, 0.5]), 0, 1).tolist()
+    [0.0, 0.0, 0.2, 0.8]
+    """
+    if levels == 0:
+        return distribution
+    result = np.zeros_like(distribution)
+    source = np.moveaxis(distribution, axis, -1)
+    target = np.moveaxis(result, axis, -1)
+    size = source.shape[-1]
+    if levels > 0:
+        if levels < size:
+            target[..., levels:] = source[..., :size - levels]
+        target[..., -1] += source[..., max(size - levels, 0):].sum(axis=-1)
+    else:
+        if -levels < size:
+            target[..., :size + levels] = source[..., -levels:]
+        target[..., 0] += source[..., :min(-levels, size)].sum(axis=-1)
+    return result
+
+
 @dataclass
 class HeroMonkeyKing(Hero):
     """
     The hero model for Hero Monkey King
     """
+    __slots__ = ()
 
     def __init__(self, hero_level=1, name="Monkey King"):
         Hero.__init__(self, hero_level)
@@ -1617,6 +3249,7 @@ class HeroLifeStealer(Hero):
     """
     The hero model for Hero LifeStealer
     """
+    __slots__ = ()
 
     def __init__(self, hero_level=1, name="LifeStealer"):
         Hero.__init__(self, hero_level)
@@ -1642,6 +3275,7 @@ class HeroTreantProtector(Hero):
     """
     The hero model for Hero Treant Protector
     """
+    __slots__ = ()
 
     def __init__(self, hero_level=1, name="Treant Protector"):
         Hero.__init__(self, hero_level)
@@ -1665,6 +3299,7 @@ class HeroBountyHunter(Hero):
     """
     The hero model for Hero Bounty Hunter
     """
+    __slots__ = ()
 
     def __init__(self, hero_level=1, name="Bounty Hunter"):
         Hero.__init__(self, hero_level)
@@ -1683,6 +3318,39 @@ class HeroBountyHunter(Hero):
         self.agility_level_growth = 2.6
 
 
+# the heroes with items equipped, before any randomness, see hero_template()
+HERO_TEMPLATES = {}
+
+
+def hero_template(hero_model: str, hero_level: int, hero_name: str, items_dict: dict) -> Hero:
+    """
+    The hero with the items equipped, before skill books and main skills are rolled.
+    It is built only once for each (model, level, name, items), use Hero.clone() to get a hero for a duel,
+    the template itself must not be changed.
+
+    :param hero_model: the name of the hero model
+    :param hero_level: the hero level, from 1 to 30
+    :param hero_name: the nickname for the hero object
+    :param items_dict: the items that the hero will equip
+    :return: the template hero
+    >>> template = hero_template("MonkeyKing", 10, "", {"Satanic": 1})
+    >>> template is hero_template("MonkeyKing", 10, "", {"Satanic": 1}), template.life_steal_rate
+    (True, 25)
+    """
+    key = (hero_model, hero_level, hero_name, tuple(sorted(items_dict.items())))
+    if key not in HERO_TEMPLATES.keys():
+        hero = hero_initialize(hero_model, hero_level, hero_name)
+        for item in items_dict.keys():
+            if item == "MKB":
+                hero.equip_monkey_king_bar(items_dict[item])
+            elif item == "Satanic":
+                hero.equip_satanic(items_dict[item])
+            elif item == "Heart":
+                hero.equip_heart_of_tarrasque(items_dict[item])
+        HERO_TEMPLATES[key] = hero
+    return HERO_TEMPLATES[key]
+
+
 def hero_initialize(hero_model: str, hero_level=1, hero_name=''):
     """
     Creating a hero object according to the parameters.
@@ -1754,15 +3422,1313 @@ def update_dict_by_list_only(dict_to_update, source_list, rival_list):
     return dict_to_update
 
 
+def merge_dict(dict_to_update, source_dict):
+    for skill_name in source_dict.keys():
+        if skill_name in dict_to_update.keys():
+            dict_to_update[skill_name] += source_dict[skill_name]
+        else:
+            dict_to_update[skill_name] = source_dict[skill_name]
+    return dict_to_update
+
+
+def skill_mask(skill_list: dict, skill_bits: dict):
+    """
+    Encode the skills of a hero as an integer, one bit for each skill.
+
+    :param skill_list: the skills of the hero, e.g. hero.skill_list
+    :param skill_bits: SUB_SKILL_BITS or MAIN_SKILL_BITS
+    :return: the mask, None if a skill has no bit
+    >>> skill_mask({"Corruption": 3, "Evasion": 2}, SUB_SKILL_BITS)
+    34
+    >>> skill_mask({"Not Exist Test Skill": 1}, SUB_SKILL_BITS) is None
+    True
+    """
+    mask = 0
+    for skill_name in skill_list:
+        bit = skill_bits.get(skill_name)
+        if bit is None:
+            return None
+        mask |= bit
+    return mask
+
+
+def count_skill_masks(masks_1, masks_2, hero_1_wins, skill_names: tuple, total_count: dict,
+                      total_count_only: dict, winning_count: dict) -> None:
+    """
+    Count the skills of many duels at once from the loadout masks of the two heroes, same as DuelCounters.record()
+    does one by one: total_count counts both heroes, total_count_only counts the skills only one hero has
+    (mask_1 & ~mask_2), winning_count counts those of the winner.
+
+    :param masks_1: numpy array, the masks of the first heroes
+    :param masks_2: numpy array, the masks of the second heroes
+    :param hero_1_wins: numpy bool array, who wins each duel
+    :param skill_names: the skill name of each bit, SUB_SKILL_NAMES or MAIN_SKILL_NAMES
+    :param total_count: the dict to add the total occurrence to
+    :param total_count_only: the dict to add the "only" occurrence to
+    :param winning_count: the dict to add the winning count of "only" skills to
+    :return: None
+    >>> total, total_only, winning = {}, {}, {}
+    >>> count_skill_masks(np.array([34, 32]), np.array([32, 0]), np.array([True, False]), SUB_SKILL_NAMES,
+    ...                   total, total_only, winning)
+    >>> total, total_only, winning
+    ({'Corruption': 1, 'Evasion': 3}, {'Corruption': 1, 'Evasion': 1}, {'Corruption': 1})
+    """
+    only_1 = masks_1 & ~masks_2
+    only_2 = masks_2 & ~masks_1
+    bit_values = 1 << np.arange(len(skill_names), dtype=np.int64)
+    for counts, masks in ((total_count, (masks_1, masks_2)), (total_count_only, (only_1, only_2)),
+                          (winning_count, (np.where(hero_1_wins, only_1, only_2),))):
+        amounts = sum(((mask[:, None] & bit_values) != 0).sum(axis=0) for mask in masks)
+        merge_dict(counts, {skill_name: int(amount) for skill_name, amount in zip(skill_names, amounts) if amount})
+
+
+def count_skill_interactions(masks_1, masks_2, hero_1_wins, interaction_counts: dict) -> None:
+    """
+    Count the pairs of skills of many duels at once for the skill interaction matrices, see
+    DuelCounters.interaction_matrix(). The masks have a bit for each skill of INTERACTION_SKILL_NAMES, the sub skill
+    mask in the low bits and the main skill mask above it. As for the "only" counters, a pair is only counted
+    for a hero whose opponent does not have it too:
+    "pair" counts a hero with both skills A and B, the diagonal is the same as total_occurrence_only;
+    "versus" counts a hero with A (and the opponent without A) against an opponent with B (and the hero without B).
+    Each matrix is a flat list, the pair of skills A and B is at A * len(INTERACTION_SKILL_NAMES) + B.
+
+    :param masks_1: numpy array, the masks of the first heroes
+    :param masks_2: numpy array, the masks of the second heroes
+    :param hero_1_wins: numpy bool array, who wins each duel
+    :param interaction_counts: the dict to add the matrices to, key: "pair_occurrence", "pair_winning_count",
+                               "versus_occurrence" or "versus_winning_count"
+    :return: None
+    >>> counts, size = {}, len(INTERACTION_SKILL_NAMES)
+    >>> evasion, smash = SUB_SKILL_NAMES.index("Evasion"), SUB_SKILL_NAMES.index("Smash")
+    >>> count_skill_interactions(np.array([(1 << evasion) | (1 << smash)]), np.array([1 << smash]),
+    ...                          np.array([True]), counts)
+    >>> counts["pair_occurrence"][evasion * size + smash], counts["pair_winning_count"][evasion * size + smash]
+    (1, 1)
+    >>> counts["pair_occurrence"][smash * size + smash], counts["versus_occurrence"][evasion * size + smash]
+    (0, 0)
+    """
+    size = len(INTERACTION_SKILL_NAMES)
+    bits_1 = ((masks_1[:, None] >> np.arange(size)) & 1).astype(np.float64)
+    bits_2 = ((masks_2[:, None] >> np.arange(size)) & 1).astype(np.float64)
+    both = bits_1 * bits_2
+    only_1, only_2 = bits_1 - both, bits_2 - both
+    winner = np.where(hero_1_wins[:, None], bits_1, bits_2)
+    winner_only = np.where(hero_1_wins[:, None], only_1, only_2)
+    loser_only = only_1 + only_2 - winner_only
+    # a pair both heroes have, the matrix products of floats are exact for the counts and much faster than of ints
+    both_pairs = both.T @ both
+    matrices = {"pair_occurrence": bits_1.T @ bits_1 + bits_2.T @ bits_2 - 2 * both_pairs,
+                "pair_winning_count": winner.T @ winner - both_pairs,
+                "versus_occurrence": only_1.T @ only_2 + only_2.T @ only_1,
+                "versus_winning_count": winner_only.T @ loser_only}
+    merge_statistics(interaction_counts, {name: np.rint(matrix).astype(np.int64).ravel().tolist()
+                                          for name, matrix in matrices.items()})
+
+
+def merge_statistics(dict_to_update, source_dict):
+    for skill_name in source_dict.keys():
+        if skill_name in dict_to_update.keys():
+            dict_to_update[skill_name] = [a + b for a, b in zip(dict_to_update[skill_name], source_dict[skill_name])]
+        else:
+            dict_to_update[skill_name] = list(source_dict[skill_name])
+    return dict_to_update
+
+
+@dataclass
+class DuelCounters:
+    """
+    The counters accumulated by the monte carlo simulation, key: skill name, value: int.
+    "only" means the skill is only learned by one of the two heroes in that duel.
+    record() only keeps the loadout masks of each duel, they are counted into the dicts at once by tally(),
+    which is called by every method reading the dicts, by == and at the end of simulate_counters();
+    call tally() before reading the dicts directly.
+    """
+    winning_count_only: dict = field(default_factory=dict)
+    winning_count_main_skill_only: dict = field(default_factory=dict)
+    total_occurrence: dict = field(default_factory=dict)
+    total_occurrence_main_skill: dict = field(default_factory=dict)
+    total_occurrence_only: dict = field(default_factory=dict)
+    total_occurrence_main_skill_only: dict = field(default_factory=dict)
+    loop_times: int = 0
+    # the duels decided by DuelOutcomeCache instead of being run, see simulate_counters()
+    cache_hits: int = 0
+    cache_misses: int = 0
+    cache_evictions: int = 0
+    # for the variance reduction report, see record_statistics() and record_control()
+    # key: skill name, value: [duels, sum of y, sum of y^2, sum of x, sum of x^2, sum of x*y]
+    skill_statistics: dict = field(default_factory=dict)
+    # key: skill name, value: [amount, sum of x, sum of x^2] of the loadouts which are not dueled
+    control_statistics: dict = field(default_factory=dict)
+    # the seconds spent on the duels, and on the control variate (duel_advantage() and the loadouts not dueled),
+    # to compare the variance reduction for the same amount of work; not the same in two equal simulations
+    duel_seconds: float = field(default=0.0, compare=False)
+    control_seconds: float = field(default=0.0, compare=False)
+    # the skill interaction matrices, key: "pair_occurrence", "pair_winning_count", "versus_occurrence" or
+    # "versus_winning_count", value: flat list, see count_skill_interactions() and interaction_matrix()
+    interaction_counts: dict = field(default_factory=dict)
+    # the duels not counted yet, (sub skill mask 1, sub skill mask 2, main skill mask 1, main skill mask 2, winner)
+    pending: list = field(default_factory=list, compare=False, repr=False)
+
+    def __eq__(self, other) -> bool:
+        """
+        The counters are equal if all the duels counted are the same, the duels kept by record() are counted first.
+
+        >>> hero_1, hero_2 = HeroMonkeyKing(10), HeroMonkeyKing(10)
+        >>> hero_1.learn_skill_evasion(3)
+        >>> counters, tallied = DuelCounters(), DuelCounters()
+        >>> counters.record(hero_1, hero_2, True)
+        >>> tallied.record(hero_1, hero_2, True)
+        >>> tallied.tally().pending, counters.pending == []
+        ([], False)
+        >>> counters == tallied, counters.pending, counters == DuelCounters()
+        (True, [], False)
+        """
+        if not isinstance(other, DuelCounters):
+            return NotImplemented
+        self.tally()
+        other.tally()
+        return all(getattr(self, counter.name) == getattr(other, counter.name)
+                   for counter in fields(self) if counter.compare)
+
+    def record(self, hero_1: Hero, hero_2: Hero, hero_1_wins=None) -> None:
+        """
+        Count the skills of two heroes after their duel is over.
+
+        :param hero_1: the first hero
+        :param hero_2: the second hero
+        :param hero_1_wins: who wins the duel, None means hero_1 wins if hero_2's HP is not above 0
+        :return: None
+        >>> hero_1, hero_2 = HeroMonkeyKing(10), HeroMonkeyKing(10)
+        >>> hero_1.learn_skill_evasion(3)
+        >>> hero_2.learn_skill_smash(3)
+        >>> hero_2.learn_skill_evasion(3)
+        >>> hero_1.status["Current HP"], hero_2.status["Current HP"] = 100, -5
+        >>> counters = DuelCounters()
+        >>> counters.record(hero_1, hero_2)
+        >>> counters.tally().winning_count_only, counters.total_occurrence_only
+        ({}, {'Smash': 1})
+        >>> counters.total_occurrence
+        {'Evasion': 2, 'Smash': 1}
+        """
+        if hero_1_wins is None:
+            hero_1_wins = hero_2.status.array[CURRENT_HP] <= 0
+        masks = (skill_mask(hero_1.skill_list, SUB_SKILL_BITS), skill_mask(hero_2.skill_list, SUB_SKILL_BITS),
+                 skill_mask(hero_1.main_skill_list, MAIN_SKILL_BITS),
+                 skill_mask(hero_2.main_skill_list, MAIN_SKILL_BITS))
+        if None not in masks:
+            self.pending.append(masks + (bool(hero_1_wins),))
+            self.loop_times += 1
+            if len(self.pending) >= COUNTER_BUFFER_SIZE:
+                self.tally()
+            return None
+
+        # a skill without a bit, e.g. made up for a test, is counted by its name
+        if hero_1_wins:
+            skill_list = hero_1.skill_list.keys()
+            main_skill_list = hero_1.main_skill_list.keys()
+            skill_list2 = hero_2.skill_list.keys()
+            main_skill_list2 = hero_2.main_skill_list.keys()
+        else:
+            skill_list = hero_2.skill_list.keys()
+            main_skill_list = hero_2.main_skill_list.keys()
+            skill_list2 = hero_1.skill_list.keys()
+            main_skill_list2 = hero_1.main_skill_list.keys()
+
+        update_dict(self.total_occurrence, hero_1.skill_list)
+        update_dict(self.total_occurrence, hero_2.skill_list)
+
+        update_dict(self.total_occurrence_main_skill, hero_1.main_skill_list)
+        update_dict(self.total_occurrence_main_skill, hero_2.main_skill_list)
+
+        update_only_dict(self.total_occurrence_only, hero_1.skill_list, hero_2.skill_list)
+        update_only_dict(self.total_occurrence_only, hero_2.skill_list, hero_1.skill_list)
+
+        update_only_dict(self.total_occurrence_main_skill_only, hero_1.main_skill_list, hero_2.main_skill_list)
+        update_only_dict(self.total_occurrence_main_skill_only, hero_2.main_skill_list, hero_1.main_skill_list)
+
+        update_dict_by_list_only(self.winning_count_only, skill_list, skill_list2)
+        update_dict_by_list_only(self.winning_count_main_skill_only, main_skill_list, main_skill_list2)
+        self.loop_times += 1
+
+    def tally(self) -> 'DuelCounters':
+        """
+        Count the duels kept by record() into the dicts, in one vectorized pass.
+
+        :return: self
+        """
+        if not self.pending:
+            return self
+        rows = np.array(self.pending, dtype=np.int64)
+        self.pending = []
+        hero_1_wins = rows[:, 4].astype(bool)
+        count_skill_masks(rows[:, 0], rows[:, 1], hero_1_wins, SUB_SKILL_NAMES, self.total_occurrence,
+                          self.total_occurrence_only, self.winning_count_only)
+        count_skill_masks(rows[:, 2], rows[:, 3], hero_1_wins, MAIN_SKILL_NAMES, self.total_occurrence_main_skill,
+                          self.total_occurrence_main_skill_only, self.winning_count_main_skill_only)
+        count_skill_interactions(rows[:, 0] | (rows[:, 2] << len(SUB_SKILL_NAMES)),
+                                 rows[:, 1] | (rows[:, 3] << len(SUB_SKILL_NAMES)), hero_1_wins,
+                                 self.interaction_counts)
+        return self
+
+    def merge(self, other: 'DuelCounters') -> 'DuelCounters':
+        """
+        Add the counters of another simulation into this one.
+
+        :param other: the counters to add
+        :return: self
+        >>> counters = DuelCounters(total_occurrence={"Evasion": 2}, loop_times=1)
+        >>> _ = counters.merge(DuelCounters(total_occurrence={"Evasion": 1, "Smash": 1}, loop_times=1))
+        >>> counters.total_occurrence, counters.loop_times
+        ({'Evasion': 3, 'Smash': 1}, 2)
+        """
+        self.tally()
+        other.tally()
+        merge_dict(self.winning_count_only, other.winning_count_only)
+        merge_dict(self.winning_count_main_skill_only, other.winning_count_main_skill_only)
+        merge_dict(self.total_occurrence, other.total_occurrence)
+        merge_dict(self.total_occurrence_main_skill, other.total_occurrence_main_skill)
+        merge_dict(self.total_occurrence_only, other.total_occurrence_only)
+        merge_dict(self.total_occurrence_main_skill_only, other.total_occurrence_main_skill_only)
+        self.loop_times += other.loop_times
+        self.cache_hits += other.cache_hits
+        self.cache_misses += other.cache_misses
+        self.cache_evictions += other.cache_evictions
+        merge_statistics(self.skill_statistics, other.skill_statistics)
+        merge_statistics(self.control_statistics, other.control_statistics)
+        merge_statistics(self.interaction_counts, other.interaction_counts)
+        self.duel_seconds += other.duel_seconds
+        self.control_seconds += other.control_seconds
+        return self
+
+    def record_statistics(self, hero_1: Hero, hero_2: Hero, hero_1_score: float, advantage: float) -> None:
+        """
+        Record one duel of the estimate for every skill only one of the two heroes has: y is the score of the
+        hero with the skill, x is its duel_advantage().
+
+        :param hero_1: the first hero
+        :param hero_2: the second hero
+        :param hero_1_score: 1.0 if hero_1 won the duel, otherwise 0.0
+        :param advantage: duel_advantage(hero_1, hero_2) before the duel
+        :return: None
+        >>> hero_1, hero_2 = HeroMonkeyKing(10), HeroMonkeyKing(10)
+        >>> hero_1.learn_skill_evasion(3)
+        >>> hero_2.learn_skill_smash(3)
+        >>> counters = DuelCounters()
+        >>> counters.record_statistics(hero_1, hero_2, 1.0, 0.75)
+        >>> counters.skill_statistics
+        {'Evasion': [1, 1.0, 1.0, 0.75, 0.5625, 0.75], 'Smash': [1, 0.0, 0.0, 0.25, 0.0625, 0.0]}
+        """
+        for skill_list, rival_skill_list, y, x in ((hero_1.skill_list, hero_2.skill_list, hero_1_score, advantage),
+                                                   (hero_2.skill_list, hero_1.skill_list,
+                                                    1 - hero_1_score, 1 - advantage),
+                                                   (hero_1.main_skill_list, hero_2.main_skill_list,
+                                                    hero_1_score, advantage),
+                                                   (hero_2.main_skill_list, hero_1.main_skill_list,
+                                                    1 - hero_1_score, 1 - advantage)):
+            for skill_name in skill_list:
+                if skill_name not in rival_skill_list:
+                    merge_statistics(self.skill_statistics, {skill_name: (1, y, y * y, x, x * x, x * y)})
+
+    def record_control(self, hero_1: Hero, hero_2: Hero, advantage: float) -> None:
+        """
+        Record duel_advantage() of a pair of loadouts which is not dueled, for the mean of the control variate.
+
+        :param hero_1: the first hero
+        :param hero_2: the second hero
+        :param advantage: duel_advantage(hero_1, hero_2)
+        :return: None
+        """
+        for skill_list, rival_skill_list, x in ((hero_1.skill_list, hero_2.skill_list, advantage),
+                                                (hero_2.skill_list, hero_1.skill_list, 1 - advantage),
+                                                (hero_1.main_skill_list, hero_2.main_skill_list, advantage),
+                                                (hero_2.main_skill_list, hero_1.main_skill_list, 1 - advantage)):
+            for skill_name in skill_list:
+                if skill_name not in rival_skill_list:
+                    merge_statistics(self.control_statistics, {skill_name: (1, x, x * x)})
+
+    def variance_reduction(self, main_skill=False) -> dict:
+        """
+        The winning rates corrected by the control variate, and how much the variance is reduced compared with
+        plain monte carlo of the same amount of work. The control variate x is duel_advantage(), its mean is
+        estimated from the loadouts recorded by record_control(). The work is the time of the duels plus the time
+        of the control variate, see duel_seconds and control_seconds; if the time is not known (e.g. the counters
+        of DuelRecords), the factor is for the same amount of duels.
+
+        :param main_skill: False for the sub skills, True for the main skills
+        :return: key: skill name, value: (winning rate, corrected winning rate, variance reduction factor)
+        >>> counters = DuelCounters(total_occurrence_only={"Evasion": 4},
+        ...                         skill_statistics={"Evasion": [4, 2.0, 2.0, 2.0, 1.4, 1.6]},
+        ...                         control_statistics={"Evasion": [4, 2.4, 1.44]})
+        >>> [round(value, 4) for value in counters.variance_reduction()["Evasion"]]
+        [0.5, 0.65, 10.0]
+        >>> counters.duel_seconds, counters.control_seconds = 3.0, 1.0
+        >>> round(counters.variance_reduction()["Evasion"][2], 4)
+        7.5
+        """
+        self.tally()
+        total_count = self.total_occurrence_main_skill_only if main_skill else self.total_occurrence_only
+        reductions = {}
+        for skill_name in total_count:
+            if skill_name not in self.skill_statistics:
+                continue
+            duels, sum_y, sum_yy, sum_x, sum_xx, sum_xy = self.skill_statistics[skill_name]
+            mean_y, mean_x = sum_y / duels, sum_x / duels
+            variance_y = max(0.0, sum_yy / duels - mean_y * mean_y)
+            variance_x = max(0.0, sum_xx / duels - mean_x * mean_x)
+            covariance = sum_xy / duels - mean_x * mean_y
+            corrected = mean_y
+            variance = variance_y / duels
+            control = self.control_statistics.get(skill_name)
+            if control is not None and variance_x > 0:
+                control_mean = control[1] / control[0]
+                control_variance = max(0.0, control[2] / control[0] - control_mean * control_mean)
+                beta = covariance / variance_x
+                corrected = min(1.0, max(0.0, mean_y - beta * (mean_x - control_mean)))
+                variance = ((variance_y - covariance * covariance / variance_x) / duels
+                            + beta * beta * control_variance / control[0])
+            plain_variance = mean_y * (1 - mean_y) / duels
+            if plain_variance == 0:
+                factor = 1.0
+            elif variance <= 0:
+                factor = float("inf")
+            else:
+                factor = plain_variance / variance
+                if self.duel_seconds > 0:
+                    # plain monte carlo runs more duels in the time of the control variate
+                    factor *= self.duel_seconds / (self.duel_seconds + self.control_seconds)
+            reductions[skill_name] = (mean_y, corrected, factor)
+        return reductions
+
+    def winning_rate_intervals(self, main_skill=False, z=1.96) -> dict:
+        """
+        The confidence intervals of the winning rates in the report, see show_dict_report() and wilson_interval().
+
+        :param main_skill: False for the sub skills, True for the main skills
+        :param z: the z-score of the confidence level, 1.96 for 95%
+        :return: key: skill name, value: (lower bound, upper bound)
+        >>> counters = DuelCounters(winning_count_only={"Evasion": 50}, total_occurrence_only={"Evasion": 100,
+        ...                                                                                    "Smash": 100})
+        >>> {skill: tuple(round(bound, 4) for bound in interval)
+        ...  for skill, interval in counters.winning_rate_intervals().items()}
+        {'Evasion': (0.4038, 0.5962), 'Smash': (0.0, 0.037)}
+        """
+        self.tally()
+        if main_skill:
+            winning_count, total_count = self.winning_count_main_skill_only, self.total_occurrence_main_skill_only
+        else:
+            winning_count, total_count = self.winning_count_only, self.total_occurrence_only
+        return {skill: wilson_interval(winning_count.get(skill, 0), total, z) for skill, total in total_count.items()}
+
+    def winning_rates(self, main_skill=False) -> dict:
+        """
+        The winning rates in the report, the same as aggregate_analyze() returns, without printing the report.
+        The winning rates are not corrected by the control variate, see variance_reduction().
+
+        :param main_skill: False for the sub skills, True for the main skills
+        :return: key: skill name, value: winning rate in percent, from the lowest winning count to the highest
+        >>> DuelCounters(winning_count_only={"Evasion": 50, "Smash": 10},
+        ...              total_occurrence_only={"Evasion": 100, "Smash": 40}).winning_rates()
+        {'Smash': 25.0, 'Evasion': 50.0}
+        """
+        self.tally()
+        if main_skill:
+            winning_count, total_count = self.winning_count_main_skill_only, self.total_occurrence_main_skill_only
+        else:
+            winning_count, total_count = self.winning_count_only, self.total_occurrence_only
+        return {skill: round(int(wins) / total_count[skill] * 100, 2)
+                for skill, wins in sorted(winning_count.items(), key=lambda w: (w[1], w[0]))}
+
+    def interaction_matrix(self, versus=False, row_skills=SUB_SKILL_NAMES,
+                           column_skills=SUB_SKILL_NAMES) -> (np.ndarray, np.ndarray):
+        """
+        The winning rates of the pairs of skills, see count_skill_interactions(). Row A and column B is
+        the winning rate of a hero with both A and B, or with versus the winning rate of A against an opponent with B.
+        The diagonal of the pairs is the winning rate of each skill in the report of aggregate_analyze().
+
+        :param versus: False for the pairs of skills of a hero, True for a skill against a skill of the opponent
+        :param row_skills: the skills of the rows, e.g. SUB_SKILL_NAMES or MAIN_SKILL_NAMES
+        :param column_skills: the skills of the columns
+        :return: (winning rates in percent, nan for a pair never counted; how many times each pair is counted)
+        >>> hero_1, hero_2 = HeroMonkeyKing(10), HeroMonkeyKing(10)
+        >>> hero_1.learn_skill_evasion(3)
+        >>> hero_1.learn_skill_thorn_armor(3)
+        >>> hero_2.learn_skill_smash(3)
+        >>> counters = DuelCounters()
+        >>> counters.record(hero_1, hero_2, True)
+        >>> counters.record(hero_1, hero_2, False)
+        >>> rates, occurrence = counters.interaction_matrix(False, ("Evasion", "Thorn Armor"), ("Thorn Armor",))
+        >>> rates.tolist(), occurrence.tolist()
+        ([[50.0], [50.0]], [[2], [2]])
+        >>> rates, occurrence = counters.interaction_matrix(True, ("Evasion",), ("Smash", "Evasion"))
+        >>> rates.tolist(), occurrence.tolist()
+        ([[50.0, nan]], [[2, 0]])
+        """
+        self.tally()
+        size = len(INTERACTION_SKILL_NAMES)
+        rows = [INTERACTION_SKILL_NAMES.index(skill) for skill in row_skills]
+        columns = [INTERACTION_SKILL_NAMES.index(skill) for skill in column_skills]
+        kind = "versus" if versus else "pair"
+        winning_count, occurrence = (np.array(self.interaction_counts.get(name, [0] * size * size),
+                                              dtype=np.int64).reshape(size, size)[np.ix_(rows, columns)]
+                                     for name in (kind + "_winning_count", kind + "_occurrence"))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            winning_rates = np.round(winning_count / occurrence * 100, 2)
+        return winning_rates, occurrence
+
+
+def wilson_interval(wins: int, total: int, z=1.96) -> (float, float):
+    """
+    The Wilson score interval of a winning rate, it stays inside [0, 1] even for a few duels or extreme rates.
+
+    :param wins: how many times the skill wins
+    :param total: how many duels
+    :param z: the z-score of the confidence level, 1.96 for 95%
+    :return: (lower bound, upper bound)
+    >>> [round(bound, 4) for bound in wilson_interval(50, 100)]
+    [0.4038, 0.5962]
+    >>> wilson_interval(0, 0)
+    (0.0, 1.0)
+    """
+    if total == 0:
+        return 0.0, 1.0
+    rate = wins / total
+    denominator = 1 + z * z / total
+    center = (rate + z * z / (2 * total)) / denominator
+    half_width = z * math.sqrt(rate * (1 - rate) / total + z * z / (4 * total * total)) / denominator
+    return max(0.0, center - half_width), min(1.0, center + half_width)
+
+
+def loadout_key(hero: Hero) -> tuple:
+    """
+    Everything about a built hero that matters in a duel: model, level, items, skill levels and main skills.
+
+    :param hero: the hero, before the duel
+    :return: tuple, the same for two heroes with the same loadout
+    >>> hero_1, hero_2 = HeroMonkeyKing(10), HeroMonkeyKing(10)
+    >>> hero_1.learn_skill_smash(3)
+    >>> hero_1.learn_skill_evasion(2)
+    >>> hero_2.learn_skill_evasion(2)
+    >>> hero_2.learn_skill_smash(3)
+    >>> loadout_key(hero_1) == loadout_key(hero_2)
+    True
+    >>> hero_2.equip_satanic(1)
+    >>> loadout_key(hero_1) == loadout_key(hero_2)
+    False
+    """
+    return (hero.status_inputs(), tuple(sorted(hero.skill_list.items())), tuple(sorted(hero.main_skill_list.items())),
+            tuple(sorted(hero.attack_attachment.items())), hero.life_steal_rate)
+
+
+@dataclass
+class DuelOutcomeCache:
+    """
+    A bounded LRU cache of duel outcomes, key: (loadout_key(hero_1), loadout_key(hero_2)),
+    value: [how many times hero_1 wins, how many duels].
+    Once a pair of loadouts has been dueled min_duels times, its later duels are not run anymore,
+    the winner is sampled from the recorded winning rate instead.
+    """
+    max_size: int = 4096
+    min_duels: int = 20
+    entries: OrderedDict = field(default_factory=OrderedDict)
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    def sample(self, key: tuple, rng=random):
+        """
+        Decide the winner from the recorded outcomes if the pair has been dueled enough times.
+
+        :param key: the loadouts of the two heroes
+        :param rng: the random generator, the global random module by default
+        :return: True if hero_1 wins, False if hero_2 wins, None if the duel should be run (a miss)
+        >>> cache = DuelOutcomeCache(max_size=1, min_duels=2)
+        >>> cache.sample("pair a") is None
+        True
+        >>> cache.record("pair a", True)
+        >>> cache.record("pair a", True)
+        >>> cache.sample("pair a")
+        True
+        >>> cache.record("pair b", False)
+        >>> cache.hits, cache.misses, cache.evictions
+        (1, 1, 1)
+        """
+        entry = self.entries.get(key)
+        if entry is None or entry[1] < self.min_duels:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return rng.random() * entry[1] < entry[0]
+
+    def record(self, key: tuple, hero_1_wins: bool) -> None:
+        """
+        Record the outcome of a duel which was run, the least recently used pair is dropped when full.
+
+        :param key: the loadouts of the two heroes
+        :param hero_1_wins: who won the duel
+        :return: None
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = [0, 0]
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        else:
+            self.entries.move_to_end(key)
+        entry[0] += hero_1_wins
+        entry[1] += 1
+
+
+class DuelRecorder:
+    """
+    Write one row for each duel to the columnar files of a directory, see RECORD_COLUMNS.
+    Each column of a chunk of rows is one .npy file named by the column and the index of the first duel,
+    e.g. "hero_1_wins.000000004096.npy", so the chunks written by different workers never clash,
+    and records.json describes the simulation. Read the records with DuelRecords.
+    """
+
+    def __init__(self, path: str, first_duel_index=0, description=None):
+        """
+        :param path: the directory of the records, use an empty directory for each simulation
+        :param first_duel_index: the index of the first duel recorded in the whole simulation
+        :param description: the settings of the simulation saved in records.json, e.g. the hero models
+        """
+        self.path = path
+        self.first_duel_index = first_duel_index
+        self.description = {} if description is None else description
+        self.rows = {column: [] for column in RECORD_COLUMNS}
+
+    def add(self, hero_1: Hero, hero_2: Hero, hero_1_wins: bool, items_dict: dict, duel_time=None) -> None:
+        """
+        Add the row of one duel, the chunk is written when it is full.
+
+        :param hero_1: the first hero after the duel
+        :param hero_2: the second hero after the duel
+        :param hero_1_wins: who wins the duel
+        :param items_dict: the items of the two heroes
+        :param duel_time: the time when the duel is over, None if the duel was decided by the outcome cache
+        :return: None
+        """
+        rows = self.rows
+        rows["sub_skills"].append([[hero.skill_list.get(skill_name, 0) for skill_name in SUB_SKILL_NAMES]
+                                   for hero in (hero_1, hero_2)])
+        rows["main_skills"].append([[hero.main_skill_list.get(skill_name, 0) for skill_name in MAIN_SKILL_NAMES]
+                                    for hero in (hero_1, hero_2)])
+        rows["items"].append([[items_dict.get(item, 0) for item in ITEM_NAMES]] * 2)
+        rows["hero_1_wins"].append(hero_1_wins)
+        if duel_time is None:
+            rows["duel_time"].append(np.nan)
+            rows["remaining_hp"].append((np.nan, np.nan))
+        else:
+            rows["duel_time"].append(duel_time)
+            rows["remaining_hp"].append((hero_1.status.array[CURRENT_HP], hero_2.status.array[CURRENT_HP]))
+        if len(rows["hero_1_wins"]) >= RECORD_CHUNK_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Write the rows kept in memory as a chunk of files.
+
+        :return: None
+        """
+        amount_of_rows = len(self.rows["hero_1_wins"])
+        if amount_of_rows == 0:
+            return None
+        os.makedirs(self.path, exist_ok=True)
+        for column, dtype in RECORD_COLUMNS.items():
+            np.save(os.path.join(self.path, "{}.{:012d}.npy".format(column, self.first_duel_index)),
+                    np.array(self.rows[column], dtype=dtype))
+            self.rows[column] = []
+        metadata = dict(self.description, sub_skill_names=SUB_SKILL_NAMES, main_skill_names=MAIN_SKILL_NAMES,
+                        item_names=ITEM_NAMES)
+        with open(os.path.join(self.path, "records.json"), "w") as metadata_file:
+            json.dump(metadata, metadata_file)
+        self.first_duel_index += amount_of_rows
+
+
+class DuelRecords:
+    """
+    The duel records written by DuelRecorder, memory-mapped chunk by chunk, so any view of the simulation
+    can be counted again without running the duels. A filter is a function which takes the columns of a chunk
+    (dict of numpy arrays) and returns a boolean array, e.g. the duels where hero_1 has level 3 Evasion:
+    lambda columns: columns["sub_skills"][:, 0, SUB_SKILL_NAMES.index("Evasion")] == 3
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: the directory of the records
+        """
+        self.path = path
+        with open(os.path.join(path, "records.json")) as metadata_file:
+            self.description = json.load(metadata_file)
+        self.chunk_names = sorted(name[len("hero_1_wins."):-len(".npy")] for name in os.listdir(path)
+                                  if name.startswith("hero_1_wins.") and name.endswith(".npy"))
+
+    def chunks(self, where=None):
+        """
+        Go through the chunks of the records.
+
+        :param where: the filter of the duels, None means all the duels
+        :return: generator of dict, key: column name, value: the memory-mapped array (filtered if where is given)
+        """
+        for chunk_name in self.chunk_names:
+            columns = {column: np.load(os.path.join(self.path, "{}.{}.npy".format(column, chunk_name)),
+                                       mmap_mode="r")
+                       for column in RECORD_COLUMNS}
+            if where is not None:
+                mask = np.asarray(where(columns), dtype=bool)
+                columns = {column: values[mask] for column, values in columns.items()}
+            yield columns
+
+    def __len__(self) -> int:
+        return sum(len(columns["hero_1_wins"]) for columns in self.chunks())
+
+    def column(self, column: str, where=None) -> np.ndarray:
+        """
+        One column of all the chunks in one array.
+
+        :param column: the column name, see RECORD_COLUMNS
+        :param where: the filter of the duels, None means all the duels
+        :return: numpy array, one row for each duel
+        """
+        return np.concatenate([columns[column] for columns in self.chunks(where)])
+
+    def counters(self, where=None) -> DuelCounters:
+        """
+        Count the skills of the duels as simulate_counters() does.
+
+        :param where: the filter of the duels, None means all the duels
+        :return: the counters
+        """
+        counters = DuelCounters()
+        for columns in self.chunks(where):
+            hero_1_wins = np.asarray(columns["hero_1_wins"])
+            loadout_masks = []
+            for column, skill_names, winning_count, total_count, total_count_only in (
+                    ("sub_skills", SUB_SKILL_NAMES, counters.winning_count_only,
+                     counters.total_occurrence, counters.total_occurrence_only),
+                    ("main_skills", MAIN_SKILL_NAMES, counters.winning_count_main_skill_only,
+                     counters.total_occurrence_main_skill, counters.total_occurrence_main_skill_only)):
+                # the skill levels turned into the loadout masks, see skill_mask()
+                masks = (np.asarray(columns[column]) > 0) @ (1 << np.arange(len(skill_names), dtype=np.int64))
+                count_skill_masks(masks[:, 0], masks[:, 1], hero_1_wins, skill_names, total_count,
+                                  total_count_only, winning_count)
+                loadout_masks.append(masks)
+            sub_masks, main_masks = loadout_masks
+            count_skill_interactions(sub_masks[:, 0] | (main_masks[:, 0] << len(SUB_SKILL_NAMES)),
+                                     sub_masks[:, 1] | (main_masks[:, 1] << len(SUB_SKILL_NAMES)), hero_1_wins,
+                                     counters.interaction_counts)
+            counters.loop_times += len(hero_1_wins)
+        return counters
+
+    def report(self, main_skill=False, where=None) -> dict:
+        """
+        Show the report of show_dict_report() for the duels.
+
+        :param main_skill: False for the sub skills, True for the main skills
+        :param where: the filter of the duels, None means all the duels
+        :return: the winning rate dict
+        """
+        counters = self.counters(where)
+        if main_skill:
+            return show_dict_report("Main Skills", dict(sorted(counters.winning_count_main_skill_only.items(),
+                                                                key=lambda w: (w[1], w[0]))),
+                                    counters.total_occurrence_main_skill_only, counters.loop_times,
+                                    counters.total_occurrence_main_skill)
+        return show_dict_report("Sub Skills", dict(sorted(counters.winning_count_only.items(),
+                                                           key=lambda w: (w[1], w[0]))),
+                                counters.total_occurrence_only, counters.loop_times, counters.total_occurrence)
+
+    def winning_rate_by_level(self, skill_name: str, only=False, where=None) -> dict:
+        """
+        How a skill wins at each level, each hero with the skill counts separately.
+
+        :param skill_name: the name of a sub skill or a main skill
+        :param only: only count the duels where the rival does not have the skill
+        :param where: the filter of the duels, None means all the duels
+        :return: key: skill level, value: (how many times the hero with the skill wins, how many heroes)
+        """
+        if skill_name in SUB_SKILL_NAMES:
+            column, index = "sub_skills", SUB_SKILL_NAMES.index(skill_name)
+        elif skill_name in MAIN_SKILL_NAMES:
+            column, index = "main_skills", MAIN_SKILL_NAMES.index(skill_name)
+        else:
+            raise ValueError('No such skill {}'.format(skill_name))
+        levels = {}
+        for columns in self.chunks(where):
+            skill_levels = np.asarray(columns[column][:, :, index])
+            hero_1_wins = np.asarray(columns["hero_1_wins"])
+            for side, side_wins in ((0, hero_1_wins), (1, ~hero_1_wins)):
+                learned = skill_levels[:, side] > 0
+                if only:
+                    learned &= skill_levels[:, 1 - side] == 0
+                for level in np.unique(skill_levels[learned, side]).tolist():
+                    at_level = learned & (skill_levels[:, side] == level)
+                    wins, total = levels.get(level, (0, 0))
+                    levels[level] = (wins + int((at_level & side_wins).sum()), total + int(at_level.sum()))
+        return dict(sorted(levels.items()))
+
+
+def simulation_rng(seed, *spawn_key):
+    """
+    Create the random generator for one part of a simulation, e.g. one block of duels.
+    The generator is a random.Random seeded by numpy SeedSequence(seed, spawn_key), so each part has its own
+    independent stream, and the same part always gets the same stream no matter how the simulation is split.
+    If seed is None, the global random module is returned.
+
+    :param seed: the seed of the whole simulation, or None
+    :param spawn_key: the integers locating this part in the simulation, e.g. (SCALAR_BLOCK_STREAM, block index)
+    :return: random.Random object (or the random module), with randint(), uniform(), choice() and so on
+    >>> simulation_rng(7, SCALAR_BLOCK_STREAM, 3).random() == simulation_rng(7, SCALAR_BLOCK_STREAM, 3).random()
+    True
+    >>> simulation_rng(7, SCALAR_BLOCK_STREAM, 3).random() == simulation_rng(7, SCALAR_BLOCK_STREAM, 4).random()
+    False
+    >>> simulation_rng(None, SCALAR_BLOCK_STREAM, 3) is random
+    True
+    """
+    if seed is None:
+        return random
+    state = np.random.SeedSequence(seed, spawn_key=spawn_key).generate_state(4)
+    return random.Random(int.from_bytes(state.tobytes(), "little"))
+
+
+class RandomBuffer:
+    """
+    A random generator which draws uniform numbers from numpy in large blocks and hands them out one by one.
+    It provides random(), randint(), uniform() and choice() like the random module, so it can be passed as rng
+    to attack(), duel() and so on, while each call only costs a list indexing instead of a full random module call.
+    randint(a, b) keeps the same possibilities, e.g. randint(0, 100) <= 30 is still 31 / 101.
+    """
+
+    def __init__(self, generator=None, block_size=4096):
+        """
+        :param generator: numpy Generator to draw the blocks from, a new unseeded one if not given
+        :param block_size: the largest amount of numbers drawn at once, the first block is smaller and grows
+                           so a short duel does not draw too many numbers
+        """
+        self.generator = np.random.default_rng() if generator is None else generator
+        self.block_size = block_size
+        self.next_block_size = min(256, block_size)
+        self.block = []
+        self.position = 0
+
+    def refill(self) -> None:
+        """
+        Draw the next block of uniform numbers.
+
+        :return: None
+        """
+        self.block = self.generator.random(self.next_block_size).tolist()
+        self.position = 0
+        self.next_block_size = min(self.next_block_size * 2, self.block_size)
+
+    def random(self) -> float:
+        """
+        :return: a uniform number in [0, 1)
+        >>> buffer = RandomBuffer(np.random.default_rng(0), block_size=8)
+        >>> numbers = [buffer.random() for _ in range(20)]
+        >>> all(0 <= number < 1 for number in numbers), len(set(numbers))
+        (True, 20)
+        """
+        if self.position == len(self.block):
+            self.refill()
+        value = self.block[self.position]
+        self.position += 1
+        return value
+
+    def randint(self, a: int, b: int) -> int:
+        """
+        :return: a random integer in [a, b], both included
+        >>> buffer = RandomBuffer(np.random.default_rng(0))
+        >>> rolls = [buffer.randint(1, 100) for _ in range(100000)]
+        >>> min(rolls), max(rolls)
+        (1, 100)
+        >>> 0.19 < sum(roll <= 20 for roll in rolls) / len(rolls) < 0.21
+        True
+        """
+        # same as random(), repeated here since randint() is called the most in attack()
+        # int(value * n) is always less than n for a double value in [0, 1)
+        if self.position == len(self.block):
+            self.refill()
+        value = self.block[self.position]
+        self.position += 1
+        return a + int(value * (b - a + 1))
+
+    def take(self, amount: int) -> list:
+        """
+        Hand out several uniform numbers at once.
+
+        :param amount: how many numbers
+        :return: list of uniform numbers in [0, 1)
+        >>> buffer = RandomBuffer(np.random.default_rng(0), block_size=8)
+        >>> rolls = buffer.take(5) + buffer.take(5) + buffer.take(20)
+        >>> len(rolls), len(set(rolls))
+        (30, 30)
+        """
+        if self.position + amount > len(self.block):
+            leftover = self.block[self.position:]
+            self.refill()
+            self.block = leftover + self.block
+            if len(self.block) < amount:
+                self.block += self.generator.random(amount - len(self.block)).tolist()
+        rolls = self.block[self.position:self.position + amount]
+        self.position += amount
+        return rolls
+
+    def uniform(self, a: float, b: float) -> float:
+        """
+        :return: a random number between a and b
+        """
+        return a + (b - a) * self.random()
+
+    def choice(self, seq):
+        """
+        :return: a random element of a non-empty sequence
+        """
+        return seq[int(self.random() * len(seq))]
+
+
+def draw_rolls(rng, amount: int) -> list:
+    """
+    Draw several uniform numbers in [0, 1) from rng, at once if rng is a RandomBuffer.
+
+    :param rng: the random generator, random module, random.Random or RandomBuffer
+    :param amount: how many numbers
+    :return: list of uniform numbers
+    >>> len(draw_rolls(random, 3)), len(draw_rolls(RandomBuffer(), 3))
+    (3, 3)
+    """
+    if isinstance(rng, RandomBuffer):
+        return rng.take(amount)
+    return [rng.random() for _ in range(amount)]
+
+
+def simulation_generator(seed, *spawn_key) -> np.random.Generator:
+    """
+    Create the numpy random generator for one part of a simulation, e.g. one block of batch duels.
+    Same as simulation_rng(), but returns numpy Generator, a new unseeded one if seed is None.
+
+    :param seed: the seed of the whole simulation, or None
+    :param spawn_key: the integers locating this part in the simulation, e.g. (BATCH_BLOCK_STREAM, block index)
+    :return: numpy Generator
+    >>> simulation_generator(7, BATCH_BLOCK_STREAM, 0).integers(0, 1000, 3).tolist() \\
+    ...     == simulation_generator(7, BATCH_BLOCK_STREAM, 0).integers(0, 1000, 3).tolist()
+    True
+    """
+    if seed is None:
+        return np.random.default_rng()
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=spawn_key))
+
+
+def split_loop_times(loop_times: int, amount_of_chunks: int, unit=1) -> list:
+    """
+    Split the duels of a simulation into chunks, the chunks only start at the multiples of unit.
+
+    :param loop_times: how many duels in total
+    :param amount_of_chunks: how many chunks at most
+    :param unit: the chunk boundaries are aligned to this amount of duels
+    :return: list of (index of the first duel, amount of duels) for each chunk
+    >>> split_loop_times(10, 3)
+    [(0, 4), (4, 3), (7, 3)]
+    >>> split_loop_times(2500, 4, 512)
+    [(0, 1024), (1024, 512), (1536, 512), (2048, 452)]
+    """
+    amount_of_units = -(-loop_times // unit)
+    amount_of_chunks = max(1, min(amount_of_chunks, amount_of_units))
+    chunks = []
+    first_unit = 0
+    for i in range(amount_of_chunks):
+        units = amount_of_units // amount_of_chunks + (1 if i < amount_of_units % amount_of_chunks else 0)
+        first_duel_index = first_unit * unit
+        chunks.append((first_duel_index, min(loop_times, (first_unit + units) * unit) - first_duel_index))
+        first_unit += units
+    return chunks
+
+
+def show_skill_list(hero_1: Hero, hero_2: Hero) -> None:
+    """
+    Show the skills of the two heroes of a duel.
+
+    :param hero_1: the first hero
+    :param hero_2: the second hero
+    :return: None
+    """
+    print("\nSkill List:")
+    print(
+        "{}: {}, main skills: {}".format(hero_1.name, hero_1.skill_list.keys(), hero_1.main_skill_list.keys()))
+    print(
+        "{}: {}, main skills: {}".format(hero_2.name, hero_2.skill_list.keys(), hero_2.main_skill_list.keys()))
+
+
+def simulate_counters(loop_times: int, hero_level: int,
+                      hero_1_model: str, hero_2_model: str, hero_1_name: str, hero_2_name: str,
+                      number_of_skill_books: int, number_of_main_skills: int, ultimate_skill: bool, items_dict: dict,
+                      show_skill_list_each_time=False, show_log_or_not=False, show_all_the_details=False,
+                      show_regenerate_rs=False, engine="scalar", seed=None, first_duel_index=0,
+                      outcome_cache_size=0, outcome_cache_min_duels=20,
+                      control_variate_samples=0, record_path=None, tracer=None, telemetry=None) -> DuelCounters:
+    """
+    Run the duels of the monte carlo simulation and count the skills, without showing the summary.
+    The parameters are the same as aggregate_analyze(). This is also the job for each worker process.
+    The duels are run in blocks of SIMULATION_BLOCK_SIZE, each block has its own random streams. With a seed,
+    a block always gets the same streams, so the chunks of a simulation can be run anywhere and give the same
+    counters, as long as the chunks start at the multiples of SIMULATION_BLOCK_SIZE.
+    The outcome cache lives in one chunk, so with the cache the counters also depend on how the chunks are split.
+    The batch engine runs a whole block at once, so its outcomes only reach the cache at the end of each block.
+    With control_variate_samples, that many more pairs of loadouts are rolled for each dueled pair without
+    running a duel, to estimate the mean of the control variate, see DuelCounters.variance_reduction().
+    With record_path, one row for each duel is written to the directory, see DuelRecorder and DuelRecords.
+    With tracer, the events of the sampled duels are recorded, see DuelTracer; only the scalar engine is traced.
+    With telemetry, the skills triggered in the duels are counted, see DuelTelemetry; also only the scalar engine.
+
+    :param first_duel_index: the index of the first duel of this chunk in the whole simulation
+    :return: the counters of this simulation
+    >>> counters = simulate_counters(20, 6, "MonkeyKing", "MonkeyKing", "", "", 20, 0, False, {}, engine="batch")
+    >>> counters.loop_times, counters.total_occurrence_main_skill
+    (20, {'JinGu Mastery': 40})
+    >>> arguments = (6, "MonkeyKing", "BountyHunter", "", "", 20, 0, False, {})
+    >>> whole = simulate_counters(SIMULATION_BLOCK_SIZE + 30, *arguments, seed=3)
+    >>> first = simulate_counters(SIMULATION_BLOCK_SIZE, *arguments, seed=3)
+    >>> second = simulate_counters(30, *arguments, seed=3, first_duel_index=SIMULATION_BLOCK_SIZE)
+    >>> first.merge(second) == whole
+    True
+    >>> arguments = (6, "MonkeyKing", "BountyHunter", "", "", 0, 2, False, {})
+    >>> counters = simulate_counters(300, *arguments, seed=3, outcome_cache_size=100, outcome_cache_min_duels=5)
+    >>> counters.loop_times, counters.cache_hits + counters.cache_misses, counters.cache_hits > 150
+    (300, 300, True)
+    >>> counters = simulate_counters(40, *arguments, seed=3, control_variate_samples=2)
+    >>> counters.loop_times, counters.duel_seconds > 0, counters.control_seconds > 0
+    (40, True, True)
+    >>> sorted(counters.variance_reduction(main_skill=True)) == sorted(counters.total_occurrence_main_skill_only)
+    True
+    >>> import tempfile
+    >>> path = tempfile.mkdtemp()
+    >>> counters = simulate_counters(100, *arguments, engine="batch", seed=3, record_path=path)
+    >>> records = DuelRecords(path)
+    >>> len(records), records.counters() == counters
+    (100, True)
+    >>> tracer = DuelTracer(sample_every=10)
+    >>> counters = simulate_counters(30, *arguments, seed=3, tracer=tracer)
+    >>> tracer.amount_of_duels, sorted(set(tracer.events()["duel"].tolist()))
+    (30, [0, 10, 20])
+    >>> int(sum(tracer.events()["kind"] == EVENT_DEATH))
+    3
+    >>> telemetry = DuelTelemetry()
+    >>> counters = simulate_counters(30, *arguments, seed=3, telemetry=telemetry)
+    >>> telemetry.amount_of_duels, telemetry.per_duel(False)["Attack"] > 0
+    (30, True)
+    """
+    if (tracer is not None or telemetry is not None) and engine != "scalar":
+        raise ValueError("only the scalar engine can be traced or counted by telemetry")
+    with_statistics = control_variate_samples > 0
+    recorder = None
+    if record_path is not None:
+        recorder = DuelRecorder(record_path, first_duel_index,
+                                {"hero_level": hero_level, "hero_1_model": hero_1_model, "hero_2_model": hero_2_model,
+                                 "number_of_skill_books": number_of_skill_books,
+                                 "number_of_main_skills": number_of_main_skills, "seed": seed})
+    counters = DuelCounters()
+    outcome_cache = DuelOutcomeCache(outcome_cache_size, outcome_cache_min_duels) if outcome_cache_size else None
+    duel_index = first_duel_index
+    last_duel_index = first_duel_index + loop_times
+    while duel_index < last_duel_index:
+        # each block of duels has its own random streams, no matter which chunk it is run in
+        block = duel_index // SIMULATION_BLOCK_SIZE
+        block_end = min(last_duel_index, (block + 1) * SIMULATION_BLOCK_SIZE)
+        block_start_time = time.perf_counter()
+        control_seconds = 0.0
+        amount_of_pairs = block_end - duel_index
+        amount_of_loadouts = amount_of_pairs * (1 + control_variate_samples)
+        if engine == "batch":
+            generator = simulation_generator(seed, BATCH_BLOCK_STREAM, block, 0)
+            rng = simulation_rng(seed, BATCH_BLOCK_STREAM, block, 1)
+            # roll the skill books of all the heroes at once, same as rolling randint(0, 10) one by one
+            skill_book_lists = generator.multinomial(number_of_skill_books, [1 / 11] * 11,
+                                                     size=(amount_of_loadouts, 2)).tolist()
+        else:
+            rng = RandomBuffer(simulation_generator(seed, SCALAR_BLOCK_STREAM, block))
+            skill_book_lists = [(None, None)] * amount_of_loadouts
+
+        # (the two heroes, the time when the duel is over, loadouts of the two heroes,
+        #  winner sampled from the outcome cache or None if the duel is run, duel_advantage() of the pair)
+        hero_pairs = []
+        for skill_book_list in skill_book_lists[:amount_of_pairs]:
+            hero_1, hero_2 = build_hero_pair(hero_level, hero_1_model, hero_2_model, hero_1_name, hero_2_name,
+                                             number_of_skill_books, number_of_main_skills, ultimate_skill,
+                                             items_dict, skill_book_list, rng)
+            advantage = 0.0
+            if control_variate_samples:
+                control_start_time = time.perf_counter()
+                advantage = duel_advantage(hero_1, hero_2)
+                control_seconds += time.perf_counter() - control_start_time
+            pair_times = []
+            loadouts = None
+            hero_1_wins = None
+            if outcome_cache is not None:
+                # the loadouts must be taken before the duel, e.g. Jingu Mastery changes the life steal rate
+                loadouts = (loadout_key(hero_1), loadout_key(hero_2))
+                hero_1_wins = outcome_cache.sample(loadouts, rng)
+            if engine == "scalar" and hero_1_wins is None:
+                duel(hero_1, hero_2, show_log_or_not, show_all_the_details, show_regenerate_rs, rng, pair_times,
+                     tracer, telemetry)
+                if outcome_cache is not None:
+                    outcome_cache.record(loadouts, hero_2.status.array[CURRENT_HP] <= 0)
+            hero_pairs.append((hero_1, hero_2, pair_times, loadouts, hero_1_wins, advantage))
+
+        if engine == "batch":
+            run_pairs = [(hero_1, hero_2, pair_times) for hero_1, hero_2, pair_times, _, hero_1_wins, _ in hero_pairs
+                         if hero_1_wins is None]
+            duel_times = []
+            batch_duel([hero_1 for hero_1, _, _ in run_pairs], [hero_2 for _, hero_2, _ in run_pairs],
+                       generator, duel_times)
+            for (_, _, pair_times), duel_time in zip(run_pairs, duel_times):
+                pair_times.append(duel_time)
+
+        for hero_1, hero_2, pair_times, loadouts, hero_1_wins, advantage in hero_pairs:
+            if show_skill_list_each_time:
+                show_skill_list(hero_1, hero_2)
+            if engine == "batch" and outcome_cache is not None and hero_1_wins is None:
+                outcome_cache.record(loadouts, hero_2.status.array[CURRENT_HP] <= 0)
+            counters.record(hero_1, hero_2, hero_1_wins)
+            if recorder is not None:
+                if hero_1_wins is None:
+                    recorder.add(hero_1, hero_2, hero_2.status.array[CURRENT_HP] <= 0, items_dict, pair_times[0])
+                else:
+                    recorder.add(hero_1, hero_2, hero_1_wins, items_dict)
+            if with_statistics:
+                if hero_1_wins is None:
+                    hero_1_score = float(hero_2.status.array[CURRENT_HP] <= 0)
+                else:
+                    hero_1_score = float(hero_1_wins)
+                counters.record_statistics(hero_1, hero_2, hero_1_score, advantage)
+
+        # the loadouts only for the mean of the control variate, no duel is run
+        control_start_time = time.perf_counter()
+        for skill_book_list in skill_book_lists[amount_of_pairs:]:
+            hero_1, hero_2 = build_hero_pair(hero_level, hero_1_model, hero_2_model, hero_1_name, hero_2_name,
+                                             number_of_skill_books, number_of_main_skills, ultimate_skill,
+                                             items_dict, skill_book_list, rng)
+            counters.record_control(hero_1, hero_2, duel_advantage(hero_1, hero_2))
+        block_end_time = time.perf_counter()
+        control_seconds += block_end_time - control_start_time
+        counters.control_seconds += control_seconds
+        counters.duel_seconds += block_end_time - block_start_time - control_seconds
+        duel_index = block_end
+    if outcome_cache is not None:
+        counters.cache_hits = outcome_cache.hits
+        counters.cache_misses = outcome_cache.misses
+        counters.cache_evictions = outcome_cache.evictions
+    if recorder is not None:
+        recorder.flush()
+    return counters.tally()
+
+
+def simulate_adaptive(loop_times: int, simulation_arguments: tuple, workers=1, main_skill=False,
+                      target_half_width=None, time_budget=None, z=1.96,
+                      outcome_cache_size=0, outcome_cache_min_duels=20,
+                      control_variate_samples=0, checkpoint_path=None, checkpoint_duels=None,
+                      checkpoint_seconds=None, resume=False, record_path=None, tracer=None,
+                      telemetry=None) -> DuelCounters:
+    """
+    Run the duels in rounds until the winning rate of every skill is known well enough, the time is up,
+    or loop_times duels are spent. Each round runs one block of SIMULATION_BLOCK_SIZE duels for each worker,
+    so with a seed the duels are the same as the first duels of simulate_counters(loop_times, ...).
+    The counters can be saved to a checkpoint file between the rounds, see save_checkpoint(). Since every block
+    has its own random streams, the counters and the amount of duels are all the state a seeded simulation needs,
+    a resumed simulation gives the same counters as if it was never stopped.
+
+    :param loop_times: the most duels to run
+    :param simulation_arguments: the arguments of simulate_counters() from hero_level to seed
+    :param workers: how many processes run the duels, 1 means running in the current process
+    :param main_skill: False checks the winning rates of the sub skills, True checks the main skills
+    :param target_half_width: stop when the half width of every interval is not above it, e.g. 0.01; None means
+                              only the time budget is checked
+    :param time_budget: stop when this many seconds are spent, None means no limit
+    :param z: the z-score of the confidence level, 1.96 for 95%
+    :param outcome_cache_size: the size of the outcome cache of each round, see simulate_counters();
+                               every round starts with an empty cache, so the counters are not the same as
+                               one simulate_counters() run with the cache, and it can not be used with a checkpoint
+    :param checkpoint_path: the file to save the checkpoints, None means no checkpoint
+    :param checkpoint_duels: save a checkpoint after at least this many duels since the last one
+    :param checkpoint_seconds: save a checkpoint after at least this many seconds since the last one;
+                               if both are None, a checkpoint is saved after every round
+    :param resume: continue from the checkpoint file if it exists
+    :param record_path: the directory to write the duel records, see DuelRecorder
+    :param tracer: the DuelTracer of the duels, only with workers=1
+    :param telemetry: the DuelTelemetry of the duels, only with workers=1
+    :return: the counters of the duels run
+    >>> arguments = (6, "MonkeyKing", "BountyHunter", "", "", 20, 0, False, {}, False, False, False, False,
+    ...              "batch", 3)
+    >>> counters = simulate_adaptive(20000, arguments, target_half_width=0.2)
+    >>> counters.loop_times
+    512
+    >>> counters.loop_times < simulate_adaptive(20000, arguments, target_half_width=0.05).loop_times <= 20000
+    True
+    >>> import tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), "checkpoint.json")
+    >>> stopped = simulate_adaptive(1024, arguments, checkpoint_path=path)
+    >>> resumed = simulate_adaptive(1800, arguments, checkpoint_path=path, resume=True)
+    >>> resumed == simulate_counters(1800, *arguments)
+    True
+    >>> simulate_adaptive(1024, arguments, outcome_cache_size=64, checkpoint_path=path)
+    Traceback (most recent call last):
+    ...
+    ValueError: the outcome cache is not saved in a checkpoint, use outcome_cache_size=0 with checkpoint_path
+    """
+    if (tracer is not None or telemetry is not None) and workers > 1:
+        raise ValueError("the duels can only be traced or counted by telemetry with workers=1")
+    if outcome_cache_size and checkpoint_path is not None:
+        raise ValueError("the outcome cache is not saved in a checkpoint, "
+                         "use outcome_cache_size=0 with checkpoint_path")
+    start_time = time.perf_counter()
+    options = (outcome_cache_size, outcome_cache_min_duels, control_variate_samples)
+    counters = DuelCounters()
+    if resume and checkpoint_path is not None and os.path.exists(checkpoint_path):
+        counters = load_checkpoint(checkpoint_path, simulation_arguments, options)
+    last_checkpoint_time, last_checkpoint_duels = time.perf_counter(), counters.loop_times
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        while counters.loop_times < loop_times:
+            first_duel_index = counters.loop_times
+            round_size = min(loop_times - first_duel_index, SIMULATION_BLOCK_SIZE * workers)
+            if executor is None:
+                counters.merge(simulate_counters(round_size, *simulation_arguments, first_duel_index,
+                                                 outcome_cache_size, outcome_cache_min_duels,
+                                                 control_variate_samples, record_path, tracer, telemetry))
+            else:
+                futures = [executor.submit(simulate_counters, chunk_size, *simulation_arguments,
+                                           first_duel_index + chunk_offset, outcome_cache_size, outcome_cache_min_duels,
+                                           control_variate_samples, record_path)
+                           for chunk_offset, chunk_size in split_loop_times(round_size, workers,
+                                                                            SIMULATION_BLOCK_SIZE)]
+                for future in futures:
+                    counters.merge(future.result())
+
+            if checkpoint_path is not None and (
+                    (checkpoint_duels is None and checkpoint_seconds is None)
+                    or (checkpoint_duels is not None
+                        and counters.loop_times - last_checkpoint_duels >= checkpoint_duels)
+                    or (checkpoint_seconds is not None
+                        and time.perf_counter() - last_checkpoint_time >= checkpoint_seconds)):
+                save_checkpoint(checkpoint_path, simulation_arguments, options, counters)
+                last_checkpoint_time, last_checkpoint_duels = time.perf_counter(), counters.loop_times
+
+            if target_half_width is not None and all(
+                    (high - low) / 2 <= target_half_width
+                    for low, high in counters.winning_rate_intervals(main_skill, z).values()):
+                break
+            if time_budget is not None and time.perf_counter() - start_time >= time_budget:
+                break
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    if checkpoint_path is not None and counters.loop_times != last_checkpoint_duels:
+        save_checkpoint(checkpoint_path, simulation_arguments, options, counters)
+    return counters
+
+
+def save_checkpoint(path: str, simulation_arguments: tuple, options: tuple, counters: DuelCounters) -> None:
+    """
+    Save the counters of a simulation to a json file. The file is replaced at once,
+    so a crash while saving leaves the last checkpoint as it was.
+
+    :param path: the checkpoint file
+    :param simulation_arguments: the arguments of simulate_counters() from hero_level to seed
+    :param options: the other options of the simulation which change the counters, e.g. outcome_cache_size
+    :param counters: the counters so far
+    :return: None
+    """
+    checkpoint = {"simulation_arguments": simulation_arguments, "options": options,
+                  "counters": asdict(counters.tally())}
+    temporary_path = "{}.tmp".format(path)
+    with open(temporary_path, "w") as checkpoint_file:
+        json.dump(checkpoint, checkpoint_file)
+    os.replace(temporary_path, path)
+
+
+def load_checkpoint(path: str, simulation_arguments: tuple, options: tuple) -> DuelCounters:
+    """
+    Load the counters saved by save_checkpoint(), the simulation should have the same arguments.
+
+    :param path: the checkpoint file
+    :param simulation_arguments: the arguments of simulate_counters() from hero_level to seed
+    :param options: the other options of the simulation which change the counters, e.g. outcome_cache_size
+    :return: the counters saved
+    >>> import tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), "checkpoint.json")
+    >>> save_checkpoint(path, (6, "MonkeyKing"), (0,), DuelCounters(total_occurrence={"Evasion": 3}, loop_times=2))
+    >>> load_checkpoint(path, (6, "MonkeyKing"), (0,)).total_occurrence
+    {'Evasion': 3}
+    >>> load_checkpoint(path, (7, "MonkeyKing"), (0,))
+    Traceback (most recent call last):
+    ...
+    ValueError: The checkpoint is for another simulation (6, 'MonkeyKing') (0,)
+    """
+    with open(path) as checkpoint_file:
+        checkpoint = json.load(checkpoint_file)
+    # json turns tuples into lists, compare them in the same form
+    if (checkpoint["simulation_arguments"] != json.loads(json.dumps(simulation_arguments))
+            or checkpoint["options"] != json.loads(json.dumps(options))):
+        raise ValueError('The checkpoint is for another simulation {} {}'
+                         .format(tuple(checkpoint["simulation_arguments"]), tuple(checkpoint["options"])))
+    return DuelCounters(**checkpoint["counters"])
+
+
+def build_hero_pair(hero_level: int, hero_1_model: str, hero_2_model: str, hero_1_name: str, hero_2_name: str,
+                    number_of_skill_books: int, number_of_main_skills: int, ultimate_skill: bool,
+                    items_dict: dict, skill_book_lists=(None, None), rng=random) -> (Hero, Hero):
+    """
+    Creating two heroes for a duel from the templates with the items equipped, then roll the skill books and
+    main skills.
+
+    :param hero_level: the hero level, from 1 to 30
+    :param hero_1_model: the model name for the first hero
+    :param hero_2_model: the model name for the second hero
+    :param hero_1_name: the nickname for the first hero
+    :param hero_2_name: the nickname for the second hero
+    :param number_of_skill_books: how many skill books the hero will get
+    :param number_of_main_skills: how many main skills the hero will get
+    :param ultimate_skill: whether the hero will learn an ultimate skill or not
+    :param items_dict: the items that the hero will equip
+    :param skill_book_lists: the skill books already rolled for the two heroes, see Hero.get_random_skill_book()
+    :param rng: the random generator, the global random module by default
+    :return: (the first hero, the second hero)
+    >>> hero_1, hero_2 = build_hero_pair(15, "MonkeyKing", "BountyHunter", "", "", 60, 1, False, {"MKB": 1})
+    >>> hero_1.name, hero_2.name
+    ('Monkey King', 'Bounty Hunter')
+    >>> len(hero_2.skill_list.keys()), len(hero_2.main_skill_list.keys())
+    (4, 1)
+    >>> hero_1.attack_attachment["MKB"]
+    1
+    """
+    # the setup before any randomness is the same for every duel
+    hero_1 = hero_template(hero_1_model, hero_level, hero_1_name, items_dict).clone()
+    hero_2 = hero_template(hero_2_model, hero_level, hero_2_name, items_dict).clone()
+
+    hero_1.get_random_skill_book(number_of_skill_books, skill_book_lists[0], rng)
+    hero_2.get_random_skill_book(number_of_skill_books, skill_book_lists[1], rng)
+
+    if number_of_main_skills != 0:
+        hero_1.roll_main_skill(number_of_main_skills, ultimate_skill, rng)
+        hero_2.roll_main_skill(number_of_main_skills, ultimate_skill, rng)
+    return hero_1, hero_2
+
+
 def aggregate_analyze(loop_times: int, hero_level: int,
                       hero_1_model: str, hero_2_model: str, hero_1_name: str, hero_2_name: str,
                       number_of_skill_books: int, number_of_main_skills: int, ultimate_skill: bool, items_dict: dict,
                       show_loop_aggregate_result=True, show_skill_list_each_time=False, show_log_or_not=False,
-                      show_all_the_details=False, show_regenerate_rs=False, sub_or_main=False) -> dict:
+                      show_all_the_details=False, show_regenerate_rs=False, sub_or_main=False,
+                      engine="scalar", workers=1, seed=None, outcome_cache_size=0, outcome_cache_min_duels=20,
+                      target_half_width=None, time_budget=None, confidence_z=1.96,
+                      control_variate_samples=0, checkpoint_path=None, checkpoint_duels=None, checkpoint_seconds=None,
+                      resume=False, record_path=None, tracer=None, telemetry=None, show_interactions=False,
+                      duel_counters=None) -> dict:
     """
     This function seals all the progress for the monte carlo simulation.
 
-    :param loop_times: how many times this simulation will repeat
+    :param loop_times: how many times this simulation will repeat, the most duels if it stops adaptively
     :param hero_level: the hero level, from 1 to 30
     :param hero_1_model: the model name for the first hero
     :param hero_2_model: the model name for the second hero
@@ -1778,76 +4744,84 @@ def aggregate_analyze(loop_times: int, hero_level: int,
     :param show_all_the_details: for each attack, show how the damage is composed of or not
     :param show_regenerate_rs: show log for hero's regeneration and curse damage or not
     :param sub_or_main: False return winning rate of sub skills, True return winning rate of main skills
+    :param engine: "scalar" runs duel() one by one,
+                   "batch" runs all the duels together with batch_duel() (logs are not supported)
+    :param workers: how many processes run the duels, 1 means running in the current process
+    :param seed: the seed of the simulation, the same seed gives the same result with any amount of workers;
+                 None means using the global random module and a new numpy generator
+    :param outcome_cache_size: how many pairs of loadouts the outcome cache keeps, 0 means no cache;
+                               a pair dueled outcome_cache_min_duels times is not run again,
+                               its winner is sampled from the recorded winning rate, see DuelOutcomeCache;
+                               with target_half_width or time_budget every round of duels starts with an empty
+                               cache, so the result is not the same as without them; not allowed with checkpoint_path
+    :param outcome_cache_min_duels: how many duels of a pair are run before sampling from the cache
+    :param target_half_width: run the duels in rounds and stop when the confidence interval of every winning rate
+                              (sub skills, or main skills if sub_or_main) is not wider than this on each side,
+                              e.g. 0.01 for +-1%, see simulate_adaptive(); None means running all the loop_times
+    :param time_budget: run the duels in rounds and stop after this many seconds, None means no limit
+    :param confidence_z: the z-score of the confidence intervals, 1.96 for 95%
+    :param control_variate_samples: how many more pairs of loadouts are rolled (without a duel) for each dueled pair
+                                    to correct the winning rates by the control variate duel_advantage(),
+                                    0 means no correction; the corrected winning rates are shown in the variance
+                                    report, the returned ones are the same as the summary table
+    :param checkpoint_path: save the counters to this file between the rounds of duels, see simulate_adaptive()
+    :param checkpoint_duels: save a checkpoint after at least this many duels since the last one
+    :param checkpoint_seconds: save a checkpoint after at least this many seconds since the last one
+    :param resume: continue from the checkpoint file if it exists, with a seed the result is the same as
+                   a simulation which was never stopped
+    :param record_path: write one row for each duel to this directory, read them later with DuelRecords
+    :param tracer: record the events of the duels to this DuelTracer, e.g. DuelTracer(sample_every=1000),
+                   only with the scalar engine and workers=1; show them with tracer.format() or tracer.dump()
+    :param telemetry: count how often each skill triggered and its damage or healing to this DuelTelemetry,
+                      only with the scalar engine and workers=1; the averages of a duel are shown in the summary
+    :param show_interactions: also show the winning rates of the pairs of skills (sub skills, or main skills if
+                              sub_or_main) in the summary, see DuelCounters.interaction_matrix()
+    :param duel_counters: add the counters of the duels to this DuelCounters, e.g. to read how many duels were
+                          run when the simulation stops adaptively
     :return: Winning rate of skills
     """
-
-    winning_count_only = {}
-    winning_count_main_skill_only = {}
-    total_occurrence = {}
-    total_occurrence_main_skill = {}
-    total_occurrence_only = {}
-    total_occurrence_main_skill_only = {}
+    if engine not in ("scalar", "batch"):
+        raise ValueError('No such engine {}, should be "scalar" or "batch"'.format(engine))
+    if workers < 1:
+        raise ValueError("workers should be at least 1")
+    if (tracer is not None or telemetry is not None) and (engine != "scalar" or workers > 1):
+        raise ValueError("the duels can only be traced or counted by telemetry with the scalar engine and workers=1")
+
+    counters = DuelCounters()
     sub_winning_rate_dict = {}
 
-    for i in range(0, loop_times):
-        hero_1 = hero_initialize(hero_1_model, hero_level, hero_1_name)
-        hero_2 = hero_initialize(hero_2_model, hero_level, hero_2_name)
-
-        for item in items_dict.keys():
-            if item == "MKB":
-                hero_1.equip_monkey_king_bar(items_dict[item])
-                hero_2.equip_monkey_king_bar(items_dict[item])
-            elif item == "Satanic":
-                hero_1.equip_satanic(items_dict[item])
-                hero_2.equip_satanic(items_dict[item])
-            elif item == "Heart":
-                hero_1.equip_heart_of_tarrasque(items_dict[item])
-                hero_2.equip_heart_of_tarrasque(items_dict[item])
-
-        hero_1.get_random_skill_book(number_of_skill_books)
-        hero_2.get_random_skill_book(number_of_skill_books)
-
-        if number_of_main_skills != 0:
-            hero_1.roll_main_skill(number_of_main_skills, ultimate_skill)
-            hero_2.roll_main_skill(number_of_main_skills, ultimate_skill)
-
-        duel(hero_1, hero_2, show_log_or_not, show_all_the_details, show_regenerate_rs)
-
-        if show_skill_list_each_time:
-            print("\nSkill List:")
-            print(
-                "{}: {}, main skills: {}".format(hero_1.name, hero_1.skill_list.keys(), hero_1.main_skill_list.keys()))
-            print(
-                "{}: {}, main skills: {}".format(hero_2.name, hero_2.skill_list.keys(), hero_2.main_skill_list.keys()))
-
-        if hero_2.status["Current HP"] <= 0:
-            skill_list = hero_1.skill_list.keys()
-            main_skill_list = hero_1.main_skill_list.keys()
-            skill_list2 = hero_2.skill_list.keys()
-            main_skill_list2 = hero_2.main_skill_list.keys()
-        else:
-            skill_list = hero_2.skill_list.keys()
-            main_skill_list = hero_2.main_skill_list.keys()
-            skill_list2 = hero_1.skill_list.keys()
-            main_skill_list2 = hero_1.main_skill_list.keys()
-
-        total_occurrence = update_dict(total_occurrence, hero_1.skill_list)
-        total_occurrence = update_dict(total_occurrence, hero_2.skill_list)
-
-        total_occurrence_main_skill = update_dict(total_occurrence_main_skill, hero_1.main_skill_list)
-        total_occurrence_main_skill = update_dict(total_occurrence_main_skill, hero_2.main_skill_list)
-
-        total_occurrence_only = update_only_dict(total_occurrence_only, hero_1.skill_list, hero_2.skill_list)
-        total_occurrence_only = update_only_dict(total_occurrence_only, hero_2.skill_list, hero_1.skill_list)
-
-        total_occurrence_main_skill_only = update_only_dict(total_occurrence_main_skill_only,
-                                                            hero_1.main_skill_list, hero_2.main_skill_list)
-        total_occurrence_main_skill_only = update_only_dict(total_occurrence_main_skill_only,
-                                                            hero_2.main_skill_list, hero_1.main_skill_list)
-
-        winning_count_only = update_dict_by_list_only(winning_count_only, skill_list, skill_list2)
-        winning_count_main_skill_only = update_dict_by_list_only(winning_count_main_skill_only,
-                                                                 main_skill_list, main_skill_list2)
+    simulation_arguments = (hero_level, hero_1_model, hero_2_model, hero_1_name, hero_2_name,
+                            number_of_skill_books, number_of_main_skills, ultimate_skill, items_dict,
+                            show_skill_list_each_time, show_log_or_not, show_all_the_details, show_regenerate_rs,
+                            engine, seed)
+    adaptive = target_half_width is not None or time_budget is not None
+    if adaptive or checkpoint_path is not None:
+        counters = simulate_adaptive(loop_times, simulation_arguments, workers, sub_or_main, target_half_width,
+                                     time_budget, confidence_z, outcome_cache_size, outcome_cache_min_duels,
+                                     control_variate_samples, checkpoint_path, checkpoint_duels,
+                                     checkpoint_seconds, resume, record_path, tracer, telemetry)
+    elif workers > 1 and loop_times > 1:
+        # each worker runs a chunk of duels and only sends back its counters
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(simulate_counters, chunk_size, *simulation_arguments, first_duel_index,
+                                       outcome_cache_size, outcome_cache_min_duels,
+                                       control_variate_samples, record_path)
+                       for first_duel_index, chunk_size in split_loop_times(loop_times, workers * 4,
+                                                                                  SIMULATION_BLOCK_SIZE)]
+            for future in futures:
+                counters.merge(future.result())
+    else:
+        counters = simulate_counters(loop_times, *simulation_arguments, 0, outcome_cache_size, outcome_cache_min_duels,
+                                     control_variate_samples, record_path, tracer, telemetry)
+    if duel_counters is not None:
+        duel_counters.merge(counters)
+
+    winning_count_only = counters.winning_count_only
+    winning_count_main_skill_only = counters.winning_count_main_skill_only
+    total_occurrence = counters.total_occurrence
+    total_occurrence_main_skill = counters.total_occurrence_main_skill
+    total_occurrence_only = counters.total_occurrence_only
+    total_occurrence_main_skill_only = counters.total_occurrence_main_skill_only
 
     if show_loop_aggregate_result:
         winning_count_only = dict(sorted(winning_count_only.items(), key=lambda w: (w[1], w[0])))
@@ -1857,13 +4831,36 @@ def aggregate_analyze(loop_times: int, hero_level: int,
         print("\n{}".format(attention_str * 3))
 
         print("Loop Times {}, Hero Level {}, Amount of Skill Books {}"
-              .format(loop_times, hero_level, number_of_skill_books))
-
+              .format(counters.loop_times, hero_level, number_of_skill_books))
+        if adaptive:
+            print("Duels Spent: {} of at most {}".format(counters.loop_times, loop_times))
+        if outcome_cache_size:
+            print("Outcome Cache: {} hits, {} misses, {} evictions"
+                  .format(counters.cache_hits, counters.cache_misses, counters.cache_evictions))
+
+        sub_intervals, main_intervals = None, None
+        if adaptive:
+            sub_intervals = counters.winning_rate_intervals(False, confidence_z)
+            main_intervals = counters.winning_rate_intervals(True, confidence_z)
         sub_winning_rate_dict = show_dict_report("Sub Skills", winning_count_only,
-                                                 total_occurrence_only, loop_times, total_occurrence)
+                                                 total_occurrence_only, counters.loop_times, total_occurrence,
+                                                 sub_intervals)
 
         main_winning_rate_dict = show_dict_report("Main Skills", winning_count_main_skill_only,
-                         total_occurrence_main_skill_only, loop_times, total_occurrence_main_skill)
+                         total_occurrence_main_skill_only, counters.loop_times, total_occurrence_main_skill,
+                         main_intervals)
+        if telemetry is not None:
+            show_telemetry_report("Skill Telemetry (Average of a Duel)", telemetry)
+        if show_interactions:
+            skill_names = MAIN_SKILL_NAMES if sub_or_main else SUB_SKILL_NAMES
+            show_interaction_report("Winning Rate with Both Skills", counters, False, skill_names)
+            show_interaction_report("Winning Rate against the Skill of the Opponent", counters, True, skill_names)
+
+        if control_variate_samples:
+            sub_reductions = counters.variance_reduction(False)
+            main_reductions = counters.variance_reduction(True)
+            show_variance_report("Sub Skills Variance Reduction", sub_reductions)
+            show_variance_report("Main Skills Variance Reduction", main_reductions)
     if sub_or_main:
         return main_winning_rate_dict
     else:
@@ -1871,29 +4868,35 @@ def aggregate_analyze(loop_times: int, hero_level: int,
 
 
 def show_dict_report(report_name: str, winner_dict: dict, total_count_dict: dict, loop_times: int,
-                     total_count_two_sides_dict: dict) -> dict:
+                     total_count_two_sides_dict: dict, intervals=None) -> dict:
     """
     This function is used to print the result of the monte carlo simulation.
 
+    :param intervals: the confidence intervals of the winning rates to show, see DuelCounters.winning_rate_intervals()
     :return: the winning rate dict
     """
     dict_for_plot = {}
     print('\n{}{}{}'.format(' ' * ((90 - len(report_name)) // 2), report_name, ' ' * ((90 - len(report_name)) // 2)))
-    print("Skill Name{}Win Fights{}Total Occurrence{}Winning Rate{}Occurrence Rate(Two sides count separately)"
+    print("Skill Name{}Win Fights{}Total Occurrence{}Winning Rate{}Occurrence Rate(Two sides count separately){}"
           .format(' ' * (25 - len('Skill Name')), ' ' * (15 - len('Win Fights')),
                   ' ' * (20 - len('Total Occurrence')),
-                  ' ' * (20 - len('Winning Rate)'))))
+                  ' ' * (20 - len('Winning Rate)')), '    Confidence Interval' if intervals else ''))
     for skill in winner_dict.keys():
         rate_winner_side = round(int(winner_dict[skill]) / total_count_dict[skill] * 100, 2)
         rate_occ_two_side_total = round(int(total_count_two_sides_dict[skill]) / (loop_times * 2) * 100, 2)
 
         dict_for_plot[skill] = rate_winner_side
-        print("{}{}{}{}{}{}{}%{}{}%"
+        interval_str = ''
+        if intervals and skill in intervals:
+            interval_str = "{}[{}%, {}%]".format(' ' * (24 - len(str(rate_occ_two_side_total))),
+                                                 round(intervals[skill][0] * 100, 2),
+                                                 round(intervals[skill][1] * 100, 2))
+        print("{}{}{}{}{}{}{}%{}{}%{}"
               .format(skill, ' ' * (25 - len(skill)),
                       winner_dict[skill], ' ' * (15 - len(str(winner_dict[skill]))),
                       total_count_dict[skill], ' ' * (20 - len(str(total_count_dict[skill]))),
                       rate_winner_side, ' ' * (18 - len(str(rate_winner_side))),
-                      rate_occ_two_side_total
+                      rate_occ_two_side_total, interval_str
                       ))
     if len(total_count_dict.keys()) == 0:
         for skill in total_count_two_sides_dict.keys():
@@ -1912,10 +4915,448 @@ def show_dict_report(report_name: str, winner_dict: dict, total_count_dict: dict
     return dict_for_plot
 
 
-def creat_plot(result1: dict, result2: dict, label1: str, label2: str) -> None:
+@dataclass
+class SweepResult:
+    """
+    The counters of every point of parameter_sweep(), as arrays labeled by axes.
+    The dimensions of the arrays are the axes in order, the last one is "skill" (sub skills, then main skills).
+    """
+    # axis name -> the values along the axis
+    axes: OrderedDict
+    # the duels a hero with the skill won against a hero without it, see DuelCounters.winning_count_only
+    winning_count: np.ndarray
+    # the duels where only one of the heroes has the skill, see DuelCounters.total_occurrence_only
+    total_occurrence_only: np.ndarray
+    # how many heroes have the skill, two sides count separately, see DuelCounters.total_occurrence
+    total_occurrence: np.ndarray
+    # the duels of each point, shape without the skill axis
+    loop_times: np.ndarray
+
+    def winning_rate(self) -> np.ndarray:
+        """
+        :return: the winning rates, from 0 to 1, nan if the skill never met a hero without it
+        """
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.total_occurrence_only > 0,
+                            self.winning_count / np.maximum(self.total_occurrence_only, 1), np.nan)
+
+    def select(self, array: np.ndarray, **labels) -> np.ndarray:
+        """
+        Pick a part of one of the arrays by the labels, e.g. select(sweep.winning_rate(), hero_level=15).
+        A labeled axis is removed, like indexing a numpy array by an integer.
+
+        :param array: one of the arrays, or the winning rates
+        :param labels: axis name -> the value along the axis
+        :return: the part of the array
+        """
+        index = []
+        for axis, values in self.axes.items():
+            if axis not in labels.keys():
+                index.append(slice(None))
+            elif labels[axis] not in values:
+                raise ValueError('No such {} {} in the sweep'.format(axis, labels[axis]))
+            else:
+                index.append(values.index(labels[axis]))
+        unknown_axes = set(labels.keys()) - set(self.axes.keys())
+        if unknown_axes:
+            raise ValueError('No such axis {}, should be one of {}'.format(sorted(unknown_axes), list(self.axes)))
+        return array[tuple(index)]
+
+    def point_result(self, main_skill=False, **labels) -> dict:
+        """
+        The winning rates of one point, the same as aggregate_analyze() returns, e.g. to compare with creat_plot().
+
+        :param main_skill: False gives the sub skills, True gives the main skills
+        :param labels: the value of every axis except "skill"
+        :return: key: skill name, value: winning rate in percent
+        """
+        rates = self.select(self.winning_rate(), **labels)
+        wins = self.select(self.winning_count, **labels)
+        if rates.ndim != 1:
+            raise ValueError("The labels should pick one point, got the shape {}".format(rates.shape))
+        skill_names = MAIN_SKILL_NAMES if main_skill else SUB_SKILL_NAMES
+        first_skill = len(SUB_SKILL_NAMES) if main_skill else 0
+        result = {skill: round(float(rates[first_skill + i]) * 100, 2) for i, skill in enumerate(skill_names)
+                  if not np.isnan(rates[first_skill + i])}
+        return dict(sorted(result.items(), key=lambda r: (wins[first_skill + skill_names.index(r[0])], r[0])))
+
+
+def parameter_sweep(loop_times: int, hero_1_model: str, hero_2_model: str, hero_levels: list,
+                    skill_book_counts: list, main_skill_counts=(0,), ultimate_skills=(False,), items_variants=({},),
+                    engine="batch", workers=1, seed=None) -> SweepResult:
+    """
+    Run the simulation of every combination of the given hero levels, amounts of skill books, amounts of main skills,
+    ultimate skills and items, and count the skills of each combination.
+    All the chunks of all the points are run by one pool of workers. The hero templates are built before the
+    workers start, so they are shared by every point with the same level and items (inherited by the worker
+    processes when they are forked). With a seed every point uses the same random streams, so the differences
+    between the points are less noisy than separate simulations.
+
+    :param loop_times: how many duels for each point
+    :param hero_1_model: the model name for the first hero
+    :param hero_2_model: the model name for the second hero
+    :param hero_levels: the hero levels, from 1 to 30
+    :param skill_book_counts: the amounts of skill books
+    :param main_skill_counts: the amounts of main skills
+    :param ultimate_skills: whether the heroes learn an ultimate skill or not
+    :param items_variants: the items_dict of the heroes, e.g. [{}, {"MKB": 1}]
+    :param engine: "scalar" or "batch", see aggregate_analyze()
+    :param workers: how many processes run the duels, 1 means running in the current process
+    :param seed: the seed of every point, None means using the global random module and a new numpy generator
+    :return: the counters of every point
+    >>> sweep = parameter_sweep(20, "MonkeyKing", "MonkeyKing", [6, 15], [20], items_variants=[{}, {"MKB": 1}],
+    ...                         seed=3)
+    >>> list(sweep.axes), sweep.winning_count.shape
+    (['hero_level', 'number_of_skill_books', 'number_of_main_skills', 'ultimate_skill', 'items_dict', 'skill'], \
+(2, 1, 1, 1, 2, 17))
+    >>> int(sweep.loop_times.sum())
+    80
+    >>> counters = simulate_counters(20, 15, "MonkeyKing", "MonkeyKing", "", "", 20, 0, False, {"MKB": 1},
+    ...                              engine="batch", seed=3)
+    >>> sweep.select(sweep.total_occurrence, hero_level=15, items_dict={"MKB": 1}, skill="Evasion").item() \\
+    ...     == counters.total_occurrence.get("Evasion", 0)
+    True
+    >>> result = sweep.point_result(hero_level=15, number_of_skill_books=20, number_of_main_skills=0,
+    ...                             ultimate_skill=False, items_dict={"MKB": 1})
+    >>> len(result) > 0, all(0 <= rate <= 100 for rate in result.values())
+    (True, True)
+    """
+    axes = OrderedDict([("hero_level", list(hero_levels)), ("number_of_skill_books", list(skill_book_counts)),
+                        ("number_of_main_skills", list(main_skill_counts)), ("ultimate_skill", list(ultimate_skills)),
+                        ("items_dict", list(items_variants))])
+    points = list(itertools.product(*axes.values()))
+    axes["skill"] = list(SUB_SKILL_NAMES + MAIN_SKILL_NAMES)
+
+    # the setup without randomness only depends on the model, level and items
+    for hero_level, _, _, _, items_dict in points:
+        hero_template(hero_1_model, hero_level, "", items_dict)
+        hero_template(hero_2_model, hero_level, "", items_dict)
+
+    # (index of the point, amount of duels, the arguments of simulate_counters(), index of the first duel)
+    jobs = []
+    for point_index, (hero_level, number_of_skill_books, number_of_main_skills, ultimate_skill,
+                      items_dict) in enumerate(points):
+        simulation_arguments = (hero_level, hero_1_model, hero_2_model, "", "", number_of_skill_books,
+                                number_of_main_skills, ultimate_skill, items_dict, False, False, False, False,
+                                engine, seed)
+        for first_duel_index, chunk_size in split_loop_times(loop_times, workers, SIMULATION_BLOCK_SIZE):
+            jobs.append((point_index, chunk_size, simulation_arguments, first_duel_index))
+
+    point_counters = [DuelCounters() for _ in points]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [(point_index, executor.submit(simulate_counters, chunk_size, *simulation_arguments,
+                                                     first_duel_index))
+                       for point_index, chunk_size, simulation_arguments, first_duel_index in jobs]
+            for point_index, future in futures:
+                point_counters[point_index].merge(future.result())
+    else:
+        for point_index, chunk_size, simulation_arguments, first_duel_index in jobs:
+            point_counters[point_index].merge(simulate_counters(chunk_size, *simulation_arguments, first_duel_index))
+
+    shape = tuple(len(values) for values in axes.values())
+    winning_count = np.zeros(shape, dtype=np.int64)
+    total_occurrence_only = np.zeros(shape, dtype=np.int64)
+    total_occurrence = np.zeros(shape, dtype=np.int64)
+    point_loop_times = np.zeros(shape[:-1], dtype=np.int64)
+    for point_index, counters in enumerate(point_counters):
+        position = np.unravel_index(point_index, shape[:-1])
+        point_loop_times[position] = counters.loop_times
+        for source, array in ((merge_dict(dict(counters.winning_count_only), counters.winning_count_main_skill_only),
+                               winning_count),
+                              (merge_dict(dict(counters.total_occurrence_only),
+                                          counters.total_occurrence_main_skill_only), total_occurrence_only),
+                              (merge_dict(dict(counters.total_occurrence), counters.total_occurrence_main_skill),
+                               total_occurrence)):
+            array[position] = [source.get(skill, 0) for skill in axes["skill"]]
+    return SweepResult(axes, winning_count, total_occurrence_only, total_occurrence, point_loop_times)
+
+
+def sub_skill_sets() -> list:
+    """
+    All the sets of sub skills a hero may learn, 4 out of the 11 sub skills.
+
+    :return: list of tuple of skill names, in the order of SUB_SKILL_NAMES
+    >>> skill_sets = sub_skill_sets()
+    >>> len(skill_sets), skill_sets[0]
+    (330, ('Attribute Bonus', 'Corruption', 'Armor Bonus', 'Thorn Armor'))
+    """
+    return list(itertools.combinations(SUB_SKILL_NAMES, SUB_SKILL_SLOTS))
+
+
+def skill_set_book_list(skill_set: tuple, skill_level: int) -> list:
+    """
+    The skill book list which makes the hero learn exactly this set of sub skills, see Hero.get_random_skill_book().
+
+    :param skill_set: the names of the sub skills
+    :param skill_level: how many skill books for each of the sub skills
+    :return: list of 11 amounts of skill books
+    >>> skill_set_book_list(("Corruption", "Evasion", "Smash", "Crushing"), 3)
+    [0, 3, 0, 0, 0, 3, 0, 3, 0, 0, 3]
+    """
+    for skill_name in skill_set:
+        if skill_name not in SUB_SKILL_NAMES:
+            raise ValueError('No such sub skill {}'.format(skill_name))
+    return [skill_level if skill_name in skill_set else 0 for skill_name in SUB_SKILL_NAMES]
+
+
+def payoff_row(row: int, columns: list, skill_sets: list, duels_per_cell: int, hero_level: int,
+               hero_1_model: str, hero_2_model: str, hero_1_name: str, hero_2_name: str, skill_level: int,
+               number_of_main_skills: int, ultimate_skill: bool, items_dict: dict, seed=None) -> np.ndarray:
+    """
+    Run the duels of one row of the payoff matrix with batch_duel(), the job for each worker process.
+    Each row has its own random streams, so a seeded row gives the same result in any process.
+
+    :param row: the index of the skill set of the first hero
+    :param columns: the indexes of the skill sets of the second hero
+    :return: how many times the first hero wins against each of the columns
+    >>> skill_sets = [("Evasion", "Smash", "Crushing", "Life Steal"), ("Attribute Bonus", "Corruption",
+    ...                                                                  "Armor Bonus", "Thorn Armor")]
+    >>> payoff_row(0, [1], skill_sets, 10, 6, "MonkeyKing", "MonkeyKing", "", "", 3, 0, False, {}, seed=1).shape
+    (1,)
+    """
+    generator = simulation_generator(seed, PAYOFF_STREAM, row, 0)
+    rng = simulation_rng(seed, PAYOFF_STREAM, row, 1)
+    book_list_1 = skill_set_book_list(skill_sets[row], skill_level)
+    wins = np.zeros(len(columns), dtype=np.int64)
+    # the duels of a row are run in blocks, not to keep too many heroes at once
+    columns_per_block = max(1, SIMULATION_BLOCK_SIZE * 8 // duels_per_cell)
+    for first in range(0, len(columns), columns_per_block):
+        block_columns = columns[first:first + columns_per_block]
+        heroes_1, heroes_2 = [], []
+        for column in block_columns:
+            book_lists = (book_list_1, skill_set_book_list(skill_sets[column], skill_level))
+            for _ in range(duels_per_cell):
+                hero_1, hero_2 = build_hero_pair(hero_level, hero_1_model, hero_2_model, hero_1_name, hero_2_name,
+                                                 0, number_of_main_skills, ultimate_skill, items_dict,
+                                                 book_lists, rng)
+                heroes_1.append(hero_1)
+                heroes_2.append(hero_2)
+        batch_duel(heroes_1, heroes_2, generator)
+        hero_1_wins = np.array([hero_2.status.array[CURRENT_HP] <= 0 for hero_2 in heroes_2])
+        wins[first:first + len(block_columns)] = hero_1_wins.reshape(len(block_columns), duels_per_cell).sum(axis=1)
+    return wins
+
+
+def payoff_matrix(duels_per_cell: int, hero_level: int, hero_1_model: str, hero_2_model: str,
+                  hero_1_name: str, hero_2_name: str, skill_level: int, number_of_main_skills=0,
+                  ultimate_skill=False, items_dict=None, skill_sets=None, workers=1, seed=None) -> (list, np.ndarray):
+    """
+    Estimate the winning rate of every set of sub skills against every other set, all the skills at the same level.
+    payoff[i, j] is the winning rate of the first hero with skill_sets[i] against the second hero with
+    skill_sets[j]. Every cell is simulated, the diagonal too, even if the two heroes are the same model:
+    a duel is not symmetric, a tie of the times and a duel which is not over in time go to the second hero,
+    so payoff[j, i] is not exactly 1 - payoff[i, j] and payoff[i, i] is not exactly 0.5.
+
+    :param duels_per_cell: how many duels are run for each cell
+    :param hero_level: the hero level, from 1 to 30
+    :param hero_1_model: the model name for the first hero
+    :param hero_2_model: the model name for the second hero
+    :param hero_1_name: the nickname for the first hero
+    :param hero_2_name: the nickname for the second hero
+    :param skill_level: how many skill books for each of the 4 sub skills
+    :param number_of_main_skills: how many main skills the heroes roll for each duel
+    :param ultimate_skill: whether the hero will learn an ultimate skill or not
+    :param items_dict: the items that the hero will equip
+    :param skill_sets: the sets of sub skills to compare, all the 330 sets from sub_skill_sets() by default
+    :param workers: how many processes run the rows of the matrix, 1 means running in the current process
+    :param seed: the seed of the simulation, the same seed gives the same matrix with any amount of workers
+    :return: (the skill sets, the payoff matrix as numpy array)
+    >>> skill_sets = [("Evasion", "Smash", "Crushing", "Life Steal"), ("Attribute Bonus", "Corruption",
+    ...                                                                  "Armor Bonus", "Thorn Armor"),
+    ...               ("Damage Bonus", "Crushing", "Fire!", "Evasion")]
+    >>> _, payoff = payoff_matrix(20, 6, "MonkeyKing", "MonkeyKing", "", "", 3, skill_sets=skill_sets, seed=1)
+    >>> payoff.shape, bool(((payoff >= 0) & (payoff <= 1)).all())
+    ((3, 3), True)
+    >>> _, payoff_2 = payoff_matrix(20, 6, "MonkeyKing", "MonkeyKing", "", "", 3, skill_sets=skill_sets, seed=1,
+    ...                             workers=2)
+    >>> bool((payoff == payoff_2).all())
+    True
+    """
+    if duels_per_cell < 1:
+        raise ValueError("duels_per_cell should be at least 1")
+    if workers < 1:
+        raise ValueError("workers should be at least 1")
+    if items_dict is None:
+        items_dict = {}
+    if skill_sets is None:
+        skill_sets = sub_skill_sets()
+    amount_of_sets = len(skill_sets)
+    rows = [(row, list(range(amount_of_sets))) for row in range(amount_of_sets)]
+    row_arguments = (skill_sets, duels_per_cell, hero_level, hero_1_model, hero_2_model, hero_1_name, hero_2_name,
+                     skill_level, number_of_main_skills, ultimate_skill, items_dict, seed)
+
+    wins = np.zeros((amount_of_sets, amount_of_sets), dtype=np.int64)
+    if workers > 1 and len(rows) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [(row, columns, executor.submit(payoff_row, row, columns, *row_arguments))
+                       for row, columns in rows]
+            for row, columns, future in futures:
+                wins[row, columns] = future.result()
+    else:
+        for row, columns in rows:
+            wins[row, columns] = payoff_row(row, columns, *row_arguments)
+
+    payoff = wins / duels_per_cell
+    return skill_sets, payoff
+
+
+def solve_equilibrium(payoff, iterations=100000, tolerance=1e-3) -> (np.ndarray, np.ndarray, float):
+    """
+    Solve the mixed strategy equilibrium of the zero-sum game given by the payoff matrix, the first hero picks a
+    row to maximize the payoff, the second hero picks a column to minimize it.
+    Both sides play multiplicative weights against each other, the average strategies converge to the equilibrium.
+    It stops when neither side could gain more than tolerance by changing its strategy.
+
+    :param payoff: the payoff matrix, e.g. from payoff_matrix()
+    :param iterations: the most iterations to run
+    :param tolerance: the largest gain allowed for changing the strategy
+    :return: (probability of each row, probability of each column, value of the game)
+    >>> rock_paper_scissors = np.array([[0.5, 0, 1], [1, 0.5, 0], [0, 1, 0.5]])
+    >>> row_strategy, column_strategy, value = solve_equilibrium(rock_paper_scissors, tolerance=1e-4)
+    >>> np.round(row_strategy, 2).tolist(), np.round(column_strategy, 2).tolist(), round(value, 3)
+    ([0.33, 0.33, 0.33], [0.33, 0.33, 0.33], 0.5)
+    >>> row_strategy, _, value = solve_equilibrium(np.array([[0.7, 0.6], [0.4, 0.2]]))
+    >>> np.round(row_strategy, 2).tolist(), round(value, 2)
+    ([1.0, 0.0], 0.6)
+    """
+    payoff = np.asarray(payoff, dtype=float)
+    amount_of_rows, amount_of_columns = payoff.shape
+    # the learning rate for a horizon of the given iterations, payoffs are winning rates in [0, 1]
+    learning_rate = np.sqrt(8 * np.log(max(amount_of_rows, amount_of_columns, 2)) / iterations)
+    row_total = np.zeros(amount_of_rows)
+    column_total = np.zeros(amount_of_columns)
+    row_sum = np.zeros(amount_of_rows)
+    column_sum = np.zeros(amount_of_columns)
+    row_strategy = np.full(amount_of_rows, 1 / amount_of_rows)
+    column_strategy = np.full(amount_of_columns, 1 / amount_of_columns)
+    for iteration in range(1, iterations + 1):
+        row_strategy = np.exp(learning_rate * (row_total - row_total.max()))
+        row_strategy /= row_strategy.sum()
+        column_strategy = np.exp(-learning_rate * (column_total - column_total.min()))
+        column_strategy /= column_strategy.sum()
+        row_total += payoff @ column_strategy
+        column_total += row_strategy @ payoff
+        row_sum += row_strategy
+        column_sum += column_strategy
+        if iteration % 100 == 0 or iteration == iterations:
+            row_strategy = row_sum / iteration
+            column_strategy = column_sum / iteration
+            if (payoff @ column_strategy).max() - (row_strategy @ payoff).min() < tolerance:
+                break
+    return row_strategy, column_strategy, float(row_strategy @ payoff @ column_strategy)
+
+
+def show_variance_report(report_name: str, reductions: dict) -> None:
+    """
+    Print the winning rates corrected by the control variate and the variance reduction factors,
+    see DuelCounters.variance_reduction(). A factor of 3 means plain monte carlo needs 3 times the work
+    for the same precision.
+
+    :param report_name: the title of the report
+    :param reductions: key: skill name, value: (winning rate, corrected winning rate, variance reduction factor)
+    :return: None
+    >>> show_variance_report("Test", {"Evasion": (0.5, 0.48, 2.5)})
+    <BLANKLINE>
+                                               Test                                           
+    Skill Name               Winning Rate        Corrected Rate      Variance Reduction
+    Evasion                  50.0%               48.0%               2.5
+    """
+    print('\n{}{}{}'.format(' ' * ((90 - len(report_name)) // 2), report_name, ' ' * ((90 - len(report_name)) // 2)))
+    print("Skill Name{}Winning Rate{}Corrected Rate{}Variance Reduction"
+          .format(' ' * (25 - len('Skill Name')), ' ' * (20 - len('Winning Rate')), ' ' * (20 - len('Corrected Rate'))))
+    for skill, (winning_rate, corrected, factor) in sorted(reductions.items(), key=lambda r: (r[1][1], r[0])):
+        winning_rate_str = "{}%".format(round(winning_rate * 100, 2))
+        corrected_str = "{}%".format(round(corrected * 100, 2))
+        print("{}{}{}{}{}{}{}".format(skill, ' ' * (25 - len(skill)),
+                                      winning_rate_str, ' ' * (20 - len(winning_rate_str)),
+                                      corrected_str, ' ' * (20 - len(corrected_str)), round(factor, 2)))
+
+
+def show_telemetry_report(report_name: str, telemetry: DuelTelemetry) -> None:
+    """
+    Print how often each source fired and how much damage or healing it contributed in a duel on average,
+    for each hero, see DuelTelemetry. The sources which never fired are not shown.
+
+    :param report_name: the title of the report
+    :param telemetry: the telemetry of the duels
+    :return: None
+    >>> telemetry = DuelTelemetry()
+    >>> hero_1, hero_2 = HeroMonkeyKing(1), HeroMonkeyKing(1)
+    >>> telemetry.start_duel(hero_1, hero_2)
+    >>> telemetry.add(hero_1, TELEMETRY_SMASH, 150)
+    >>> telemetry.end_duel()
+    >>> show_telemetry_report("Test", telemetry)
+    <BLANKLINE>
+                                               Test                                           
+    Source                   Hero 1 Triggers     Hero 1 Amount       Hero 2 Triggers     Hero 2 Amount
+    Smash                    1.0                 150.0               0.0                 0.0
+    """
+    print('\n{}{}{}'.format(' ' * ((90 - len(report_name)) // 2), report_name, ' ' * ((90 - len(report_name)) // 2)))
+    print("Source{}Hero 1 Triggers{}Hero 1 Amount{}Hero 2 Triggers{}Hero 2 Amount"
+          .format(' ' * (25 - len('Source')), ' ' * (20 - len('Hero 1 Triggers')), ' ' * (20 - len('Hero 1 Amount')),
+                  ' ' * (20 - len('Hero 2 Triggers'))))
+    columns = [telemetry.per_duel(False, 0), telemetry.per_duel(True, 0),
+               telemetry.per_duel(False, 1), telemetry.per_duel(True, 1)]
+    for index, source in enumerate(TELEMETRY_SOURCES):
+        if not telemetry.total_triggers[:, index].any():
+            continue
+        values = [str(column[source]) for column in columns]
+        print("{}{}{}{}{}{}{}{}{}".format(source, ' ' * (25 - len(source)),
+                                          values[0], ' ' * (20 - len(values[0])),
+                                          values[1], ' ' * (20 - len(values[1])),
+                                          values[2], ' ' * (20 - len(values[2])), values[3]))
+
+
+def show_interaction_report(report_name: str, counters: DuelCounters, versus: bool, skill_names: tuple) -> None:
+    """
+    Print the winning rate of each pair of skills, from the lowest to the highest,
+    see DuelCounters.interaction_matrix(). The pairs never counted are not shown.
+
+    :param report_name: the title of the report
+    :param counters: the counters of the duels
+    :param versus: False for the pairs of skills of a hero, True for a skill against a skill of the opponent
+    :param skill_names: the skills to pair, e.g. SUB_SKILL_NAMES
+    :return: None
+    >>> hero_1, hero_2 = HeroMonkeyKing(10), HeroMonkeyKing(10)
+    >>> hero_1.learn_skill_evasion(3)
+    >>> hero_1.learn_skill_thorn_armor(3)
+    >>> hero_2.learn_skill_smash(3)
+    >>> counters = DuelCounters()
+    >>> counters.record(hero_1, hero_2, True)
+    >>> show_interaction_report("Test", counters, True, SUB_SKILL_NAMES)
+    <BLANKLINE>
+                                               Test                                           
+    Skills                                       Winning Rate        Total Count
+    Smash vs Thorn Armor                         0.0%                1
+    Smash vs Evasion                             0.0%                1
+    Thorn Armor vs Smash                         100.0%              1
+    Evasion vs Smash                             100.0%              1
+    """
+    print('\n{}{}{}'.format(' ' * ((90 - len(report_name)) // 2), report_name, ' ' * ((90 - len(report_name)) // 2)))
+    print("Skills{}Winning Rate{}Total Count".format(' ' * (45 - len('Skills')), ' ' * (20 - len('Winning Rate'))))
+    winning_rates, occurrence = counters.interaction_matrix(versus, skill_names, skill_names)
+    pairs = []
+    for row, skill_1 in enumerate(skill_names):
+        # a pair of skills of a hero is the same both ways, and a skill is never against itself
+        for column in range(row + (0 if versus else 1), len(skill_names)):
+            if occurrence[row, column]:
+                pairs.append((winning_rates[row, column], skill_1, skill_names[column], occurrence[row, column]))
+            if versus and occurrence[column, row]:
+                pairs.append((winning_rates[column, row], skill_names[column], skill_1, occurrence[column, row]))
+    for winning_rate, skill_1, skill_2, total in sorted(pairs, key=lambda pair: pair[0]):
+        skills = "{} {} {}".format(skill_1, "vs" if versus else "+", skill_2)
+        winning_rate_str = "{}%".format(winning_rate)
+        print("{}{}{}{}{}".format(skills, ' ' * (45 - len(skills)), winning_rate_str,
+                                  ' ' * (20 - len(winning_rate_str)), total))
+
+
+def creat_plot(result1: dict, result2: dict, label1: str, label2: str, path=None) -> None:
     """
     This function is used to print the plots to compare the results
     from monte carlo simulation with different control conditions.
+
+    :param path: save the plot to this file instead of showing it, e.g. "level.png"
     """
     x_data = list(result1.keys())
     y_data = list(result1.values())
@@ -1952,4 +5393,43 @@ def creat_plot(result1: dict, result2: dict, label1: str, label2: str) -> None:
     plt.legend()
     plt.subplots_adjust(bottom=0.25)
 
-    plt.show()
+    if path is None:
+        plt.show()
+    else:
+        plt.savefig(path)
+        plt.close()
+
+
+def creat_heatmap(winning_rates: np.ndarray, row_labels: tuple, column_labels: tuple, title: str, path=None) -> None:
+    """
+    This function is used to print the heatmap of a skill interaction matrix, e.g.
+    creat_heatmap(counters.interaction_matrix()[0], SUB_SKILL_NAMES, SUB_SKILL_NAMES, "Sub Skill Pairs").
+    Above 50% is red and below is blue, the pairs never counted are blank.
+
+    :param winning_rates: the winning rates in percent from DuelCounters.interaction_matrix()
+    :param row_labels: the skills of the rows
+    :param column_labels: the skills of the columns
+    :param title: the title of the plot
+    :param path: save the plot to this file instead of showing it, e.g. "pairs.png"
+    """
+    # the colors are centered at 50%
+    spread = np.nanmax(np.abs(winning_rates - 50), initial=1.0)
+    plt.figure(figsize=(2 + 0.8 * len(column_labels), 2 + 0.6 * len(row_labels)))
+    plt.imshow(winning_rates, cmap='coolwarm', vmin=50 - spread, vmax=50 + spread)
+    plt.colorbar(label="Winning Rate")
+
+    for row in range(len(row_labels)):
+        for column in range(len(column_labels)):
+            if not np.isnan(winning_rates[row, column]):
+                plt.text(column, row, '%s' % winning_rates[row, column], ha='center', va='center', fontsize=7)
+
+    plt.xticks(range(len(column_labels)), column_labels, rotation=45, ha='right')
+    plt.yticks(range(len(row_labels)), row_labels)
+    plt.title(title)
+    plt.tight_layout()
+
+    if path is None:
+        plt.show()
+    else:
+        plt.savefig(path)
+        plt.close()
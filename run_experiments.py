@@ -0,0 +1,146 @@
+import argparse
+import contextlib
+import inspect
+import json
+import os
+import sys
+import time
+
+import matplotlib
+
+# the plots are saved to files, no window is needed on the batch nodes
+matplotlib.use("Agg")
+
+import main_final  # noqa: E402
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11, only JSON experiment files
+    tomllib = None
+
+# the parameters of aggregate_analyze() which a scenario can set
+SCENARIO_PARAMETERS = tuple(inspect.signature(main_final.aggregate_analyze).parameters)
+# the parameters a scenario cannot set: the summary is always printed (to the report file) since it builds the
+# returned winning rates, and the tracer, telemetry and duel counters are objects
+RUNNER_PARAMETERS = ("show_loop_aggregate_result", "tracer", "telemetry", "duel_counters")
+
+
+def load_experiment(path: str) -> dict:
+    """
+    Read an experiment file, TOML if its name ends with .toml, otherwise JSON.
+    It has [defaults] for every scenario, a list of [[scenarios]] each with a name and the parameters of
+    aggregate_analyze(), and a list of [[comparisons]] each with the names of two scenarios and their labels,
+    see experiments/for_running.toml.
+
+    :param path: the experiment file
+    :return: {"defaults": dict, "scenarios": list, "comparisons": list}
+    """
+    if path.endswith(".toml"):
+        if tomllib is None:
+            raise ValueError("Reading TOML needs Python 3.11 or later, please use a JSON experiment file")
+        with open(path, "rb") as experiment_file:
+            experiment = tomllib.load(experiment_file)
+    else:
+        with open(path) as experiment_file:
+            experiment = json.load(experiment_file)
+
+    experiment = {"defaults": experiment.get("defaults", {}), "scenarios": experiment.get("scenarios", []),
+                  "comparisons": experiment.get("comparisons", [])}
+    names = [scenario.get("name") for scenario in experiment["scenarios"]]
+    if None in names or len(set(names)) != len(names):
+        raise ValueError("Every scenario needs a name, and the names should be different")
+    parameters = [parameter for parameter in SCENARIO_PARAMETERS if parameter not in RUNNER_PARAMETERS]
+    for scenario in [experiment["defaults"]] + experiment["scenarios"]:
+        unknown = set(scenario) - set(parameters) - {"name"}
+        if unknown:
+            raise ValueError('No such parameter {} in {}, should be one of {}'
+                             .format(sorted(unknown), scenario.get("name", "defaults"), parameters))
+    for comparison in experiment["comparisons"]:
+        if len(comparison.get("scenarios", [])) != 2 or any(name not in names for name in comparison["scenarios"]):
+            raise ValueError('A comparison needs two scenarios of the experiment, got {}'
+                             .format(comparison.get("scenarios")))
+    return experiment
+
+
+def run_scenario(scenario: dict, output_dir: str) -> dict:
+    """
+    Run aggregate_analyze() of one scenario, its summary is written to <output_dir>/<name>.txt.
+
+    :param scenario: the name and the parameters of aggregate_analyze()
+    :param output_dir: the directory of the results
+    :return: the result of the scenario, with the winning rates, the duels run and the time it took
+    """
+    arguments = {key: value for key, value in scenario.items() if key != "name"}
+    report_path = os.path.join(output_dir, "{}.txt".format(scenario["name"]))
+    counters = main_final.DuelCounters()
+    start_time = time.perf_counter()
+    with open(report_path, "w") as report_file, contextlib.redirect_stdout(report_file):
+        winning_rates = main_final.aggregate_analyze(show_loop_aggregate_result=True, duel_counters=counters,
+                                                     **arguments)
+    seconds = time.perf_counter() - start_time
+    return {"name": scenario["name"], "arguments": arguments, "winning_rates": winning_rates,
+            "seconds": seconds, "duels": counters.loop_times,
+            "duels_per_second": counters.loop_times / seconds, "report": report_path}
+
+
+def run_experiment(experiment: dict, output_dir: str, overrides: dict) -> dict:
+    """
+    Run every scenario of an experiment, then plot every comparison, all the results are written to output_dir:
+    <name>.txt (the summary), <name>.json (the result), <first>_vs_<second>.png and summary.json.
+
+    :param experiment: from load_experiment()
+    :param output_dir: the directory of the results
+    :param overrides: the parameters set for every scenario, e.g. from the command line
+    :return: the summary of the experiment
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    results = {}
+    for scenario in experiment["scenarios"]:
+        scenario = dict(experiment["defaults"], **scenario, **overrides)
+        result = run_scenario(scenario, output_dir)
+        results[scenario["name"]] = result
+        with open(os.path.join(output_dir, "{}.json".format(scenario["name"])), "w") as result_file:
+            json.dump(result, result_file, indent=2)
+        print("{}{}{:.2f}s{}{:.1f} duels/s".format(result["name"], ' ' * (25 - len(result["name"])), result["seconds"],
+                                                   ' ' * 10, result["duels_per_second"]))
+
+    plots = []
+    for comparison in experiment["comparisons"]:
+        first, second = comparison["scenarios"]
+        labels = comparison.get("labels", comparison["scenarios"])
+        plot_path = os.path.join(output_dir, "{}_vs_{}.png".format(first, second))
+        main_final.creat_plot(results[first]["winning_rates"], results[second]["winning_rates"], labels[0], labels[1],
+                              plot_path)
+        plots.append(plot_path)
+
+    summary = {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "overrides": overrides,
+               "scenarios": [{key: result[key] for key in ("name", "seconds", "duels", "duels_per_second")}
+                             for result in results.values()],
+               "plots": plots}
+    with open(os.path.join(output_dir, "summary.json"), "w") as summary_file:
+        json.dump(summary, summary_file, indent=2)
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the scenarios of a TOML/JSON experiment file without a window, "
+                                                 "the reports, results and plots are saved to the output directory.")
+    parser.add_argument("experiment", help="the experiment file, e.g. experiments/for_running.toml")
+    parser.add_argument("--output-dir", default="results", help="the directory of the results")
+    parser.add_argument("--engine", choices=["scalar", "batch"], default=None,
+                        help="the engine of every scenario, overrides the experiment file")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="the worker processes of every scenario, overrides the experiment file")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="the seed of every scenario, overrides the experiment file")
+    options = parser.parse_args()
+
+    command_line_overrides = {key: value for key, value in (("engine", options.engine), ("workers", options.workers),
+                                                            ("seed", options.seed)) if value is not None}
+    try:
+        loaded_experiment = load_experiment(options.experiment)
+    except ValueError as error:
+        print(error, file=sys.stderr)
+        sys.exit(2)
+    run_experiment(loaded_experiment, options.output_dir, command_line_overrides)
+    print("Saved to {}".format(options.output_dir))